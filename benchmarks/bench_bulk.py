@@ -0,0 +1,123 @@
+"""
+Compares the bulk operations of Store with changing products one at a time.
+
+A seasonal campaign touches about half of a generated catalog: it reprices
+the products, sets their promotion, and deactivates and reactivates them.
+Each step runs as a loop over the products, through the price setter,
+set_promotion and deactivate/activate, and as one bulk operation with the
+same predicate. Both run on a plain store and on a store with a SearchIndex
+and a ChangeFeed, which get one notification per product from the loop but
+one ChangeBatch per bulk operation. Each store has its own catalog, and the
+fastest CPU time of a few runs is reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk [catalog_size]
+"""
+import gc
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks.generators import make_catalog
+from feed import ChangeFeed
+from promotions import PercentDiscount, ThirdOneFree
+from search import SearchIndex
+from store import Store
+
+ROUNDS = 5
+# Products below this price, about half of a generated catalog, are in the campaign
+CAMPAIGN_PRICE_CENTS = 500_00
+
+
+def in_campaign(product) -> bool:
+    """ Selects the products of the campaign. """
+    return product.price_cents < CAMPAIGN_PRICE_CENTS
+
+
+def loop_steps(store, promotion):
+    """ Returns the campaign steps done one product at a time. """
+    def reprice(percent):
+        factor = 1 + Decimal(percent) / 100
+        for product in store.products:
+            if in_campaign(product):
+                product.price = product.price * factor
+
+    def set_promotion():
+        for product in store.products:
+            if in_campaign(product):
+                product.set_promotion(promotion)
+
+    def toggle_active():
+        selected = [product for product in store.products if in_campaign(product)]
+        for product in selected:
+            product.deactivate()
+        for product in selected:
+            product.activate()
+
+    return {"reprice": reprice, "set promotion": set_promotion, "deactivate + activate": toggle_active}
+
+
+def bulk_steps(store, promotion):
+    """ Returns the campaign steps done with the bulk operations of the store. """
+    def reprice(percent):
+        store.bulk_reprice(percent, where=in_campaign)
+
+    def set_promotion():
+        store.bulk_set_promotion(promotion, where=in_campaign)
+
+    def toggle_active():
+        selected = store._select(None, in_campaign)
+        store.bulk_set_active(False, products=selected)
+        store.bulk_set_active(True, products=selected)
+
+    return {"reprice": reprice, "set promotion": set_promotion, "deactivate + activate": toggle_active}
+
+
+def cpu_seconds(step, *args) -> float:
+    """ Runs a step and returns the CPU seconds it took. """
+    gc.collect()
+    start = time.process_time()
+    step(*args)
+    return time.process_time() - start
+
+
+def main(catalog_size=500_000):
+    """
+        Times every campaign step both ways, with and without indexes, and prints the fastest runs.
+
+        Args:
+            catalog_size (int): The number of products of each catalog.
+        """
+    promotions = [PercentDiscount("30% off!", percent=30), ThirdOneFree("Third One Free!")]
+    configurations = {}
+    for indexed in (False, True):
+        for mode, steps in (("loop", loop_steps), ("bulk", bulk_steps)):
+            store = Store(make_catalog(catalog_size))
+            if indexed:
+                store.add_index(SearchIndex())
+                store.add_index(ChangeFeed())
+            label = ("indexed store, " if indexed else "plain store, ") + mode
+            configurations[label] = (store, steps)
+
+    timings = {}
+    for round_number in range(ROUNDS):
+        # Alternate the change, so every round changes every selected product
+        percent = 10 if round_number % 2 == 0 else -10
+        promotion = promotions[round_number % 2]
+        for label, (store, steps) in configurations.items():
+            for step_name, step in steps(store, promotion).items():
+                args = (percent,) if step_name == "reprice" else ()
+                timings.setdefault((step_name, label), []).append(cpu_seconds(step, *args))
+
+    selected = sum(in_campaign(product) for product in configurations["plain store, loop"][0].products)
+    print(f"catalog: {catalog_size}, products in the campaign: {selected}, rounds: {ROUNDS}")
+    for step_name in ("reprice", "set promotion", "deactivate + activate"):
+        for indexed in ("plain store", "indexed store"):
+            loop = min(timings[(step_name, f"{indexed}, loop")])
+            bulk = min(timings[(step_name, f"{indexed}, bulk")])
+            print(f"{step_name:<22} {indexed:<14} loop {loop * 1e3:8.0f} ms  bulk {bulk * 1e3:8.0f} ms  "
+                  f"{loop / bulk:5.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
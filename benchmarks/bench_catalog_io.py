@@ -0,0 +1,96 @@
+"""
+Measures the rows per second of the streaming catalog exporters and importers.
+
+Products are generated on the fly and written to CSV and JSON Lines, then the
+files are streamed back. Neither side holds the catalog in memory, so the
+peak resident memory stays flat as the row count grows. The import into a
+Store is timed separately, since the store itself keeps every product.
+
+Run from the repository root:
+    python -m benchmarks.bench_catalog_io [row_count]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import deque
+
+from catalog_io import dump_products, import_products, load_products
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice, PercentDiscount
+from store import Store
+
+PROMOTIONS = {promotion.name: promotion for promotion in (SecondHalfPrice("Second Half price!"),
+                                                          PercentDiscount("30% off!", percent=30))}
+
+
+def generate_products(row_count):
+    """
+        Generates a mixed catalog, one product at a time.
+
+        Args:
+            row_count (int): The number of products.
+
+        Returns:
+            Iterator[Product]: The products.
+        """
+    promotions = list(PROMOTIONS.values())
+    for index in range(row_count):
+        if index % 10 == 0:
+            product = LimitedProduct(f"Limited {index}", price=index % 997 + 0.99, quantity=index % 500,
+                                     maximum=3)
+        elif index % 10 == 1:
+            product = NonStockedProduct(f"Service {index}", price=index % 89 + 0.5)
+        else:
+            product = Product(f"Product {index}", price=index % 1999 + 0.25, quantity=index % 500 + 1)
+        if index % 4 == 0:
+            product.set_promotion(promotions[index % len(promotions)])
+        yield product
+
+
+def peak_memory_mib() -> float:
+    """ Returns the peak resident memory of the process in MiB (Linux reports KiB). """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(row_count=10_000_000):
+    """
+        Exports and imports a generated catalog in both formats and prints the rates.
+
+        Args:
+            row_count (int): The number of rows of each file.
+        """
+    print(f"rows: {row_count}")
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ("csv", "jsonl"):
+            path = os.path.join(directory, f"catalog.{extension}")
+            start = time.perf_counter()
+            dump_products(generate_products(row_count), path)
+            export_time = time.perf_counter() - start
+
+            errors = []
+            start = time.perf_counter()
+            # Consume the stream without keeping the products
+            deque(load_products(path, PROMOTIONS, errors), maxlen=0)
+            parse_time = time.perf_counter() - start
+            assert not errors, errors[:5]
+
+            print(f"{extension:>5} export: {row_count / export_time:10.0f} rows/s, "
+                  f"{os.path.getsize(path) / 2 ** 20:.0f} MiB")
+            print(f"{extension:>5} parse:  {row_count / parse_time:10.0f} rows/s, "
+                  f"peak memory so far {peak_memory_mib():.0f} MiB")
+
+        # Filling a store keeps every product, so it runs on a tenth of the rows
+        store_rows = max(row_count // 10, 1)
+        path = os.path.join(directory, "store.csv")
+        dump_products(generate_products(store_rows), path)
+        start = time.perf_counter()
+        errors = import_products(Store([]), path, PROMOTIONS)
+        import_time = time.perf_counter() - start
+        assert not errors, errors[:5]
+        print(f"  csv import into Store ({store_rows} rows): {store_rows / import_time:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
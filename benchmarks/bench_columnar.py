@@ -0,0 +1,87 @@
+"""
+Compares catalog-wide operations of the object Store and the NumPy ColumnarStore.
+
+Run from the repository root:
+    python -m benchmarks.bench_columnar [catalog_size]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from columnar import ColumnarStore
+from products import Product
+from store import Store
+
+
+def timed(call):
+    """ Returns the number of seconds a call takes. """
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def main(catalog_size=1_000_000):
+    """
+        Builds both stores from the same data and times each operation.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+        """
+    rng = random.Random(0)
+    names = [f"Product {index}" for index in range(catalog_size)]
+    price_cents = [rng.randint(100, 200_000) for _ in range(catalog_size)]
+    quantities = [rng.randint(0, 500) for _ in range(catalog_size)]
+    update_rows = np.array([rng.randrange(catalog_size) for _ in range(catalog_size // 10)])
+
+    results = {}
+    object_store = None
+    columnar_store = None
+
+    def build_objects():
+        nonlocal object_store
+        object_store = Store([Product(name, price=cents / 100, quantity=quantity)
+                              for name, cents, quantity in zip(names, price_cents, quantities)])
+
+    def build_columns():
+        nonlocal columnar_store
+        columnar_store = ColumnarStore.from_columns(names, price_cents, quantities)
+
+    results["build"] = (timed(build_objects), timed(build_columns))
+    catalog = object_store.products
+    results["total quantity (scan)"] = (
+        timed(lambda: sum(product.quantity for product in catalog if product.is_active())),
+        timed(columnar_store.get_total_quantity))
+    scan_active = lambda: [product for product in catalog if product.is_active()]  # noqa: E731
+    # Views are created on first access, so the first listing pays for them
+    results["get_all_products (cold)"] = (timed(scan_active), timed(columnar_store.get_all_products))
+    results["get_all_products (warm)"] = (timed(scan_active), timed(columnar_store.get_all_products))
+    results["valuation"] = (
+        timed(lambda: sum(product.price_cents * product.quantity
+                          for product in catalog if product.is_active())),
+        timed(columnar_store.get_total_value))
+
+    def reprice_objects():
+        for product in catalog:
+            product.price_cents = (product.price_cents * 11000 + 5000) // 10000
+
+    results["reprice +10%"] = (timed(reprice_objects), timed(lambda: columnar_store.reprice(10)))
+
+    def restock_objects():
+        for row in update_rows.tolist():
+            product = catalog[row]
+            product.set_quantity(product.quantity + 5)
+
+    results["restock 10% of rows"] = (
+        timed(restock_objects),
+        timed(lambda: columnar_store.update_stock(update_rows, np.full(len(update_rows), 5))))
+
+    print(f"catalog size: {catalog_size}")
+    print(f"{'operation':<24} {'objects (ms)':>14} {'columns (ms)':>14} {'speedup':>9}")
+    for label, (objects, columns) in results.items():
+        print(f"{label:<24} {objects * 1e3:14.1f} {columns * 1e3:14.1f} {objects / columns:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
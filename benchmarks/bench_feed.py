@@ -0,0 +1,88 @@
+"""
+Measures what a ChangeFeed adds to Store.order, and how fast consumers read it.
+
+Places the same random orders on a store without a feed, with a feed and no
+consumers, and with a feed whose subscriber is served by the delivery thread.
+Runs are interleaved and the fastest CPU time of each is reported; the
+delivery thread's CPU time is included, since it runs in the same process.
+Reading the events back with a cursor is timed too, against one scan of the
+stock of every product, which is what a poller would do instead.
+
+Run from the repository root:
+    python -m benchmarks.bench_feed [order_count]
+"""
+import gc
+import random
+import sys
+import time
+
+from benchmarks.generators import CartGenerator, make_catalog
+from feed import ChangeFeed
+from store import Store
+
+CATALOG_SIZE = 100_000
+ROUNDS = 15
+
+
+def place_orders(store, carts) -> float:
+    """ Places the carts one order at a time and returns the CPU seconds it took. """
+    gc.collect()
+    start = time.process_time()
+    for cart in carts:
+        store.order(cart)
+    return time.process_time() - start
+
+
+def main(order_count=20_000):
+    """
+        Times every configuration and prints the fastest run of each.
+
+        Args:
+            order_count (int): The number of orders of each run.
+        """
+    # Each store gets its own copy of the catalog and the same carts over it,
+    # since products notify every store they belong to
+    stores = []
+    for _ in range(3):
+        products = make_catalog(CATALOG_SIZE)
+        stores.append((Store(products), CartGenerator(products).carts(order_count)))
+    (plain, _), (published, _), (delivered, _) = stores
+    feed = published.add_index(ChangeFeed())
+    delivered_feed = delivered.add_index(ChangeFeed())
+    received = []
+    delivered_feed.subscribe(lambda events: received.append(len(events)))
+    delivered_feed.start(interval=0.01)
+
+    configurations = dict(zip(["no feed", "feed, no consumers", "feed, batched subscriber"], stores))
+    timings = {label: [] for label in configurations}
+    for _ in range(ROUNDS):
+        for label, (store, carts) in configurations.items():
+            timings[label].append(place_orders(store, carts))
+    delivered_feed.stop()
+
+    baseline = min(timings["no feed"])
+    print(f"orders per run: {order_count}, catalog: {CATALOG_SIZE}, rounds: {ROUNDS}")
+    for label, seconds in timings.items():
+        fastest = min(seconds)
+        print(f"{label:<26} {order_count / fastest:10.0f} orders/s  {(fastest / baseline - 1) * 100:+6.2f}%")
+    print(f"events delivered: {sum(received)} in {len(received)} batches")
+
+    cursor = feed.cursor(max(0, feed.next_sequence - feed.capacity))
+    start = time.perf_counter()
+    events = 0
+    while True:
+        batch = cursor.poll()
+        if not batch:
+            break
+        events += len(batch)
+    read_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    snapshot = {product: (product.quantity, product.is_active()) for product in published.products}
+    scan_seconds = time.perf_counter() - start
+    print(f"reading {events} events with a cursor: {read_seconds * 1e3:.1f} ms "
+          f"({events / read_seconds:,.0f} events/s)")
+    print(f"one polling scan of {len(snapshot)} products: {scan_seconds * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,96 @@
+"""
+Measures the cost of the checkout instrumentation, disabled and enabled.
+
+Places the same random orders with Store.order before instrumentation was ever
+enabled, after an enable()/disable() cycle, and enabled with the no-op Sink and
+with a MemorySink. Runs are interleaved, timed in CPU time and the fastest of
+each is reported, which filters most of the noise of a shared machine; the
+disabled configuration runs the very same function objects as the baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_instrumentation [order_count]
+"""
+import gc
+import random
+import statistics
+import sys
+import time
+
+import instrumentation
+from products import Product
+from promotions import PercentDiscount, SecondHalfPrice
+from store import Store
+
+CATALOG_SIZE = 1000
+ROUNDS = 30
+
+
+def make_store():
+    """ Builds a store with enough stock for every benchmark order, some products promoted. """
+    promotions = [None, SecondHalfPrice("Second Half price!"), PercentDiscount("30% off!", percent=30)]
+    products = [Product(f"Product {index}", price=10, quantity=10 ** 9) for index in range(CATALOG_SIZE)]
+    for index, product in enumerate(products):
+        product.set_promotion(promotions[index % len(promotions)])
+    return Store(products), products
+
+
+def place_orders(store, carts) -> float:
+    """ Places the carts one order at a time and returns the CPU seconds it took. """
+    gc.collect()
+    start = time.process_time()
+    for cart in carts:
+        store.order(cart)
+    return time.process_time() - start
+
+
+def main(order_count=20_000):
+    """
+        Times every configuration and prints the fastest run of each.
+
+        Args:
+            order_count (int): The number of orders of each run.
+        """
+    store, products = make_store()
+    rng = random.Random(0)
+    carts = [[(rng.choice(products), rng.randint(1, 3)) for _ in range(rng.randint(1, 3))]
+             for _ in range(order_count)]
+
+    def never_enabled():
+        return place_orders(store, carts)
+
+    originals = (Store.order, Store._locked, Product.buy_cents, Product.set_quantity)
+
+    def disabled():
+        instrumentation.enable(instrumentation.MemorySink())
+        instrumentation.disable()
+        assert (Store.order, Store._locked, Product.buy_cents, Product.set_quantity) == originals
+        return place_orders(store, carts)
+
+    def enabled(sink):
+        def run():
+            instrumentation.enable(sink)
+            try:
+                return place_orders(store, carts)
+            finally:
+                instrumentation.disable()
+        return run
+
+    configurations = {"never enabled": never_enabled, "enabled, then disabled": disabled,
+                      "enabled, no-op Sink": enabled(instrumentation.Sink()),
+                      "enabled, MemorySink": enabled(instrumentation.MemorySink())}
+    timings = {label: [] for label in configurations}
+    for _ in range(ROUNDS):
+        for label, run in configurations.items():
+            timings[label].append(run())
+
+    baseline = min(timings["never enabled"])
+    spread = (statistics.median(timings["never enabled"]) - baseline) / baseline
+    print(f"orders per run: {order_count}, rounds: {ROUNDS}")
+    for label, seconds in timings.items():
+        fastest = min(seconds)
+        print(f"{label:<24} {order_count / fastest:10.0f} orders/s  {(fastest / baseline - 1) * 100:+6.2f}%")
+    print(f"median run of the baseline: {spread * 100:+.2f}% (run-to-run noise)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
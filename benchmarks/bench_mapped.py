@@ -0,0 +1,77 @@
+"""
+Compares the startup of a Store built from Product objects with opening a
+memory-mapped catalog file.
+
+The catalog file is written once, then each step a fresh service performs is
+timed: opening the catalog, placing the first order, the first query by name
+and the first full listing. The file was just written, so it is served from
+the page cache, as it would be on a warm host.
+
+Run from the repository root:
+    python -m benchmarks.bench_mapped [catalog_size]
+"""
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+from mapped import MappedStore
+from products import Product
+from store import Store
+
+
+def timed(call):
+    """ Returns the result of a call and the number of seconds it takes. """
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def main(catalog_size=1_000_000):
+    """
+        Writes a catalog file, then times the startup steps of both stores.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+        """
+    rng = random.Random(0)
+    names = [f"Product {index}" for index in range(catalog_size)]
+    price_cents = [rng.randint(100, 200_000) for _ in range(catalog_size)]
+    quantities = [rng.randint(1, 500) for _ in range(catalog_size)]
+    cart_rows = [rng.randrange(catalog_size) for _ in range(3)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.bin")
+        MappedStore.create_from_columns(path, names, price_cents, quantities).close()
+        file_size = os.path.getsize(path)
+
+        object_store, build = timed(lambda: Store([
+            Product(name, price=cents / 100, quantity=quantity)
+            for name, cents, quantity in zip(names, price_cents, quantities)]))
+        catalog = object_store.products
+        _, object_order = timed(lambda: object_store.order([(catalog[row], 1) for row in cart_rows]))
+        _, object_lookup = timed(lambda: object_store.get_product(names[-1]))
+        _, object_listing = timed(object_store.get_all_products)
+        del object_store, catalog
+        gc.collect()
+
+        mapped_store, opening = timed(lambda: MappedStore(path))
+        _, mapped_order = timed(lambda: mapped_store.order([(mapped_store._view(row), 1)
+                                                           for row in cart_rows]))
+        _, mapped_lookup = timed(lambda: mapped_store.get_product(names[-1]))
+        _, mapped_listing = timed(mapped_store.get_all_products)
+        mapped_store.close()
+
+    print(f"catalog size: {catalog_size}, file size: {file_size / 2 ** 20:.1f} MiB")
+    print(f"{'step':<26} {'objects (ms)':>14} {'mapped (ms)':>14}")
+    for label, objects, mapped in (("build / open", build, opening),
+                                   ("first order", object_order, mapped_order),
+                                   ("first get_product", object_lookup, mapped_lookup),
+                                   ("first get_all_products", object_listing, mapped_listing)):
+        print(f"{label:<26} {objects * 1e3:14.2f} {mapped * 1e3:14.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
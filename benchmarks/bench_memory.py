@@ -0,0 +1,62 @@
+"""
+Measures the memory taken by each product type with tracemalloc.
+
+Every product gets a PercentDiscount built from the same arguments, as a
+catalog import would create them; interning makes those one shared object.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory [product_count]
+"""
+import gc
+import sys
+import tracemalloc
+
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import PercentDiscount
+
+
+def bytes_per_product(factory, product_count):
+    """
+        Returns the memory allocated per product, promotion and name included.
+
+        Args:
+            factory: Creates the product with the given index.
+            product_count (int): The number of products to create.
+
+        Returns:
+            float: The number of bytes allocated per product.
+        """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        product_list = []
+        for index in range(product_count):
+            product = factory(index)
+            product.set_promotion(PercentDiscount("30% off!", percent=30))
+            product_list.append(product)
+        return (tracemalloc.get_traced_memory()[0] - before) / product_count
+    finally:
+        tracemalloc.stop()
+
+
+def main(product_count=100_000):
+    """
+        Prints the bytes per product of each product type.
+
+        Args:
+            product_count (int): The number of products created per type.
+        """
+    factories = [
+        ("Product", lambda index: Product(f"Product {index}", price=10, quantity=5)),
+        ("NonStockedProduct", lambda index: NonStockedProduct(f"Product {index}", price=10)),
+        ("LimitedProduct", lambda index: LimitedProduct(f"Product {index}", price=10,
+                                                        quantity=5, maximum=2)),
+    ]
+    print(f"products per type: {product_count}")
+    for label, factory in factories:
+        print(f"{label:<20} {bytes_per_product(factory, product_count):8.1f} bytes/product")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,77 @@
+"""
+Compares integer-cents pricing with the binary float pricing it replaced.
+
+The float functions below are the promotion formulas as they were before prices
+moved to cents. Both sides price the same lines through one Python call per line.
+
+Run from the repository root:
+    python -m benchmarks.bench_money [line_count]
+"""
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount
+
+
+def second_half_price_float(product, quantity):
+    """ The float SecondHalfPrice formula. """
+    half_price_items = quantity // 2
+    full_price_items = quantity - half_price_items
+    return full_price_items * product.price + half_price_items * product.price / 2
+
+
+def third_one_free_float(product, quantity):
+    """ The float ThirdOneFree formula. """
+    free_items = quantity // 3
+    return (quantity - free_items) * product.price
+
+
+def percent_discount_float(product, quantity, percent=30):
+    """ The float PercentDiscount formula. """
+    return product.price * (1 - percent / 100) * quantity
+
+
+def timed(call, repeat=5):
+    """ Returns the fastest of several runs of a call, in seconds. """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(line_count=1_000_000):
+    """
+        Prices random lines with both representations and prints the timings.
+
+        Args:
+            line_count (int): The number of lines priced per promotion.
+        """
+    rng = random.Random(0)
+    # Stand-ins holding the price both ways, so only the arithmetic differs
+    products = []
+    for _ in range(1000):
+        cents = rng.randint(1, 200_000)
+        products.append(SimpleNamespace(price=cents / 100, price_cents=cents))
+    lines = [(rng.choice(products), rng.randint(1, 10)) for _ in range(line_count)]
+
+    cases = [("SecondHalfPrice", SecondHalfPrice("Second Half price!"), second_half_price_float),
+             ("ThirdOneFree", ThirdOneFree("Third One Free!"), third_one_free_float),
+             ("PercentDiscount", PercentDiscount("30% off!", percent=30), percent_discount_float)]
+    print(f"lines: {line_count}")
+    print(f"{'promotion':<18} {'float (ms)':>11} {'cents (ms)':>11} {'speedup':>8}")
+    for label, promotion, float_formula in cases:
+        apply_promotion = promotion.apply_promotion
+        float_seconds = timed(
+            lambda: [float_formula(product, quantity) for product, quantity in lines])
+        cents_seconds = timed(
+            lambda: [apply_promotion(product, quantity) for product, quantity in lines])
+        print(f"{label:<18} {float_seconds * 1e3:11.1f} {cents_seconds * 1e3:11.1f} "
+              f"{float_seconds / cents_seconds:7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
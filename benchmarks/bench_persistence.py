@@ -0,0 +1,119 @@
+"""
+Benchmarks the write-ahead log of DurableStore.
+
+Measures the durable order throughput from 1 to 16 threads, where group commit
+lets threads that commit together share one fsync, and the recovery time of a
+store after many orders, with and without periodic snapshots.
+
+Run from the repository root:
+    python -m benchmarks.bench_persistence [order_count]
+"""
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from persistence import DurableStore
+from products import Product
+
+
+def build_products(catalog_size):
+    """
+        Builds a catalog with enough stock for every benchmark order.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+
+        Returns:
+            List[Product]: The products.
+        """
+    return [Product(f"Product {index}", price=10, quantity=10 ** 9) for index in range(catalog_size)]
+
+
+def commit_throughput(thread_count, order_count, catalog_size=200, seed=0):
+    """
+        Places durable orders from several threads and measures the throughput.
+
+        Args:
+            thread_count (int): The number of ordering threads.
+            order_count (int): The total number of orders.
+            catalog_size (int): The number of products in the catalog.
+            seed (int): The seed of the carts.
+
+        Returns:
+            Tuple[float, float]: The orders and fsyncs per second.
+        """
+    with tempfile.TemporaryDirectory() as directory:
+        with DurableStore(directory, build_products(catalog_size)) as store:
+            catalog = store.products
+            barrier = threading.Barrier(thread_count + 1)
+            orders_per_thread = order_count // thread_count
+
+            def worker(index):
+                rng = random.Random(seed * 1000 + index)
+                carts = [[(rng.choice(catalog), rng.randint(1, 4)) for _ in range(rng.randint(1, 3))]
+                         for _ in range(orders_per_thread)]
+                barrier.wait()
+                for cart in carts:
+                    store.order(cart)
+
+            threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            syncs = store._log.sync_count
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            syncs = store._log.sync_count - syncs
+        return thread_count * orders_per_thread / elapsed, syncs / elapsed
+
+
+def recovery_time(order_count, snapshot_every, catalog_size=200, seed=0):
+    """
+        Places orders without fsync, then measures how long reopening the store takes.
+
+        Args:
+            order_count (int): The number of orders before the restart.
+            snapshot_every (int): The number of log records between checkpoints.
+            catalog_size (int): The number of products in the catalog.
+            seed (int): The seed of the carts.
+
+        Returns:
+            float: The recovery time in seconds.
+        """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        with DurableStore(directory, build_products(catalog_size), fsync=False,
+                          snapshot_every=snapshot_every) as store:
+            catalog = store.products
+            for _ in range(order_count):
+                store.order([(rng.choice(catalog), rng.randint(1, 4))])
+        start = time.perf_counter()
+        DurableStore(directory, fsync=False).close()
+        return time.perf_counter() - start
+
+
+def main(order_count=2000):
+    """
+        Runs the commit and recovery benchmarks and prints the results.
+
+        Args:
+            order_count (int): The number of orders of each commit run.
+        """
+    for thread_count in (1, 2, 4, 8, 16):
+        orders, syncs = commit_throughput(thread_count, order_count)
+        print(f"{thread_count:>2} threads: {orders:10.0f} durable orders/s, "
+              f"{orders / syncs:5.1f} orders per fsync")
+
+    recovery_orders = order_count * 50
+    without_snapshots = recovery_time(recovery_orders, snapshot_every=10 ** 12)
+    with_snapshots = recovery_time(recovery_orders, snapshot_every=10_000)
+    print(f"Recovery after {recovery_orders} orders: {without_snapshots * 1000:.1f} ms replaying "
+          f"the whole log, {with_snapshots * 1000:.1f} ms from the latest snapshot")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,52 @@
+"""
+Compares scalar apply_promotion calls with the batched promotion pricing kernels.
+
+Run from the repository root:
+    python -m benchmarks.bench_pricing [line_count]
+"""
+import sys
+import time
+
+import numpy as np
+
+from columnar import ColumnarStore
+from promotions import price_lines
+from test_promotions import make_lines
+
+
+def timed(call):
+    """ Returns the result of a call and the number of seconds it took. """
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def main(line_count=1_000_000):
+    """
+        Prices the same random lines with every approach and prints the timings.
+
+        Args:
+            line_count (int): The number of lines to price.
+        """
+    lines = make_lines(line_count)
+    store = ColumnarStore(capacity=line_count)
+    rows = store.rows_of([store.add_product(product) for product, _ in lines])
+    quantities = np.array([quantity for _, quantity in lines], dtype=np.int64)
+
+    scalar, scalar_seconds = timed(lambda: [product.get_price_cents(quantity)
+                                                 for product, quantity in lines])
+    batched, batched_seconds = timed(lambda: price_lines(lines))
+    columnar, columnar_seconds = timed(lambda: store.price_rows(rows, quantities))
+    assert batched == scalar
+    assert columnar.tolist() == scalar
+
+    print(f"lines: {line_count}")
+    print(f"scalar get_price_cents       {scalar_seconds * 1e3:10.1f} ms")
+    print(f"price_lines (objects)      {batched_seconds * 1e3:10.1f} ms "
+          f"({scalar_seconds / batched_seconds:.1f}x)")
+    print(f"ColumnarStore.price_rows   {columnar_seconds * 1e3:10.1f} ms "
+          f"({scalar_seconds / columnar_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,84 @@
+"""
+Measures the promotion pricing cache on a repeat-heavy cart workload.
+
+Carts pick products with a Zipf-like skew, so a few popular products and
+small quantities dominate, as in real checkouts. Every product has a
+promotion. The same carts are priced with get_price_cents with the cache
+disabled, which calls apply_promotion, and with caches of several sizes, and
+the cache counters are reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_pricing_cache [cart_count]
+"""
+import random
+import sys
+import time
+
+from products import Product
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount, pricing_cache
+
+CATALOG_SIZE = 5000
+
+
+def make_carts(cart_count, seed=0):
+    """
+        Builds a promoted catalog and skewed random carts over it.
+
+        Args:
+            cart_count (int): The number of carts.
+            seed (int): The seed of the catalog and the carts.
+
+        Returns:
+            List[List[Tuple[Product, int]]]: The carts.
+        """
+    rng = random.Random(seed)
+    promotions = [SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+                  PercentDiscount("30% off!", percent=30), PercentDiscount("12.5% off!", percent=12.5)]
+    catalog = []
+    for index in range(CATALOG_SIZE):
+        product = Product(f"Product {index}", price=rng.randint(100, 100_000) / 100, quantity=10 ** 6)
+        product.set_promotion(promotions[index % len(promotions)])
+        catalog.append(product)
+    # Product i is picked with a weight of 1 / (i + 1)
+    weights = [1 / (rank + 1) for rank in range(CATALOG_SIZE)]
+    carts = []
+    for _ in range(cart_count):
+        size = rng.randint(1, 6)
+        carts.append(list(zip(rng.choices(catalog, weights, k=size),
+                              rng.choices((1, 1, 1, 2, 2, 3, 4, 6), k=size))))
+    return carts
+
+
+def price_all(carts) -> float:
+    """ Prices every line of the carts and returns the seconds taken. """
+    start = time.perf_counter()
+    for cart in carts:
+        for product, quantity in cart:
+            product.get_price_cents(quantity)
+    return time.perf_counter() - start
+
+
+def main(cart_count=200_000):
+    """
+        Prices the workload without and with the cache and prints the comparison.
+
+        Args:
+            cart_count (int): The number of carts.
+        """
+    carts = make_carts(cart_count)
+    lines = sum(len(cart) for cart in carts)
+
+    pricing_cache.resize(0)
+    uncached = min(price_all(carts) for _ in range(3))
+    for maxsize in (256, 4096, 65536):
+        pricing_cache.resize(maxsize)
+        cached = min(price_all(carts) for _ in range(3))
+        stats = pricing_cache.stats()
+        hit_rate = stats["hits"] / (stats["hits"] + stats["misses"])
+        print(f"maxsize {maxsize:>6}: {lines / cached / 1e6:5.2f}M lines/s vs "
+              f"{lines / uncached / 1e6:5.2f}M uncached ({uncached / cached:.2f}x), "
+              f"hit rate {hit_rate:.1%}, evictions {stats['evictions']}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
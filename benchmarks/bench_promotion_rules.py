@@ -0,0 +1,69 @@
+"""
+Compares the cost of pricing a line with compiled promotion stacks against a
+single built-in promotion and against chaining promotion objects at pricing time.
+
+The chained baseline prices the unit-cycle promotion and then passes the
+rounded total through each percentage discount object in turn, as promotions
+combined at pricing time would.
+
+Run from the repository root:
+    python -m benchmarks.bench_promotion_rules [line_count]
+"""
+import random
+import sys
+import time
+
+from products import Product
+from promotions import ThirdOneFree, PercentDiscount, _UnitPrice
+from promotion_rules import TieredDiscount, Stacked
+
+
+def chained_price(promotions, product, quantity) -> int:
+    """ Prices a line by applying each promotion object in turn to the previous total. """
+    total = promotions[0].apply_promotion(product, quantity)
+    for promotion in promotions[1:]:
+        total = promotion.apply_promotion(_UnitPrice(total), 1)
+    return total
+
+
+def timed(call) -> float:
+    """ Returns the number of seconds a call took. """
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def main(line_count=1_000_000):
+    """
+        Prices the same random lines with every approach and prints the timings.
+
+        Args:
+            line_count (int): The number of lines to price.
+        """
+    rng = random.Random(0)
+    product = Product("Item", price=19.99, quantity=100)
+    quantities = [rng.randint(1, 60) for _ in range(line_count)]
+    third_free = ThirdOneFree("Third One Free!")
+    percent_off = PercentDiscount("30% off!", percent=30)
+    extra_off = PercentDiscount("5% off!", percent=5)
+    stacked = Stacked("30% off plus third one free", [percent_off, third_free])
+    tiered = Stacked("Tiered stack", [TieredDiscount("Bulk", [(10, 5), (25, 10), (50, 15)]),
+                                      percent_off, third_free])
+
+    single = timed(lambda: [third_free.apply_promotion(product, quantity) for quantity in quantities])
+    single_percent = timed(lambda: [percent_off.apply_promotion(product, quantity) for quantity in quantities])
+    chained = timed(lambda: [chained_price((third_free, percent_off, extra_off), product, quantity)
+                             for quantity in quantities])
+    compiled = timed(lambda: [stacked.apply_promotion(product, quantity) for quantity in quantities])
+    compiled_tiers = timed(lambda: [tiered.apply_promotion(product, quantity) for quantity in quantities])
+
+    print(f"lines: {line_count}")
+    print(f"single ThirdOneFree            {single * 1e3:10.1f} ms")
+    print(f"single PercentDiscount         {single_percent * 1e3:10.1f} ms ({single_percent / single:.2f}x)")
+    print(f"chained objects (3 promotions) {chained * 1e3:10.1f} ms ({chained / single:.2f}x)")
+    print(f"Stacked (2 promotions)         {compiled * 1e3:10.1f} ms ({compiled / single:.2f}x)")
+    print(f"Stacked with tiers (3 stages)  {compiled_tiers * 1e3:10.1f} ms ({compiled_tiers / single:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,128 @@
+"""
+Measures the ingest rate, query latency and memory of a ReplenishmentPlanner.
+
+Sales of skewed carts over a generated catalog are recorded straight with
+record_sale, spread over a simulated month so buckets keep expiring, and
+Store.order throughput is compared with and without a planner registered.
+Forecast and low_stock latency are timed afterwards, and tracemalloc
+measures the bytes per product of a planner that has a sale for every
+product of the catalog. Rates are the fastest CPU time of a few runs.
+
+Run from the repository root:
+    python -m benchmarks.bench_replenishment [catalog_size]
+"""
+import gc
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+from benchmarks.generators import CartGenerator, make_catalog
+from replenishment import ReplenishmentPlanner
+from store import Store
+
+ROUNDS = 5
+SALE_COUNT = 1_000_000
+ORDER_COUNT = 20_000
+# Catalog of the Store.order comparison, small enough for two copies
+ORDER_CATALOG_SIZE = 100_000
+SIMULATED_DAYS = 30
+
+
+class SimulatedClock:
+    """ A clock moved forward by the benchmark. """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def cpu_seconds(call) -> float:
+    """ Returns the CPU seconds of the fastest of ROUNDS calls. """
+    timings = []
+    for _ in range(ROUNDS):
+        gc.collect()
+        start = time.process_time()
+        call()
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def main(catalog_size=1_000_000):
+    """
+        Runs every measurement and prints the results.
+
+        Args:
+            catalog_size (int): The number of products of the catalog sales are recorded over.
+        """
+    products = make_catalog(catalog_size)
+    generator = CartGenerator(products)
+    lines = [generator.line() for _ in range(SALE_COUNT)]
+    timestamps = [day * 86_400.0 for day in range(SIMULATED_DAYS)
+                  for _ in range(SALE_COUNT // SIMULATED_DAYS + 1)][:SALE_COUNT]
+
+    def ingest():
+        planner = ReplenishmentPlanner()
+        for (product, units), timestamp in zip(lines, timestamps):
+            planner.record_sale(product, units, timestamp)
+    ingest_seconds = cpu_seconds(ingest)
+    print(f"catalog: {catalog_size}, sales: {SALE_COUNT} over {SIMULATED_DAYS} days")
+    print(f"record_sale: {SALE_COUNT / ingest_seconds:,.0f} sales/s")
+
+    clock = SimulatedClock()
+    clock.now = SIMULATED_DAYS * 86_400.0
+    store = Store(products)
+    planner = store.add_index(ReplenishmentPlanner(clock=clock))
+    for (product, units), timestamp in zip(lines, timestamps):
+        planner.record_sale(product, units, timestamp)
+    sampled = random.Random(0).sample([product for product, _ in lines], 1000)
+    forecast_us = min(timeit.repeat(lambda: [planner.forecast(product) for product in sampled],
+                                    number=1, repeat=20)) / len(sampled) * 1e6
+    print(f"forecast: {forecast_us:.2f} us per product, {len(planner)} products tracked")
+    # Take the sampled products below their reorder point, so they are signalled
+    for product in sampled:
+        if product.quantity:
+            planner.sold(product, product.quantity + 10 ** 9)
+    low_stock_ms = min(timeit.repeat(planner.low_stock, number=1, repeat=20)) * 1e3
+    print(f"low_stock: {low_stock_ms:.2f} ms for {len(planner.low_stock())} signalled products")
+    del store, planner
+    gc.collect()
+
+    # Each store gets its own catalog, since products notify every store they belong to
+    plain_products, planned_products = make_catalog(ORDER_CATALOG_SIZE), make_catalog(ORDER_CATALOG_SIZE)
+    plain, planned = Store(plain_products), Store(planned_products)
+    planned.add_index(ReplenishmentPlanner())
+    plain_carts = CartGenerator(plain_products).carts(ORDER_COUNT)
+    planned_carts = CartGenerator(planned_products).carts(ORDER_COUNT)
+    timings = {"no planner": [], "planner": []}
+    for _ in range(ROUNDS * 3):
+        for label, store, carts in (("no planner", plain, plain_carts), ("planner", planned, planned_carts)):
+            gc.collect()
+            start = time.process_time()
+            for cart in carts:
+                store.order(cart)
+            timings[label].append(time.process_time() - start)
+    baseline = min(timings["no planner"])
+    for label, seconds in timings.items():
+        fastest = min(seconds)
+        print(f"Store.order, {label:<11} {ORDER_COUNT / fastest:10,.0f} orders/s  "
+              f"{(fastest / baseline - 1) * 100:+6.2f}%")
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        planner = ReplenishmentPlanner()
+        for product in products:
+            planner.record_sale(product, 1, 0.0)
+        bytes_per_product = (tracemalloc.get_traced_memory()[0] - before) / len(products)
+    finally:
+        tracemalloc.stop()
+    print(f"memory: {bytes_per_product:.0f} bytes per tracked product "
+          f"({planner.bucket_count} buckets)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
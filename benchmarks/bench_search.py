@@ -0,0 +1,109 @@
+"""
+Compares SearchIndex queries with scanning Store.get_all_products().
+
+Builds a catalog of products with random names, prices and promotions, then
+times typeahead prefix, substring, price band, promotion and combined queries
+against the equivalent list comprehensions over the active products. Index
+maintenance is timed too: registering the index over the whole catalog,
+adding products and repricing them. Substring queries use the optional
+trigram index, which is built over a smaller catalog since it costs much more
+memory than the other indexes.
+
+Run from the repository root:
+    python -m benchmarks.bench_search [catalog_size]
+"""
+import random
+import sys
+import time
+import timeit
+
+from products import Product
+from promotions import PercentDiscount, SecondHalfPrice
+from search import SearchIndex
+from store import Store
+
+WORDS = ["apple", "bose", "google", "pixel", "macbook", "speaker", "phone", "laptop", "cable", "charger",
+         "monitor", "keyboard", "mouse", "headphones", "watch", "tablet"]
+REPEAT = 20
+# Number of products added and repriced to time index maintenance
+UPDATES = 10_000
+# Catalog size of the trigram index run
+SUBSTRING_CATALOG_SIZE = 100_000
+
+
+def make_products(count, promotions, seed=0):
+    """ Builds products with two-word names plus a serial number, random prices and promotions. """
+    rng = random.Random(seed)
+    products = []
+    for index in range(count):
+        product = Product(f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {index}",
+                          price=rng.randint(100, 500_000) / 100, quantity=10)
+        product.set_promotion(rng.choice(promotions))
+        products.append(product)
+    return products
+
+
+def per_call(call) -> float:
+    """ Returns the average seconds per call. """
+    return timeit.timeit(call, number=REPEAT) / REPEAT
+
+
+def report(label, indexed, scan):
+    """ Times an indexed query against its scan and prints both. """
+    indexed_seconds, scan_seconds = per_call(indexed), per_call(scan)
+    print(f"{label:<34} {indexed_seconds * 1e6:10.1f} us  scan {scan_seconds * 1e3:8.1f} ms "
+          f"({scan_seconds / indexed_seconds:,.0f}x)")
+
+
+def main(catalog_size=1_000_000):
+    """
+        Builds the catalog, times the queries and index maintenance, and prints the results.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+        """
+    promotions = [None, SecondHalfPrice("Second Half price!"), PercentDiscount("30% off!", percent=30)]
+    store = Store(make_products(catalog_size, promotions))
+    start = time.perf_counter()
+    index = store.add_index(SearchIndex())
+    print(f"catalog size: {catalog_size}")
+    print(f"registering the index: {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for number in range(UPDATES):
+        store.add_product(Product(f"Pixel phone new{number}", price=rng.randint(1, 5000), quantity=1))
+    print(f"add_product with the index: {(time.perf_counter() - start) / UPDATES * 1e6:.1f} us/product")
+    products = store.products
+    start = time.perf_counter()
+    for product in rng.sample(products, UPDATES):
+        product.price = rng.randint(1, 5000)
+    print(f"repricing with the index: {(time.perf_counter() - start) / UPDATES * 1e6:.1f} us/product")
+
+    promotion = promotions[2]
+    report("prefix 'pixel ph', first 10", lambda: index.by_prefix("pixel ph", limit=10),
+           lambda: [product for product in store.get_all_products()
+                    if product.name.casefold().startswith("pixel ph")][:10])
+    report("prefix 'macbook cable 12'", lambda: index.by_prefix("macbook cable 12"),
+           lambda: [product for product in store.get_all_products()
+                    if product.name.casefold().startswith("macbook cable 12")])
+    report("price 100.00-100.50", lambda: index.by_price(100, 100.5),
+           lambda: [product for product in store.get_all_products() if 10_000 <= product.price_cents <= 10_050])
+    report("promotion, first 50", lambda: index.by_promotion(promotion, limit=50),
+           lambda: [product for product in store.get_all_products()
+                    if product.get_promotion() is promotion][:50])
+    report("prefix 'watch' + price + promotion",
+           lambda: index.search(prefix="watch", min_price=10, max_price=12, promotion=promotion),
+           lambda: [product for product in store.get_all_products()
+                    if product.name.casefold().startswith("watch") and 1000 <= product.price_cents <= 1200
+                    and product.get_promotion() is promotion])
+
+    small = Store(make_products(min(catalog_size, SUBSTRING_CATALOG_SIZE), promotions))
+    trigrams = small.add_index(SearchIndex(substrings=True))
+    print(f"substring queries over {len(small)} products with the trigram index:")
+    report("substring 'cable 77'", lambda: trigrams.by_substring("cable 77"),
+           lambda: [product for product in small.get_all_products() if "cable 77" in product.name.casefold()])
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,84 @@
+"""
+Measures how order throughput scales with the number of ShardedStore shards.
+
+Random carts are placed in batches with order_many, so every shard works on
+its share of a batch in parallel, from 1 shard up to one per core. A
+single-process Store placing the same carts gives the baseline. Scaling stops
+at the number of cores, and the coordinator's routing adds a serial share.
+
+Run from the repository root:
+    python -m benchmarks.bench_sharded [order_count] [max_shards]
+"""
+import multiprocessing
+import random
+import sys
+import time
+
+from products import Product
+from sharded import ShardedStore
+from store import Store
+
+CATALOG_SIZE = 10_000
+BATCH_SIZE = 10_000
+
+
+def make_products():
+    """ Builds a catalog with enough stock for every benchmark order. """
+    return [Product(f"Product {index}", price=10, quantity=10 ** 9) for index in range(CATALOG_SIZE)]
+
+
+def make_carts(order_count, seed=0):
+    """
+        Generates random carts of product names, a tenth of them spanning several products.
+
+        Args:
+            order_count (int): The number of carts.
+            seed (int): The seed of the carts.
+
+        Returns:
+            List[List[Tuple[str, int]]]: The carts.
+        """
+    rng = random.Random(seed)
+    return [[(f"Product {rng.randrange(CATALOG_SIZE)}", rng.randint(1, 3))
+             for _ in range(3 if index % 10 == 0 else 1)]
+            for index in range(order_count)]
+
+
+def throughput(store, carts) -> float:
+    """ Places the carts in batches and returns the orders per second. """
+    start = time.perf_counter()
+    for offset in range(0, len(carts), BATCH_SIZE):
+        _, failures = store.order_many(carts[offset:offset + BATCH_SIZE])
+        assert not failures, list(failures.values())[:3]
+    return len(carts) / (time.perf_counter() - start)
+
+
+def main(order_count=200_000, max_shards=None):
+    """
+        Runs the benchmark for a growing number of shards and prints the scaling.
+
+        Args:
+            order_count (int): The number of orders of each run.
+            max_shards (int): The largest number of shards, by default the number of cores.
+        """
+    max_shards = max_shards or multiprocessing.cpu_count()
+    carts = make_carts(order_count)
+
+    store = Store(make_products())
+    baseline = throughput(store, [[(store.get_product(name), quantity) for name, quantity in cart]
+                                  for cart in carts])
+    print(f"cores: {multiprocessing.cpu_count()}")
+    print(f"single-process Store: {baseline:10.0f} orders/s")
+
+    shard_counts = sorted({1, max_shards} | {2 ** power for power in range(max_shards.bit_length())
+                                             if 2 ** power <= max_shards})
+    first = None
+    for shard_count in shard_counts:
+        with ShardedStore(make_products(), shard_count=shard_count) as sharded:
+            rate = throughput(sharded, carts)
+        first = first or rate
+        print(f"{shard_count:>3} shards: {rate:10.0f} orders/s ({rate / first:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,52 @@
+"""
+Compares the incrementally maintained Store aggregates with full catalog scans.
+
+Run from the repository root:
+    python -m benchmarks.bench_store_aggregates [catalog_size]
+"""
+import sys
+import timeit
+
+from products import Product
+from store import Store
+
+
+def scan_total_quantity(product_list):
+    """ The full-scan total quantity the Store used to compute on every call. """
+    return sum(product.get_quantity() for product in product_list if product.is_active())
+
+
+def scan_all_products(product_list):
+    """ The full-scan active product listing the Store used to build on every call. """
+    return [product for product in product_list if product.is_active()]
+
+
+def main(catalog_size=100_000, repeat=20):
+    """
+        Builds a catalog with a tenth of the products inactive and times both approaches.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+            repeat (int): The number of calls timed per approach.
+        """
+    product_list = [Product(f"Product {index}", price=10, quantity=index % 50 + 1)
+                    for index in range(catalog_size)]
+    for product in product_list[::10]:
+        product.deactivate()
+    store = Store(product_list)
+
+    assert store.get_total_quantity() == scan_total_quantity(product_list)
+    cases = [
+        ("get_total_quantity (incremental)", lambda: store.get_total_quantity()),
+        ("get_total_quantity (full scan)", lambda: scan_total_quantity(product_list)),
+        ("get_all_products (incremental)", lambda: store.get_all_products()),
+        ("get_all_products (full scan)", lambda: scan_all_products(product_list)),
+    ]
+    print(f"catalog size: {catalog_size}")
+    for label, call in cases:
+        seconds = timeit.timeit(call, number=repeat) / repeat
+        print(f"{label:<36} {seconds * 1e6:12.1f} us/call")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
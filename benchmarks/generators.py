@@ -0,0 +1,119 @@
+"""
+Synthetic catalogs and carts for the benchmarks.
+
+Catalogs mix Product, NonStockedProduct and LimitedProduct and give a share
+of the products one of the three built-in promotions. Carts pick products
+with a Zipf-like popularity, so a few products are in most carts, as in a
+real shop. Everything is generated from a seed, so runs are reproducible.
+"""
+import itertools
+import random
+from typing import List, Tuple
+
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount
+
+# Shares of Product, NonStockedProduct and LimitedProduct in a generated catalog
+PRODUCT_MIX = (0.8, 0.1, 0.1)
+# Share of the products that get a promotion
+PROMOTED_SHARE = 0.3
+# Stock of every stocked product, enough that benchmark orders never run out
+STOCK = 10 ** 9
+# Zipf exponent of the product popularity; 0 would make every product equally popular
+POPULARITY_SKEW = 1.1
+
+
+def promotion_catalog():
+    """ Returns one of each built-in promotion. """
+    return [SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+            PercentDiscount("30% off!", percent=30)]
+
+
+def make_catalog(size, seed=0, mix=PRODUCT_MIX, promoted_share=PROMOTED_SHARE, promotion_weights=None,
+                 stock=STOCK) -> List[Product]:
+    """
+        Generates a catalog of products with random prices and promotions.
+
+        Args:
+            size (int): The number of products.
+            seed (int): The seed of the catalog.
+            mix (Tuple[float, float, float]): The shares of Product,
+            NonStockedProduct and LimitedProduct.
+            promoted_share (float): The share of the products with a promotion.
+            promotion_weights (Tuple[float, float, float]): The relative weights of
+            the promotions of promotion_catalog(), equal by default.
+            stock (int): The stock of every stocked product.
+
+        Returns:
+            List[Product]: The products.
+        """
+    rng = random.Random(seed)
+    promotions = promotion_catalog()
+    kinds = rng.choices(range(3), weights=mix, k=size)
+    products = []
+    for index, kind in enumerate(kinds):
+        name = f"Product {index}"
+        price = rng.randint(1, 100_000) / 100
+        if kind == 0:
+            product = Product(name, price=price, quantity=stock)
+        elif kind == 1:
+            product = NonStockedProduct(name, price=price)
+        else:
+            product = LimitedProduct(name, price=price, quantity=stock, maximum=rng.randint(1, 5))
+        if rng.random() < promoted_share:
+            if promotion_weights is None:
+                product.set_promotion(rng.choice(promotions))
+            else:
+                product.set_promotion(rng.choices(promotions, weights=promotion_weights)[0])
+        products.append(product)
+    return products
+
+
+class CartGenerator:
+    """
+        Generates carts over a catalog with skewed product popularity.
+
+        The i-th most popular product is chosen with a weight of 1 / i ** skew.
+        Popularity ranks are shuffled over the catalog, so popular products are
+        spread across product types and promotions.
+        """
+    def __init__(self, products, seed=0, skew=POPULARITY_SKEW):
+        """
+            Initializes a new CartGenerator instance.
+
+            Args:
+                products (List[Product]): The catalog.
+                seed (int): The seed of the carts.
+                skew (float): The Zipf exponent of the popularity.
+            """
+        self._rng = random.Random(seed)
+        self._products = list(products)
+        self._rng.shuffle(self._products)
+        self._cumulative_weights = list(itertools.accumulate(
+            1 / rank ** skew for rank in range(1, len(self._products) + 1)))
+
+    def line(self) -> Tuple[Product, int]:
+        """ Returns a random (product, quantity) line that the product's rules allow. """
+        product = self._rng.choices(self._products, cum_weights=self._cumulative_weights)[0]
+        limit = product.maximum if isinstance(product, LimitedProduct) else 5
+        return product, self._rng.randint(1, limit)
+
+    def carts(self, count, max_lines=3) -> List[List[Tuple[Product, int]]]:
+        """
+            Generates carts of one to max_lines distinct products.
+
+            Args:
+                count (int): The number of carts.
+                max_lines (int): The largest number of lines in a cart.
+
+            Returns:
+                List[List[Tuple[Product, int]]]: The carts.
+            """
+        carts = []
+        for _ in range(count):
+            lines = {}
+            for _ in range(self._rng.randint(1, max_lines)):
+                product, quantity = self.line()
+                lines.setdefault(product, quantity)
+            carts.append(list(lines.items()))
+        return carts
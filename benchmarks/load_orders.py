@@ -0,0 +1,124 @@
+"""
+Load generator for the asyncio order service.
+
+Starts server.py in a subprocess on a generated catalog with ample stock,
+opens many concurrent sessions that each place a series of random orders,
+and reports the p50/p99 request latency and the orders per second. The
+client is a single asyncio process too, so at high session counts it shares
+the CPU budget with the server.
+
+Run from the repository root:
+    python -m benchmarks.load_orders [sessions] [orders_per_session]
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from catalog_io import dump_products
+from products import Product
+
+CATALOG_SIZE = 1000
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+
+
+async def start_server(catalog_path):
+    """
+        Starts the order service on a free port.
+
+        Args:
+            catalog_path (str): The catalog file the service loads.
+
+        Returns:
+            Tuple[asyncio.subprocess.Process, int]: The server process and its port.
+        """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, SERVER, "--port", "0", "--catalog", catalog_path,
+        stderr=asyncio.subprocess.PIPE)
+    while True:
+        line = (await process.stderr.readline()).decode()
+        if not line:
+            raise RuntimeError("The order service exited before serving.")
+        match = re.search(r"Serving on port (\d+)", line)
+        if match:
+            return process, int(match.group(1))
+
+
+async def run_session(port, order_count, seed, latencies):
+    """
+        Places random orders over one connection, recording each latency.
+
+        Args:
+            port (int): The port of the service.
+            order_count (int): The number of orders to place.
+            seed (int): The seed of the carts.
+            latencies (List[float]): Receives the latency of each order in seconds.
+
+        Returns:
+            int: The number of failed orders.
+        """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    failures = 0
+    for _ in range(order_count):
+        items = [{"name": f"Product {rng.randrange(CATALOG_SIZE)}", "quantity": rng.randint(1, 3)}
+                 for _ in range(rng.randint(1, 3))]
+        request = (json.dumps({"command": "order", "items": items}) + "\n").encode()
+        start = time.perf_counter()
+        writer.write(request)
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        failures += not response["ok"]
+    writer.write(b'{"command": "quit"}\n')
+    await reader.readline()
+    writer.close()
+    return failures
+
+
+def percentile(sorted_values, fraction) -> float:
+    """ Returns the value below which the given fraction of the sorted values lie. """
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def run(sessions, orders_per_session):
+    """ Runs the load test against a fresh service and prints the results. """
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "catalog.jsonl")
+        dump_products((Product(f"Product {index}", price=10, quantity=10 ** 9)
+                       for index in range(CATALOG_SIZE)), catalog_path)
+        process, port = await start_server(catalog_path)
+        try:
+            latencies = []
+            start = time.perf_counter()
+            failures = await asyncio.gather(*(run_session(port, orders_per_session, seed, latencies)
+                                              for seed in range(sessions)))
+            elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            await process.wait()
+
+    latencies.sort()
+    print(f"{sessions} sessions x {orders_per_session} orders: "
+          f"{len(latencies) / elapsed:8.0f} orders/s, "
+          f"p50 {percentile(latencies, 0.5) * 1e3:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1e3:.2f} ms, "
+          f"{sum(failures)} failed")
+
+
+def main(sessions=2000, orders_per_session=20):
+    """
+        Runs the load test.
+
+        Args:
+            sessions (int): The number of concurrent sessions.
+            orders_per_session (int): The number of orders each session places.
+        """
+    asyncio.run(run(sessions, orders_per_session))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,378 @@
+"""
+Order-replay simulator for capacity planning.
+
+Replays a trace of orders against Store.order from a number of worker
+threads and reports what the store sustained:
+    orders_per_second           orders placed per second of wall-clock time
+    orders_per_cpu_second       orders placed per second of process CPU time
+    latency_us                  p50, p90, p99, p99.9 and maximum order latency
+    outcome                     orders completed and failed by reason, unfilled
+                                lines, products sold out and revenue
+
+A trace is a JSON Lines file of orders, one per line, with the items of the
+order service protocol of server.py:
+    {"items": [{"name": "Product 12", "quantity": 2}]}
+so a recorded session of "order" commands replays as it is; lines with any
+other command are skipped. Without --trace, carts with skewed product
+popularity are generated from the seed, and --record writes them as a trace.
+
+The catalog is a .csv or .jsonl file (--catalog), or is generated from the
+seed with the given promotion mix and stock. Every round replays the whole
+trace on a freshly built catalog, and the fastest round is reported. Worker
+w places orders w, w + concurrency, w + 2 * concurrency... of the trace in
+that order. With one worker the outcome is the same in every run for the
+same catalog, trace and seed; with several, the interleaving of the workers
+can change which orders find stock when stock runs out, so the outcome is
+only reproducible while stock lasts. Rounds with different outcomes are
+reported, and --compare flags a changed outcome as well as a slowdown; it
+refuses a baseline that ran another configuration.
+
+Run from the repository root:
+    python -m benchmarks.replay [--trace FILE | --orders N] [--record FILE]
+                                [--catalog FILE | --catalog-size N] [--promotions S,S,S]
+                                [--stock N] [--concurrency N] [--rounds N] [--seed N]
+                                [--output FILE] [--compare BASELINE] [--threshold 0.1]
+"""
+import argparse
+import gc
+import json
+import sys
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, List, Optional, Tuple
+
+from benchmarks.generators import CartGenerator, STOCK, make_catalog
+from benchmarks.load_orders import percentile
+from benchmarks.suite import REGRESSION_THRESHOLD, git_commit
+from catalog_io import load_products
+from main import create_promotions
+from products import NonStockedProduct
+from store import Store
+
+DEFAULT_ORDERS = 100_000
+DEFAULT_CATALOG_SIZE = 100_000
+DEFAULT_ROUNDS = 3
+# Shares of the generated products with each built-in promotion: second half
+# price, third one free and 30% off, as in benchmarks.generators
+DEFAULT_PROMOTIONS = (0.1, 0.1, 0.1)
+# Latency percentiles reported
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p99.9": 0.999}
+# Tail latencies, which a garbage collection or a preempted thread moves on
+# shared machines, so they are compared but never flagged
+UNFLAGGED = ("p99.9", "max")
+# Metadata of the run configuration, which must match for --compare
+CONFIGURATION = ("trace", "orders", "catalog", "concurrency", "seed")
+# Prefix of the error Store.order raises when a line exceeds the stock
+STOCK_ERROR = "Not enough stock"
+
+
+def generate_trace(products, count, seed=0, max_lines=3) -> List[List[Tuple[str, int]]]:
+    """
+        Generates orders with skewed product popularity.
+
+        Args:
+            products (List[Product]): The catalog.
+            count (int): The number of orders.
+            seed (int): The seed of the orders; the same seed gives the same orders.
+            max_lines (int): The largest number of lines of an order.
+
+        Returns:
+            List[List[Tuple[str, int]]]: The (name, quantity) lines of each order.
+        """
+    return [[(product.name, quantity) for product, quantity in cart]
+            for cart in CartGenerator(products, seed).carts(count, max_lines)]
+
+
+def write_trace(trace, path) -> int:
+    """
+        Writes orders as a trace file.
+
+        Args:
+            trace (List[List[Tuple[str, int]]]): The (name, quantity) lines of each order.
+            path (str): The path of the trace.
+
+        Returns:
+            int: The number of orders written.
+        """
+    with open(path, "w", encoding="utf-8") as trace_file:
+        for order in trace:
+            items = [{"name": name, "quantity": quantity} for name, quantity in order]
+            trace_file.write(json.dumps({"items": items}) + "\n")
+    return len(trace)
+
+
+def read_trace(path) -> List[List[Tuple[str, int]]]:
+    """
+        Reads the orders of a trace file.
+
+        Args:
+            path (str): The path of the trace.
+
+        Returns:
+            List[List[Tuple[str, int]]]: The (name, quantity) lines of each order, in trace order.
+
+        Raises:
+            ValueError: If a line is not an order of the order service protocol.
+        """
+    trace = []
+    with open(path, encoding="utf-8") as trace_file:
+        for line_number, line in enumerate(trace_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get("command", "order") != "order":
+                    continue
+                trace.append([(item["name"], int(item["quantity"])) for item in request["items"]])
+            except (ValueError, TypeError, KeyError, AttributeError) as error:
+                raise ValueError(f"line {line_number}: not an order ({error})") from None
+    return trace
+
+
+def resolve(store, trace) -> List[Optional[List[tuple]]]:
+    """
+        Looks up the products of every order by name.
+
+        Args:
+            store (Store): The store the orders are placed with.
+            trace (List[List[Tuple[str, int]]]): The orders.
+
+        Returns:
+            List: The shopping list of each order, or None if it names a product
+            the store does not have.
+        """
+    carts = []
+    for order in trace:
+        cart = [(store.get_product(name), quantity) for name, quantity in order]
+        carts.append(None if any(product is None for product, _ in cart) else cart)
+    return carts
+
+
+def _worker(store, carts, latencies, counts):
+    """ Places every order of a worker, recording the latency and the outcome of each. """
+    clock = time.perf_counter
+    order = store.order
+    revenue = Decimal(0)
+    for cart in carts:
+        if cart is None:
+            counts["unknown_product"] += 1
+            continue
+        # Lines for sold-out products are skipped by the store, so count them before ordering
+        counts["unfilled_lines"] += sum(not isinstance(product, NonStockedProduct) and not product.is_active()
+                                        for product, _ in cart)
+        start = clock()
+        try:
+            revenue += order(cart)
+        except ValueError as error:
+            latencies.append(clock() - start)
+            counts["out_of_stock" if str(error).startswith(STOCK_ERROR) else "rejected"] += 1
+        else:
+            latencies.append(clock() - start)
+            counts["completed"] += 1
+    counts["revenue"] = revenue
+
+
+def replay(products, trace, concurrency=1) -> Tuple[dict, dict]:
+    """
+        Replays a trace against a new store of the products.
+
+        Args:
+            products (List[Product]): The catalog, which the replay changes.
+            trace (List[List[Tuple[str, int]]]): The orders.
+            concurrency (int): The number of worker threads placing orders.
+
+        Returns:
+            Tuple[dict, dict]: The performance and the outcome of the replay.
+        """
+    store = Store(products)
+    carts = resolve(store, trace)
+    stocked = [product for product in products
+               if not isinstance(product, NonStockedProduct) and product.quantity]
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    counts = [dict.fromkeys(("completed", "out_of_stock", "rejected", "unknown_product", "unfilled_lines"), 0)
+              for _ in range(concurrency)]
+    threads = [threading.Thread(target=_worker, args=(store, carts[worker::concurrency], latencies[worker],
+                                                      counts[worker]))
+               for worker in range(concurrency)]
+    gc.collect()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+
+    all_latencies = sorted(latency for worker_latencies in latencies for latency in worker_latencies)
+    latency_us = {name: percentile(all_latencies, fraction) * 1e6 if all_latencies else 0.0
+                  for name, fraction in PERCENTILES.items()}
+    latency_us["max"] = all_latencies[-1] * 1e6 if all_latencies else 0.0
+    placed = len(all_latencies)
+    performance = {
+        "orders_per_second": placed / seconds if seconds else 0.0,
+        "orders_per_cpu_second": placed / cpu_seconds if cpu_seconds else 0.0,
+        "latency_us": latency_us,
+    }
+    outcome = {name: sum(worker_counts[name] for worker_counts in counts) for name in counts[0]}
+    outcome["orders"] = len(trace)
+    outcome["stock_out_rate"] = outcome["out_of_stock"] / len(trace) if trace else 0.0
+    outcome["products_sold_out"] = sum(not product.quantity for product in stocked)
+    outcome["revenue"] = str(outcome["revenue"])
+    return performance, outcome
+
+
+def simulate(make_products: Callable[[], list], trace, concurrency=1, rounds=DEFAULT_ROUNDS) -> dict:
+    """
+        Replays a trace for several rounds and keeps the fastest one.
+
+        Args:
+            make_products: Builds a fresh catalog for each round.
+            trace (List[List[Tuple[str, int]]]): The orders.
+            concurrency (int): The number of worker threads placing orders.
+            rounds (int): The number of replays.
+
+        Returns:
+            dict: The performance of the fastest round in CPU time, the outcome of
+            the first round, and whether every round had the same outcome.
+        """
+    best, outcomes = None, []
+    for _ in range(rounds):
+        performance, outcome = replay(make_products(), trace, concurrency)
+        outcomes.append(outcome)
+        if best is None or performance["orders_per_cpu_second"] > best["orders_per_cpu_second"]:
+            best = performance
+    return {"performance": best, "outcome": outcomes[0],
+            "reproducible": all(outcome == outcomes[0] for outcome in outcomes)}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD) -> int:
+    """
+        Prints how the results changed against a baseline run.
+
+        Throughputs are better when higher and latencies when lower; changes
+        for the worse beyond the threshold are flagged, except for the tail
+        latencies of UNFLAGGED. A changed outcome is flagged too, since the
+        same trace should sell the same, unless either run had rounds with
+        different outcomes.
+
+        Args:
+            results (dict): The results of this run.
+            baseline (dict): The results of an earlier run.
+            threshold (float): The relative change for the worse that is flagged.
+
+        Returns:
+            int: The number of flagged regressions.
+
+        Raises:
+            ValueError: If the runs replayed a different trace or number of
+            orders, catalog, seed or number of workers, which makes them
+            incomparable.
+        """
+    mismatches = [f"{key} {baseline['metadata'].get(key)!r} != {results['metadata'].get(key)!r}"
+                  for key in CONFIGURATION if baseline["metadata"].get(key) != results["metadata"].get(key)]
+    if mismatches:
+        raise ValueError("The baseline ran a different configuration: " + ", ".join(mismatches) + ".")
+    regressions = 0
+    print(f"compared with {baseline['metadata'].get('commit')}:")
+    metrics = dict(results["performance"], **results["performance"]["latency_us"])
+    old_metrics = dict(baseline["performance"], **baseline["performance"]["latency_us"])
+    for name, value in metrics.items():
+        old_value = old_metrics.get(name)
+        if name == "latency_us" or not old_value:
+            continue
+        change = value / old_value - 1
+        worse = -change if name.endswith("_second") else change
+        flag = "  REGRESSION" if worse > threshold and name not in UNFLAGGED else ""
+        regressions += bool(flag)
+        print(f"{name:<22} {old_value:14,.1f} -> {value:14,.1f} {change:+7.1%}{flag}")
+    reproducible = results["reproducible"] and baseline.get("reproducible")
+    for name, value in results["outcome"].items():
+        old_value = baseline["outcome"].get(name)
+        if old_value != value:
+            regressions += bool(reproducible)
+            print(f"{name:<22} {old_value} -> {value}  " + ("OUTCOME CHANGED" if reproducible else "changed"))
+    return regressions
+
+
+def main():
+    """ Parses the command line, replays the trace and writes or compares the results. """
+    parser = argparse.ArgumentParser(description="Replay an order trace against a Store.")
+    parser.add_argument("--trace", help="JSON Lines trace of orders to replay")
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS, help="orders generated without --trace")
+    parser.add_argument("--max-lines", type=int, default=3, help="largest number of lines of a generated order")
+    parser.add_argument("--record", help="file to write the generated trace to")
+    parser.add_argument("--catalog", help="a .csv or .jsonl catalog file to load")
+    parser.add_argument("--catalog-size", type=int, default=DEFAULT_CATALOG_SIZE,
+                        help="products generated without --catalog")
+    parser.add_argument("--promotions", default=",".join(map(str, DEFAULT_PROMOTIONS)),
+                        help="shares of generated products with second half price, third one free and 30%% off")
+    parser.add_argument("--stock", type=int, default=STOCK, help="stock of every generated stocked product")
+    parser.add_argument("--concurrency", type=int, default=1, help="worker threads placing orders")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="replays, of which the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated catalog and trace")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative change for the worse flagged as a regression")
+    arguments = parser.parse_args()
+    if arguments.concurrency < 1 or arguments.rounds < 1:
+        parser.error("--concurrency and --rounds must be positive")
+
+    if arguments.catalog:
+        def make_products():
+            return list(load_products(arguments.catalog, create_promotions()))
+    else:
+        shares = [float(share) for share in arguments.promotions.split(",")]
+        if len(shares) != 3 or min(shares) < 0 or sum(shares) > 1:
+            parser.error("--promotions takes three non-negative shares adding up to at most 1")
+
+        def make_products():
+            return make_catalog(arguments.catalog_size, arguments.seed, promoted_share=sum(shares),
+                                promotion_weights=shares if sum(shares) else None, stock=arguments.stock)
+    if arguments.trace:
+        trace = read_trace(arguments.trace)
+    else:
+        trace = generate_trace(make_products(), arguments.orders, arguments.seed, arguments.max_lines)
+        if arguments.record:
+            write_trace(trace, arguments.record)
+
+    results = {
+        "metadata": {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "trace": arguments.trace,
+            "orders": len(trace),
+            "catalog": arguments.catalog or
+            f"generated: {arguments.catalog_size} products, promotions {arguments.promotions}, "
+            f"stock {arguments.stock}",
+            "concurrency": arguments.concurrency,
+            "rounds": arguments.rounds,
+            "seed": arguments.seed,
+        },
+        **simulate(make_products, trace, arguments.concurrency, arguments.rounds),
+    }
+    performance, outcome = results["performance"], results["outcome"]
+    print(f"{outcome['orders']} orders, {arguments.concurrency} workers: "
+          f"{performance['orders_per_second']:,.0f} orders/s, "
+          f"{performance['orders_per_cpu_second']:,.0f} orders/CPU s, "
+          + ", ".join(f"{name} {value:,.0f} us" for name, value in performance["latency_us"].items()))
+    print(f"completed {outcome['completed']}, out of stock {outcome['out_of_stock']} "
+          f"({outcome['stock_out_rate']:.2%}), rejected {outcome['rejected']}, "
+          f"unknown products {outcome['unknown_product']}, unfilled lines {outcome['unfilled_lines']}, "
+          f"products sold out {outcome['products_sold_out']}, revenue {outcome['revenue']}"
+          + ("" if results["reproducible"] else "; the outcome differed between rounds"))
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        try:
+            regressions = compare(results, baseline, arguments.threshold)
+        except ValueError as error:
+            parser.exit(2, f"{parser.prog}: {error}\n")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Stress test for concurrent Store.order calls.
+
+Runs random carts from several threads against one store, checks that no stock
+was oversold or lost, and reports the order throughput for each thread count.
+CPython's GIL keeps pure-Python ordering from scaling with cores; the harness
+shows how much per-product locking costs compared with a single thread.
+
+Run from the repository root:
+    python -m benchmarks.stress_concurrent_orders [orders_per_thread]
+"""
+import random
+import sys
+import threading
+import time
+
+from products import Product, LimitedProduct
+from store import Store
+
+PRICE = 10
+
+
+def build_store(catalog_size, seed):
+    """
+        Builds a store of stocked and limited products with random stock.
+
+        Args:
+            catalog_size (int): The number of products in the catalog.
+            seed (int): The seed of the random stock levels.
+
+        Returns:
+            Store: The new store.
+        """
+    rng = random.Random(seed)
+    product_list = []
+    for index in range(catalog_size):
+        quantity = rng.randint(50, 500)
+        if index % 10 == 0:
+            product_list.append(LimitedProduct(f"Limited {index}", price=PRICE, quantity=quantity,
+                                               maximum=3))
+        else:
+            product_list.append(Product(f"Product {index}", price=PRICE, quantity=quantity))
+    return Store(product_list)
+
+
+def run(thread_count, orders_per_thread, catalog_size=200, seed=0):
+    """
+        Places random orders from several threads and verifies that stock is conserved.
+
+        Args:
+            thread_count (int): The number of ordering threads.
+            orders_per_thread (int): The number of orders each thread places.
+            catalog_size (int): The number of products in the catalog.
+            seed (int): The seed of the catalog and the carts.
+
+        Returns:
+            float: The number of orders per second, failed orders included.
+        """
+    store = build_store(catalog_size, seed)
+    catalog = store.products
+    initial = {product: product.quantity for product in catalog}
+    revenue = [0.0] * thread_count
+    barrier = threading.Barrier(thread_count + 1)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        carts = [[(rng.choice(catalog), rng.randint(1, 4)) for _ in range(rng.randint(1, 5))]
+                 for _ in range(orders_per_thread)]
+        barrier.wait()
+        for cart in carts:
+            try:
+                revenue[index] += store.order(cart)
+            except ValueError:
+                pass
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Every product costs the same, so the revenue tells how many units were sold
+    units_sold = sum(initial[product] - product.quantity for product in catalog)
+    assert all(product.quantity >= 0 for product in catalog), "Stock was oversold"
+    assert units_sold * PRICE == sum(revenue), "Stock is not conserved"
+    assert store.get_total_quantity() == sum(product.quantity for product in store.get_all_products())
+    return thread_count * orders_per_thread / elapsed
+
+
+def main(orders_per_thread=2000):
+    """
+        Runs the stress test for 1 to 16 threads and prints the throughput.
+
+        Args:
+            orders_per_thread (int): The number of orders each thread places.
+        """
+    baseline = None
+    for thread_count in (1, 2, 4, 8, 16):
+        throughput = run(thread_count, orders_per_thread)
+        baseline = baseline or throughput
+        print(f"{thread_count:>2} threads: {throughput:10.0f} orders/s "
+              f"({throughput / baseline:.2f}x), stock conserved")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,245 @@
+"""
+Reproducible benchmark suite for ordering, pricing and catalog operations.
+
+For each catalog size, a catalog mixing every product type and promotion
+is generated from a seed, and the suite measures:
+    build_seconds               building the Store
+    bytes_per_sku               memory of the products and the Store, by tracemalloc
+    total_quantity_us           one get_total_quantity call
+    all_products_us             one get_all_products call, with the active list cached
+    all_products_cold_us        one get_all_products call after an activation change
+    order_per_second            Store.order throughput on skewed carts
+    order_many_per_second       Store.order_many throughput on the same carts, in batches
+    price_lines_per_second      pricing the cart lines with price_lines
+Throughputs are the fastest of a few runs in CPU time and latencies the
+fastest of many calls, to keep the noise of shared machines out of the
+results. The suite also measures the bytes of each product type alone.
+
+Results are written as JSON together with the commit, Python version and
+platform, and can be compared with an earlier results file to spot
+regressions; the suite exits with status 1 if it finds any.
+
+Run from the repository root:
+    python -m benchmarks.suite [--sizes 1000,10000,100000,1000000] [--output FILE]
+                               [--compare BASELINE] [--threshold 0.1] [--orders N] [--seed N]
+Scaling up to 10M SKUs (--sizes ...,10000000) needs several GB of memory.
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.bench_memory import bytes_per_product
+from benchmarks.generators import CartGenerator, make_catalog
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import price_lines
+from store import Store
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_ORDERS = 20_000
+BATCH_SIZE = 1_000
+# Number of runs of each throughput scenario, of which the fastest is kept
+RUNS = 3
+# Relative change beyond which --compare flags a metric
+REGRESSION_THRESHOLD = 0.10
+# Number of products per type measured for the memory of each type
+TYPE_MEMORY_COUNT = 10_000
+
+
+def per_call_us(call, repeat) -> float:
+    """ Returns the fastest of several timed calls, in microseconds. """
+    return min(timeit.repeat(call, number=1, repeat=repeat)) * 1e6
+
+
+def fastest_run(call) -> float:
+    """
+        Returns the CPU seconds of the fastest of RUNS calls.
+
+        CPU time of the fastest run filters out most of the noise of a shared machine.
+        """
+    timings = []
+    for _ in range(RUNS):
+        gc.collect()
+        start = time.process_time()
+        call()
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def measure_size(size, order_count, seed) -> dict:
+    """
+        Runs every scenario on a generated catalog of one size.
+
+        Args:
+            size (int): The number of products in the catalog.
+            order_count (int): The number of carts ordered.
+            seed (int): The seed of the catalog and the carts.
+
+        Returns:
+            dict: The metrics of the catalog size.
+        """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        traced_store = Store(make_catalog(size, seed))
+        bytes_per_sku = (tracemalloc.get_traced_memory()[0] - before) / size
+    finally:
+        tracemalloc.stop()
+    del traced_store
+    gc.collect()
+
+    products = make_catalog(size, seed)
+    start = time.perf_counter()
+    store = Store(products)
+    build_seconds = time.perf_counter() - start
+
+    repeat = 5 if size >= 1_000_000 else 20
+    total_quantity_us = per_call_us(store.get_total_quantity, repeat)
+    all_products_us = per_call_us(store.get_all_products, repeat)
+
+    def cold_all_products():
+        products[0].deactivate()
+        products[0].activate()
+        return store.get_all_products()
+    all_products_cold_us = per_call_us(cold_all_products, repeat)
+
+    carts = CartGenerator(products, seed).carts(order_count)
+    lines = [line for cart in carts for line in cart]
+
+    def order_all():
+        for cart in carts:
+            store.order(cart)
+
+    def order_batches():
+        for offset in range(0, len(carts), BATCH_SIZE):
+            store.order_many(carts[offset:offset + BATCH_SIZE])
+
+    price_lines_seconds = fastest_run(lambda: price_lines(lines))
+    order_seconds = fastest_run(order_all)
+    order_many_seconds = fastest_run(order_batches)
+
+    return {
+        "build_seconds": build_seconds,
+        "bytes_per_sku": bytes_per_sku,
+        "total_quantity_us": total_quantity_us,
+        "all_products_us": all_products_us,
+        "all_products_cold_us": all_products_cold_us,
+        "order_per_second": order_count / order_seconds,
+        "order_many_per_second": order_count / order_many_seconds,
+        "price_lines_per_second": len(lines) / price_lines_seconds,
+    }
+
+
+def measure_types() -> dict:
+    """ Returns the bytes per product of each product type alone, promotion included. """
+    factories = {
+        "Product": lambda index: Product(f"Product {index}", price=10, quantity=5),
+        "NonStockedProduct": lambda index: NonStockedProduct(f"Product {index}", price=10),
+        "LimitedProduct": lambda index: LimitedProduct(f"Product {index}", price=10, quantity=5, maximum=2),
+    }
+    return {label: bytes_per_product(factory, TYPE_MEMORY_COUNT) for label, factory in factories.items()}
+
+
+def git_commit():
+    """ Returns the commit of the working tree, or None outside a git checkout. """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, order_count, seed) -> dict:
+    """
+        Runs the suite for every catalog size, printing the metrics as they come.
+
+        Args:
+            sizes (List[int]): The catalog sizes.
+            order_count (int): The number of carts ordered per size.
+            seed (int): The seed of the catalogs and carts.
+
+        Returns:
+            dict: The metadata of the run and the metrics per catalog size.
+        """
+    results = {
+        "metadata": {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seed": seed,
+            "orders": order_count,
+        },
+        "bytes_per_type": measure_types(),
+        "sizes": {},
+    }
+    for size in sizes:
+        metrics = measure_size(size, order_count, seed)
+        results["sizes"][str(size)] = metrics
+        print(f"{size:>10} SKUs: " + ", ".join(f"{name} {value:,.1f}" for name, value in metrics.items()),
+              flush=True)
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD) -> int:
+    """
+        Prints how every metric changed against a baseline run.
+
+        Metrics ending in "_per_second" are better when higher, all others
+        when lower. Changes for the worse beyond the threshold are flagged.
+
+        Args:
+            results (dict): The results of this run.
+            baseline (dict): The results of an earlier run.
+            threshold (float): The relative change for the worse that is flagged.
+
+        Returns:
+            int: The number of flagged regressions.
+        """
+    regressions = 0
+    print(f"compared with {baseline['metadata'].get('commit')}:")
+    for size, metrics in results["sizes"].items():
+        for name, value in metrics.items():
+            old_value = baseline["sizes"].get(size, {}).get(name)
+            if not old_value:
+                continue
+            change = value / old_value - 1
+            worse = -change if name.endswith("_per_second") else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            regressions += bool(flag)
+            print(f"{size:>10} {name:<24} {old_value:14,.1f} -> {value:14,.1f} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    """ Parses the command line, runs the suite and writes or compares the results. """
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated catalog sizes")
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS, help="carts ordered per size")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the catalogs and carts")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative change for the worse flagged as a regression")
+    arguments = parser.parse_args()
+
+    results = run_suite([int(size) for size in arguments.sizes.split(",")], arguments.orders, arguments.seed)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), arguments.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from products import Product, LimitedProduct
+from promotions import Promotion
+from serialization import PRODUCT_TYPES, product_type
+
+# Columns of catalog files, in CSV column order
+FIELDS = ("type", "name", "price", "quantity", "maximum", "promotion", "active")
+# Number of rows written with each write call
+CHUNK_SIZE = 10_000
+
+
+class RowError(ValueError):
+    """
+        A catalog row that could not be turned into a product.
+
+        Attributes:
+            line (int): The line number of the row in the file.
+            message (str): What is wrong with the row.
+        """
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.message = message
+
+
+def _format(path) -> str:
+    """
+        Returns the format of a catalog file from its extension.
+
+        Raises:
+            ValueError: If the extension is neither .csv nor .jsonl.
+        """
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith(".jsonl"):
+        return "jsonl"
+    raise ValueError(f"Unknown catalog format: {path} (expected .csv or .jsonl).")
+
+
+def read_csv(lines) -> Iterator[Tuple[int, Union[dict, RowError]]]:
+    """
+        Reads catalog rows from CSV lines with a header row.
+
+        Args:
+            lines: The lines of the file, e.g. an open file.
+
+        Returns:
+            Iterator[Tuple[int, dict]]: The line number and fields of each row.
+        """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        if None in row:
+            yield reader.line_num, RowError(reader.line_num, "Too many columns.")
+        else:
+            yield reader.line_num, row
+
+
+def read_jsonl(lines) -> Iterator[Tuple[int, Union[dict, RowError]]]:
+    """
+        Reads catalog rows from JSON Lines, skipping blank lines.
+
+        Args:
+            lines: The lines of the file, e.g. an open file.
+
+        Returns:
+            Iterator[Tuple[int, dict]]: The line number and fields of each row.
+        """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, RowError(line_number, f"Invalid JSON: {error.msg}.")
+            continue
+        if isinstance(row, dict):
+            yield line_number, row
+        else:
+            yield line_number, RowError(line_number, "Expected a JSON object.")
+
+
+def _field(row, name, convert, default=None):
+    """
+        Converts a field of a row, treating missing and empty fields as the default.
+
+        Raises:
+            ValueError: If the field is required and missing, or cannot be converted.
+        """
+    value = row.get(name)
+    if value is None or value == "":
+        if default is None:
+            raise ValueError(f"Missing field {name!r}.")
+        return default
+    try:
+        return convert(value)
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError(f"Invalid {name}: {value!r}.") from None
+
+
+def _price(value) -> Decimal:
+    """ Parses a price exactly; floats from JSON go through their shortest repr. """
+    price = Decimal(str(value))
+    if not price.is_finite():
+        raise ValueError(value)
+    return price
+
+
+def _integer(value) -> int:
+    """ Parses a whole number, refusing fractional values and booleans. """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def _flag(value) -> bool:
+    """ Parses a boolean field written as true/false. """
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "1", "yes"):
+        return True
+    if str(value).lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(value)
+
+
+def parse_products(rows, promotions: Optional[Dict[str, Promotion]] = None) \
+        -> Iterator[Union[Product, RowError]]:
+    """
+        Turns catalog rows into products, one at a time.
+
+        Args:
+            rows: The (line number, fields) pairs made by read_csv or read_jsonl.
+            promotions (Dict[str, Promotion]): The promotions that rows can name.
+
+        Returns:
+            Iterator[Union[Product, RowError]]: A product for each valid row,
+            and a RowError describing each invalid one.
+        """
+    promotions = promotions or {}
+    for line_number, row in rows:
+        if isinstance(row, RowError):
+            yield row
+            continue
+        try:
+            type_name = _field(row, "type", str, Product.__name__)
+            product_class = PRODUCT_TYPES.get(type_name)
+            if product_class is None:
+                raise ValueError(f"Unknown product type: {type_name!r}.")
+            name = _field(row, "name", str)
+            price = _field(row, "price", _price)
+            if product_class is LimitedProduct:
+                product = LimitedProduct(name, price, _field(row, "quantity", _integer),
+                                         _field(row, "maximum", _integer))
+            elif product_class is Product:
+                product = Product(name, price, _field(row, "quantity", _integer))
+            else:
+                product = product_class(name, price)
+            promotion_name = _field(row, "promotion", str, "")
+            if promotion_name:
+                if promotion_name not in promotions:
+                    raise ValueError(f"Unknown promotion: {promotion_name!r}.")
+                product.set_promotion(promotions[promotion_name])
+            if not _field(row, "active", _flag, True):
+                product.deactivate()
+        except ValueError as error:
+            yield RowError(line_number, str(error))
+        else:
+            yield product
+
+
+def load_products(path, promotions: Optional[Dict[str, Promotion]] = None,
+                  errors: Optional[List[RowError]] = None) -> Iterator[Product]:
+    """
+        Streams the valid products of a CSV or JSON Lines catalog file.
+
+        Args:
+            path (str): The path of the file, ending in .csv or .jsonl.
+            promotions (Dict[str, Promotion]): The promotions that rows can name.
+            errors (List[RowError]): Receives an error for each invalid row, if given.
+
+        Returns:
+            Iterator[Product]: The products, in file order.
+
+        Raises:
+            ValueError: If the file extension is not supported.
+        """
+    reader = read_csv if _format(path) == "csv" else read_jsonl
+    with open(path, newline="", encoding="utf-8") as catalog_file:
+        for result in parse_products(reader(catalog_file), promotions):
+            if isinstance(result, RowError):
+                if errors is not None:
+                    errors.append(result)
+            else:
+                yield result
+
+
+def import_products(store, path, promotions: Optional[Dict[str, Promotion]] = None) \
+        -> List[RowError]:
+    """
+        Adds the products of a CSV or JSON Lines catalog file to a store.
+
+        Invalid rows are skipped; the others are imported.
+
+        Args:
+            store (Store): The store to add the products to.
+            path (str): The path of the file, ending in .csv or .jsonl.
+            promotions (Dict[str, Promotion]): The promotions that rows can name.
+
+        Returns:
+            List[RowError]: An error for each invalid row.
+        """
+    errors: List[RowError] = []
+    for product in load_products(path, promotions, errors):
+        store.add_product(product)
+    return errors
+
+
+def product_to_row(product) -> dict:
+    """
+        Converts a product to the fields of a catalog row.
+
+        Args:
+            product (Product): The product.
+
+        Returns:
+            dict: The catalog fields, with the promotion given by name.
+        """
+    promotion = product.get_promotion()
+    return {
+        "type": product_type(product),
+        "name": product.name,
+        "price": str(product.price),
+        "quantity": product.quantity,
+        "maximum": product.maximum if isinstance(product, LimitedProduct) else None,
+        "promotion": promotion.name if promotion else None,
+        "active": product.is_active(),
+    }
+
+
+def _csv_value(value):
+    """ Formats a field for CSV, writing None as empty and booleans as true/false. """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def dump_products(products: Iterable[Product], path, chunk_size=CHUNK_SIZE) -> int:
+    """
+        Streams products to a CSV or JSON Lines catalog file, a chunk of rows at a time.
+
+        Args:
+            products: The products to write.
+            path (str): The path of the file, ending in .csv or .jsonl.
+            chunk_size (int): The number of rows written with each write call.
+
+        Returns:
+            int: The number of rows written.
+
+        Raises:
+            ValueError: If the file extension is not supported.
+        """
+    file_format = _format(path)
+    rows = map(product_to_row, products)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as catalog_file:
+        if file_format == "csv":
+            writer = csv.writer(catalog_file)
+            writer.writerow(FIELDS)
+            while True:
+                chunk = [[_csv_value(row[field]) for field in FIELDS]
+                         for row in islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                writer.writerows(chunk)
+                count += len(chunk)
+        else:
+            while True:
+                chunk = [json.dumps({field: value for field, value in row.items() if value is not None},
+                                    separators=(",", ":")) + "\n"
+                         for row in islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                catalog_file.write("".join(chunk))
+                count += len(chunk)
+    return count
+
+
+def export_products(store, path, chunk_size=CHUNK_SIZE) -> int:
+    """
+        Writes every product of a store, active or not, to a catalog file.
+
+        Args:
+            store (Store): The store to export.
+            path (str): The path of the file, ending in .csv or .jsonl.
+            chunk_size (int): The number of rows written with each write call.
+
+        Returns:
+            int: The number of rows written.
+        """
+    return dump_products(store.products, path, chunk_size)
@@ -0,0 +1,594 @@
+from decimal import Decimal
+from fractions import Fraction
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the columnar backend
+    np = None
+
+from money import from_cents
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import NO_PROMOTION, price_batch
+from store import DEFAULT_PAGE_SIZE, ChangeBatch, ProductPage, Store
+
+# Values of the product type column
+PRODUCT, NON_STOCKED, LIMITED = 0, 1, 2
+# Columns readable with ColumnarStore.column, and the attribute holding each
+COLUMNS = {"price_cents": "_prices", "quantity": "_quantities", "active": "_active_flags",
+           "kind": "_kinds", "maximum": "_maximums", "promotion_id": "_promotion_ids"}
+
+
+def _column(attribute, convert):
+    """
+        Creates a property that reads and writes one column of the owning store.
+
+        Args:
+            attribute (str): The name of the store attribute holding the column.
+            convert: Converts a NumPy scalar to the Python type of the attribute.
+
+        Returns:
+            property: The property.
+        """
+    def getter(self):
+        return convert(getattr(self._store, attribute)[self._row])
+
+    def setter(self, value):
+        getattr(self._store, attribute)[self._row] = value
+
+    return property(getter, setter)
+
+
+class _RowView:
+    """
+        Mixin that stores the attributes of a product in a row of a ColumnarStore.
+
+        Attributes:
+            row (int): The row of the product in its store.
+        """
+    __slots__ = ()
+
+    price_cents = _column("_prices", int)
+    quantity = _column("_quantities", int)
+    active = _column("_active_flags", bool)
+    maximum = _column("_maximums", int)
+
+    def _attach(self, store, row):
+        """ Binds the view to its row, standing in for Product.__init__. """
+        self._store = store
+        self._row = row
+        self._listeners = ()
+        self.lock = store._lock
+
+    @property
+    def row(self) -> int:
+        """ Returns the row of the product in its store. """
+        return self._row
+
+    @property
+    def name(self) -> str:
+        """ Returns the name of the product. """
+        return self._store._name_of(self._row)
+
+    @property
+    def promotion(self):
+        """ Returns the promotion of the product, or None. """
+        index = self._store._promotion_ids[self._row]
+        return None if index == NO_PROMOTION else self._store._promotion_table[index]
+
+    @promotion.setter
+    def promotion(self, promotion):
+        self._store._promotion_ids[self._row] = self._store._intern_promotion(promotion)
+
+
+class ProductRow(_RowView, Product):
+    """ A Product stored in a row of a ColumnarStore. """
+    __slots__ = ("_store", "_row")
+
+
+class NonStockedProductRow(_RowView, NonStockedProduct):
+    """ A NonStockedProduct stored in a row of a ColumnarStore. """
+    __slots__ = ("_store", "_row")
+
+
+class LimitedProductRow(_RowView, LimitedProduct):
+    """ A LimitedProduct stored in a row of a ColumnarStore. """
+    __slots__ = ("_store", "_row")
+
+
+# Row view class for each value of the product type column
+_ROW_CLASSES = (ProductRow, NonStockedProductRow, LimitedProductRow)
+
+
+class ColumnarStore(Store):
+    """
+        A Store that keeps its catalog in parallel NumPy arrays.
+
+        Price in cents, quantity, active flag, product type, maximum and promotion id are
+        stored as columns. Products in the store are thin views over a row,
+        created on first access, so a catalog can be loaded without building a
+        Python object per product. Aggregate queries and bulk updates run as
+        array operations.
+
+        Products added to the store are copied into the columns; use the views
+        returned by add_product, get_product or get_all_products to order them.
+        Every view shares the store lock, so orders and bulk updates on a
+        columnar store are serialized.
+        """
+    def __init__(self, products=(), capacity=1024):
+        """
+            Initializes a new ColumnarStore instance.
+
+            Args:
+                products (List[Product]): The initial list of products in the store.
+                capacity (int): The number of rows to allocate up front.
+
+            Raises:
+                ImportError: If NumPy is not installed.
+            """
+        if np is None:
+            raise ImportError("ColumnarStore requires NumPy.")
+        super().__init__([])
+        self._size = 0
+        self._names: List[str] = []
+        self._name_rows: Dict[str, Dict[int, None]] = {}
+        self._promotion_table = []
+        # Maps id(promotion) to its index in the promotion table
+        self._promotion_index: Dict[int, int] = {}
+        self._views: Dict[int, Product] = {}
+        self._prices = np.zeros(capacity, dtype=np.int64)
+        self._quantities = np.zeros(capacity, dtype=np.int64)
+        self._active_flags = np.zeros(capacity, dtype=bool)
+        self._present = np.zeros(capacity, dtype=bool)
+        self._kinds = np.zeros(capacity, dtype=np.int8)
+        self._maximums = np.zeros(capacity, dtype=np.int64)
+        self._promotion_ids = np.full(capacity, NO_PROMOTION, dtype=np.int32)
+        for product in products:
+            self.add_product(product)
+
+    @classmethod
+    def from_columns(cls, names, price_cents, quantities, kinds=None, maximums=None) \
+            -> "ColumnarStore":
+        """
+            Creates a store straight from column data, without building Product objects.
+
+            Args:
+                names (List[str]): The names of the products.
+                price_cents: The prices of the products in cents.
+                quantities: The quantities of the products.
+                kinds: The product type of each row (PRODUCT, NON_STOCKED or LIMITED).
+                maximums: The maximum purchase quantity of each row, used by LIMITED rows.
+
+            Returns:
+                ColumnarStore: The new store, with every product active.
+
+            Raises:
+                ValueError: If a name is empty, a price or quantity is negative,
+                or a limited product has no positive maximum.
+            """
+        size = len(names)
+        store = cls(capacity=max(size, 1))
+        prices = np.asarray(price_cents, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        kinds = np.zeros(size, dtype=np.int8) if kinds is None else np.asarray(kinds, dtype=np.int8)
+        maximums = np.zeros(size, dtype=np.int64) if maximums is None \
+            else np.asarray(maximums, dtype=np.int64)
+        if not all(names) or (prices < 0).any() or (quantities < 0).any():
+            raise ValueError("Invalid input: name cannot be empty,"
+                             "and price/quantity must be non-negative.")
+        if (maximums[kinds == LIMITED] <= 0).any():
+            raise ValueError("max_quantity must be a positive integer.")
+
+        store._names = list(names)
+        store._prices[:size] = prices
+        store._quantities[:size] = np.where(kinds == NON_STOCKED, 0, quantities)
+        store._kinds[:size] = kinds
+        store._maximums[:size] = maximums
+        store._active_flags[:size] = True
+        store._present[:size] = True
+        store._size = size
+        for row, name in enumerate(store._names):
+            store._name_rows.setdefault(name, {})[row] = None
+        return store
+
+    def _view(self, row) -> Product:
+        """ Returns the view of a row, creating it on first access. """
+        view = self._views.get(row)
+        if view is None:
+            cls = _ROW_CLASSES[self._kinds[row]]
+            view = cls.__new__(cls)
+            view._attach(self, row)
+            self._views[row] = view
+        return view
+
+    def _name_of(self, row) -> str:
+        """ Returns the name of the product in a row. """
+        return self._names[row]
+
+    def _store_name(self, row, name):
+        """ Stores and indexes the name of the product in a new row. """
+        self._names.append(name)
+        self._name_rows.setdefault(name, {})[row] = None
+
+    def _forget_name(self, row, name):
+        """ Drops a removed row from the name index. """
+        rows = self._name_rows[name]
+        del rows[row]
+        if not rows:
+            del self._name_rows[name]
+
+    def _mask(self):
+        """ Returns the mask of rows holding active products. """
+        return self._active_flags[:self._size] & self._present[:self._size]
+
+    def _intern_promotion(self, promotion) -> int:
+        """ Returns the index of a promotion in the promotion table, adding it if needed. """
+        if promotion is None:
+            return NO_PROMOTION
+        index = self._promotion_index.get(id(promotion))
+        if index is None:
+            index = len(self._promotion_table)
+            self._promotion_table.append(promotion)
+            self._promotion_index[id(promotion)] = index
+        return index
+
+    def _grow(self):
+        """ Doubles the capacity of every column. """
+        capacity = 2 * len(self._prices)
+        for attribute, fill in (("_prices", 0), ("_quantities", 0), ("_active_flags", False),
+                                ("_present", False), ("_kinds", PRODUCT), ("_maximums", 0),
+                                ("_promotion_ids", NO_PROMOTION)):
+            column = getattr(self, attribute)
+            grown = np.full(capacity, fill, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, attribute, grown)
+
+    @property
+    def products(self) -> List[Product]:
+        """
+            Returns all products in the store, active or not, in insertion order.
+
+            Returns:
+                List[Product]: The list of products in the store.
+            """
+        return [self._view(row) for row in np.flatnonzero(self._present[:self._size]).tolist()]
+
+    def __contains__(self, product) -> bool:
+        """
+            Checks whether a product is a row of this store.
+
+            Args:
+                product (Product): The product to look for.
+
+            Returns:
+                bool: True if the product is in the store, otherwise False.
+            """
+        return isinstance(product, _RowView) and product._store is self \
+            and bool(self._present[product.row])
+
+    def __len__(self) -> int:
+        """ Returns the number of products in the store, active or not. """
+        return int(np.count_nonzero(self._present[:self._size]))
+
+    def add_product(self, product) -> Product:
+        """
+            Copies a product into a new row of the store.
+
+            Args:
+                product (Product): The product to add to the store.
+
+            Returns:
+                Product: The view representing the product in the store.
+            """
+        with self._lock:
+            if product in self:
+                return product
+            if self._size == len(self._prices):
+                self._grow()
+            row = self._size
+            self._size += 1
+            if isinstance(product, NonStockedProduct):
+                self._kinds[row] = NON_STOCKED
+            elif isinstance(product, LimitedProduct):
+                self._kinds[row] = LIMITED
+                self._maximums[row] = product.maximum
+            self._store_name(row, product.name)
+            self._prices[row] = product.price_cents
+            self._quantities[row] = product.quantity
+            self._active_flags[row] = product.is_active()
+            self._promotion_ids[row] = self._intern_promotion(product.get_promotion())
+            self._present[row] = True
+            return self._view(row)
+
+    def remove_product(self, product):
+        """
+            Removes a product from the store.
+
+            Args:
+                product (Product): The view of the product to remove.
+            """
+        with self._lock:
+            if product not in self:
+                return
+            self._present[product.row] = False
+            self._forget_name(product.row, product.name)
+
+    def add_index(self, index):
+        """
+            Secondary indexes are not supported, since row views do not report
+            changes; query the columns instead.
+
+            Raises:
+                ValueError: Always.
+            """
+        raise ValueError("ColumnarStore does not support secondary indexes.")
+
+    def get_product(self, name):
+        """
+            Looks up a product by its name.
+
+            Args:
+                name (str): The name of the product.
+
+            Returns:
+                Optional[Product]: The first product added with the given name,
+                or None if not found.
+            """
+        rows = self._name_rows.get(name)
+        return self._view(next(iter(rows))) if rows else None
+
+    def get_total_quantity(self) -> int:
+        """
+            Returns the total quantity of all active products in the store.
+
+            Returns:
+                int: The total quantity in the store.
+            """
+        with self._lock:
+            return float(self._quantities[:self._size][self._mask()].sum())
+
+    def get_all_products(self) -> List[Product]:
+        """
+            Returns a list of all active products in the store.
+
+            Returns:
+                List[Product]: A list of all active products in the store.
+            """
+        with self._lock:
+            return [self._view(row) for row in np.flatnonzero(self._mask()).tolist()]
+
+    def list_products(self, page_size=DEFAULT_PAGE_SIZE, sort_key="catalog", token=None,
+                      include_inactive=False) -> ProductPage:
+        """
+            Returns one page of the products of the store, as Store.list_products does.
+
+            Pages are selected from the columns, so a listing by catalog order
+            costs one scan of the rows after the token and a listing by price
+            one sort of the products after it. Listing by name is not supported.
+
+            Args:
+                page_size (int): The largest number of products on the page.
+                sort_key (str): The sort order: "catalog" or "price".
+                token (str): The next_token of the previous page, or None for the first page.
+                include_inactive (bool): Whether inactive products are listed.
+
+            Returns:
+                ProductPage: The views of the products and the token of the next page.
+
+            Raises:
+                ValueError: If the page size is not positive, the sort order is
+                not "catalog" or "price", or the token is not one of a listing in that order.
+            """
+        position = self._page_position(page_size, sort_key, token)
+        if sort_key == "name":
+            raise ValueError("ColumnarStore lists products by catalog order or price only.")
+        with self._lock:
+            selected = self._present[:self._size] if include_inactive else self._mask()
+            if sort_key == "catalog":
+                first_row = 0 if position is None else position[0] + 1
+                rows = np.flatnonzero(selected[first_row:])[:page_size + 1] + first_row
+            else:
+                prices = self._prices[:self._size]
+                if position is not None:
+                    price, row = position
+                    after = (prices > price) | ((prices == price) & (np.arange(self._size) > row))
+                    selected = selected & after
+                rows = np.flatnonzero(selected)
+                rows = rows[np.lexsort((rows, prices[rows]))[:page_size + 1]]
+            rows = rows.tolist()
+            products = [self._view(row) for row in rows[:page_size]]
+            if len(rows) <= page_size:
+                return ProductPage(products, None)
+            last_row = rows[page_size - 1]
+            position = (last_row,) if sort_key == "catalog" else (int(self._prices[last_row]), last_row)
+            return ProductPage(products, self._page_token(sort_key, position))
+
+    def get_total_value(self) -> Decimal:
+        """
+            Returns the value of the stock of all active products, at list price.
+
+            Returns:
+                Decimal: The sum of price times quantity over the active products.
+            """
+        with self._lock:
+            mask = self._mask()
+            return from_cents(np.dot(self._prices[:self._size][mask],
+                                     self._quantities[:self._size][mask]))
+
+    def rows_of(self, products):
+        """
+            Returns the rows of the given products.
+
+            Args:
+                products: Views of products in the store.
+
+            Returns:
+                numpy.ndarray: The row of each product.
+            """
+        return np.fromiter((product.row for product in products), dtype=np.int64)
+
+    def column(self, name):
+        """
+            Returns a read-only view of a column, one entry per row.
+
+            Comparing columns gives row masks for the bulk operations, such as
+            store.column("price_cents") < 500_00.
+
+            Args:
+                name (str): The column, one of COLUMNS.
+
+            Returns:
+                numpy.ndarray: The column, over every row including removed ones.
+
+            Raises:
+                ValueError: If there is no such column.
+            """
+        if name not in COLUMNS:
+            raise ValueError(f"Unknown column: {name!r}.")
+        column = getattr(self, COLUMNS[name])[:self._size].view()
+        column.flags.writeable = False
+        return column
+
+    def _select_rows(self, products, where):
+        """
+            Returns the rows a bulk operation changes.
+
+            The whole catalog and row masks are selected over the columns, without
+            building a view per product; a product predicate needs the views.
+
+            Args:
+                products: The candidate products, or None for the whole catalog.
+                where: A predicate the products must satisfy, a boolean mask with
+                one entry per row, or None to take every candidate.
+
+            Returns:
+                numpy.ndarray: The selected rows.
+
+            Raises:
+                ValueError: If a candidate is not in the store, or a mask does not
+                have one entry per row.
+            """
+        if where is None or callable(where):
+            if products is None and where is None:
+                return np.flatnonzero(self._present[:self._size])
+            return self.rows_of(self._select(products, where))
+        mask = np.asarray(where, dtype=bool)
+        if mask.shape != (self._size,):
+            raise ValueError("A row mask needs one entry per row.")
+        mask = mask & self._present[:self._size]
+        if products is None:
+            return np.flatnonzero(mask)
+        rows = self.rows_of(self._select(products, None))
+        return rows[mask[rows]]
+
+    def price_rows(self, rows, quantities):
+        """
+            Prices a quantity of each given row without buying it.
+
+            Args:
+                rows: The rows to price.
+                quantities: The quantity to price for each row.
+
+            Returns:
+                numpy.ndarray: The total price of each row in cents, promotions applied.
+            """
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            return price_batch(self._prices[rows], np.asarray(quantities, dtype=np.int64),
+                               self._promotion_ids[rows], self._promotion_table)
+
+    def reprice(self, percent, rows=None):
+        """
+            Changes the price of products by a percentage, rounding half up to the cent.
+
+            Args:
+                percent (float): The price change, e.g. 10 for +10% or -25 for -25%.
+                rows: The rows to reprice, or None for every product.
+
+            Raises:
+                ValueError: If the change would make prices negative.
+            """
+        if percent < -100:
+            raise ValueError("Price must be non-negative.")
+        factor = 1 + Fraction(Decimal(str(percent))) / 100
+        rows = slice(0, self._size) if rows is None else np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            self._prices[rows] = ((self._prices[rows] * factor.numerator + factor.denominator // 2)
+                                  // factor.denominator)
+
+    def _row_batch(self, attribute, rows, old_values, new_values, convert=None) -> ChangeBatch:
+        """ Builds the ChangeBatch of the rows whose column value changed. """
+        changed = old_values != new_values
+        old_values, new_values = old_values[changed].tolist(), new_values[changed].tolist()
+        if convert is not None:
+            old_values, new_values = list(map(convert, old_values)), list(map(convert, new_values))
+        return ChangeBatch(attribute, [self._view(row) for row in rows[changed].tolist()],
+                           old_values, new_values)
+
+    def bulk_reprice(self, percent, products=None, where=None) -> ChangeBatch:
+        """
+            Changes the price of many products by a percentage, as one array operation.
+
+            See Store.bulk_reprice; the products are views of this store, and
+            where may also be a row mask built from column().
+            """
+        rows = self._select_rows(products, where)
+        with self._lock:
+            old_prices = self._prices[rows]
+            self.reprice(percent, rows)
+            return self._row_batch("price", rows, old_prices, self._prices[rows])
+
+    def bulk_set_promotion(self, promotion, products=None, where=None) -> ChangeBatch:
+        """
+            Sets the promotion of many products, as one array operation.
+
+            See Store.bulk_set_promotion; the products are views of this store,
+            and where may also be a row mask built from column().
+            """
+        rows = self._select_rows(products, where)
+        with self._lock:
+            old_ids = self._promotion_ids[rows]
+            self._promotion_ids[rows] = self._intern_promotion(promotion)
+            return self._row_batch("promotion", rows, old_ids, self._promotion_ids[rows],
+                                   lambda index: None if index == NO_PROMOTION else self._promotion_table[index])
+
+    def bulk_set_active(self, active, products=None, where=None) -> ChangeBatch:
+        """
+            Activates or deactivates many products, as one array operation.
+
+            See Store.bulk_set_active; the products are views of this store, and
+            where may also be a row mask built from column().
+            """
+        rows = self._select_rows(products, where)
+        with self._lock:
+            old_flags = self._active_flags[rows]
+            self._active_flags[rows] = bool(active)
+            return self._row_batch("active", rows, old_flags, self._active_flags[rows])
+
+    def update_stock(self, rows, deltas):
+        """
+            Adds a quantity to the stock of each given row, as one transaction.
+
+            Rows reaching a quantity of 0 are deactivated, as with set_quantity,
+            except non-stocked ones, which always have a quantity of 0.
+            Listeners registered on the views are not notified.
+
+            Args:
+                rows: The rows to update; a row may appear more than once.
+                deltas: The quantity to add to each row, negative to take stock.
+
+            Raises:
+                ValueError: If a quantity would become negative. No row is updated then.
+            """
+        rows = np.asarray(rows, dtype=np.int64)
+        deltas = np.asarray(deltas, dtype=np.int64)
+        unique_rows, positions = np.unique(rows, return_inverse=True)
+        summed = np.zeros(len(unique_rows), dtype=np.int64)
+        np.add.at(summed, positions, deltas)
+        with self._lock:
+            quantities = self._quantities[unique_rows] + summed
+            if (quantities < 0).any():
+                raise ValueError("Quantity must be non-negative.")
+            self._quantities[unique_rows] = quantities
+            sold_out = (quantities == 0) & (self._kinds[unique_rows] != NON_STOCKED)
+            self._active_flags[unique_rows[sold_out]] = False
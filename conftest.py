@@ -0,0 +1,15 @@
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice
+
+
+@pytest.fixture
+def make_products():
+    # Returns a factory of fresh products, one of every type, for tests that build several stores
+    def make():
+        laptop = Product("Laptop", price=1200, quantity=50)
+        laptop.set_promotion(SecondHalfPrice("Second Half price!"))
+        return [laptop,
+                NonStockedProduct("Windows License", price=125),
+                LimitedProduct("Shipping", price=10, quantity=250, maximum=1)]
+    return make
@@ -0,0 +1,346 @@
+"""
+An inventory change feed, so downstream systems process deltas instead of scanning the Store.
+
+A ChangeFeed registered with Store.add_index records a ChangeEvent for every
+catalog change: products added and removed, stock changes, products
+deactivated (such as when set_quantity reaches zero) and reactivated, price
+changes and promotions set, and one event per bulk operation of the store.
+Events go into a bounded ring buffer and carry a
+sequence number. Consumers read them with a Cursor, or subscribe a callback
+that receives them in batches from a delivery thread.
+
+Publishing an event costs one plain tuple and one slot write, without a
+lock. Slow consumers never hold up the store; they miss the events the ring
+buffer has overwritten instead.
+"""
+import itertools
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+# Event kinds
+ADDED = "added"
+REMOVED = "removed"
+STOCK_CHANGED = "stock_changed"
+DEACTIVATED = "deactivated"
+ACTIVATED = "activated"
+PRICE_CHANGED = "price_changed"
+PROMOTION_SET = "promotion_set"
+BULK_CHANGED = "bulk_changed"
+
+# Default number of events the ring buffer holds, a power of two
+DEFAULT_CAPACITY = 2 ** 16
+# Default largest number of events delivered to a subscriber at once
+DEFAULT_BATCH_SIZE = 1024
+
+
+class ChangeEvent(NamedTuple):
+    """
+        A change to the catalog of a store.
+
+        Attributes:
+            sequence (int): The position of the event in the feed.
+            kind (str): What changed, one of the event kinds of this module.
+            product (Product): The product that changed, or None for bulk changes.
+            old_value: The value before the change: the old quantity, price in
+            cents or promotion, or None for additions, removals and bulk changes.
+            new_value: The value after the change; the store.ChangeBatch for bulk changes.
+        """
+    sequence: int
+    kind: str
+    product: object
+    old_value: object
+    new_value: object
+
+
+class ChangeFeed:
+    """
+        A bounded ring buffer of catalog change events.
+
+        The feed keeps the latest capacity events. Sequence numbers start at 0
+        and grow by one per event, so a consumer's position is simply the
+        sequence number of the next event it wants.
+
+        Registering the feed does not replay the existing catalog; consumers
+        start from the catalog's state at that time.
+        """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+            Initializes a new, empty ChangeFeed instance.
+
+            Args:
+                capacity (int): The number of events kept, rounded up to a power of two.
+
+            Raises:
+                ValueError: If the capacity is not positive.
+            """
+        if capacity <= 0:
+            raise ValueError("The capacity of a change feed must be positive.")
+        capacity = 1 << (capacity - 1).bit_length()
+        self._buffer: List[Optional[tuple]] = [None] * capacity
+        self._mask = capacity - 1
+        # Taking a number from the counter and writing a slot are each atomic,
+        # so publishers need no lock for them; events are plain tuples, which are
+        # much cheaper to build, until read() makes them ChangeEvents
+        self._sequences = itertools.count()
+        # The sequence number after the latest event, a hint for readers. It is
+        # advanced under the lock, so a publisher that took its number earlier
+        # but finished later never moves it back
+        self._next_sequence = 0
+        self._lock = threading.Lock()
+        self._subscriptions: List["Subscription"] = []
+        self._delivery: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def capacity(self) -> int:
+        """ Returns the number of events the ring buffer holds. """
+        return len(self._buffer)
+
+    @property
+    def next_sequence(self) -> int:
+        """ Returns the sequence number the next event will get. """
+        return self._next_sequence
+
+    def publish(self, kind, product, old_value=None, new_value=None):
+        """
+            Appends an event, overwriting the oldest one if the buffer is full.
+
+            Args:
+                kind (str): What changed.
+                product (Product): The product that changed.
+                old_value: The value before the change.
+                new_value: The value after the change.
+            """
+        sequence = next(self._sequences)
+        self._buffer[sequence & self._mask] = (sequence, kind, product, old_value, new_value)
+        with self._lock:
+            if sequence >= self._next_sequence:
+                self._next_sequence = sequence + 1
+
+    def read(self, position, max_events=DEFAULT_BATCH_SIZE) -> List[ChangeEvent]:
+        """
+            Returns the events from a position on, oldest first.
+
+            Events already overwritten are skipped, so the first event returned
+            may have a larger sequence number than the position asked for.
+
+            Args:
+                position (int): The sequence number of the first event wanted.
+                max_events (int): The largest number of events returned.
+
+            Returns:
+                List[ChangeEvent]: The events.
+            """
+        buffer, mask = self._buffer, self._mask
+        sequence = max(position, self._next_sequence - len(buffer))
+        events = []
+        # Every slot holds the sequence number of its event, so reading stops at
+        # a slot that is not written yet, or was overwritten while reading
+        while len(events) < max_events:
+            event = buffer[sequence & mask]
+            if event is None or event[0] != sequence:
+                break
+            events.append(event)
+            sequence += 1
+        return list(map(ChangeEvent._make, events))
+
+    def cursor(self, position=None) -> "Cursor":
+        """
+            Returns a cursor over the feed.
+
+            Args:
+                position (int): The sequence number of the first event to read,
+                by default the next event published.
+
+            Returns:
+                Cursor: The cursor.
+            """
+        return Cursor(self, self._next_sequence if position is None else position)
+
+    # Catalog hooks, called by Store for every registered index
+
+    def add_all(self, products):
+        """ Does nothing: consumers start from the catalog as it is when the feed is registered. """
+
+    def add(self, product):
+        """ Publishes the addition of a product. """
+        self.publish(ADDED, product)
+
+    def remove(self, product):
+        """ Publishes the removal of a product. """
+        self.publish(REMOVED, product)
+
+    def update(self, product, attribute, old_value):
+        """
+            Publishes a product change, called as a product listener would be.
+
+            Args:
+                product (Product): The product that changed.
+                attribute (str): The name of the attribute that changed.
+                old_value: The value of the attribute before the change.
+            """
+        if attribute == "quantity":
+            kind, new_value = STOCK_CHANGED, product.quantity
+        elif attribute == "active":
+            kind, new_value = ACTIVATED if product.is_active() else DEACTIVATED, product.is_active()
+        elif attribute == "price":
+            kind, new_value = PRICE_CHANGED, product.price_cents
+        elif attribute == "promotion":
+            kind, new_value = PROMOTION_SET, product.get_promotion()
+        else:
+            return
+        # The body of publish, inlined since this runs for every line of every order
+        sequence = next(self._sequences)
+        self._buffer[sequence & self._mask] = (sequence, kind, product, old_value, new_value)
+        with self._lock:
+            if sequence >= self._next_sequence:
+                self._next_sequence = sequence + 1
+
+    def update_many(self, batch):
+        """
+            Publishes a bulk change as a single event.
+
+            Args:
+                batch (store.ChangeBatch): The change.
+            """
+        if batch.products:
+            self.publish(BULK_CHANGED, None, new_value=batch)
+
+    # Push delivery
+
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None], batch_size=DEFAULT_BATCH_SIZE,
+                  position=None) -> "Subscription":
+        """
+            Registers a callback that receives the events in batches.
+
+            Batches are delivered by deliver(), which the delivery thread of
+            start() calls periodically.
+
+            Args:
+                callback: Called with each batch of events, oldest first.
+                batch_size (int): The largest number of events per batch.
+                position (int): The sequence number of the first event to deliver,
+                by default the next event published.
+
+            Returns:
+                Subscription: The subscription, to check for missed events or to unsubscribe.
+            """
+        subscription = Subscription(self.cursor(position), callback, batch_size)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+            Stops delivering events to a subscription.
+
+            Args:
+                subscription (Subscription): The subscription to cancel.
+            """
+        with self._lock:
+            self._subscriptions = [other for other in self._subscriptions if other is not subscription]
+
+    def deliver(self) -> int:
+        """
+            Delivers every pending event to every subscriber, in batches.
+
+            A callback that raises is unsubscribed, with the exception kept as
+            the error of its subscription, so one failing consumer cannot stop
+            delivery to the others or end the delivery thread.
+
+            Returns:
+                int: The number of events delivered, counted once per subscriber.
+            """
+        delivered = 0
+        for subscription in self._subscriptions:
+            try:
+                while True:
+                    events = subscription.cursor.poll(subscription.batch_size)
+                    if not events:
+                        break
+                    subscription.callback(events)
+                    delivered += len(events)
+            except Exception as error:
+                subscription.error = error
+                self.unsubscribe(subscription)
+        return delivered
+
+    def start(self, interval=0.05):
+        """
+            Starts a daemon thread that calls deliver() every interval seconds.
+
+            Args:
+                interval (float): The number of seconds between deliveries.
+            """
+        if self._delivery is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.deliver()
+            self.deliver()
+
+        self._delivery = threading.Thread(target=run, name="change-feed-delivery", daemon=True)
+        self._delivery.start()
+
+    def stop(self):
+        """ Stops the delivery thread after a final delivery. """
+        if self._delivery is None:
+            return
+        self._stop.set()
+        self._delivery.join()
+        self._delivery = None
+
+
+class Cursor:
+    """
+        A consumer's position in a change feed.
+
+        Attributes:
+            position (int): The sequence number of the next event to read.
+            missed (int): The number of events overwritten before the cursor
+            read them; a consumer that misses events should rescan the store.
+        """
+    def __init__(self, feed, position):
+        self.feed = feed
+        self.position = position
+        self.missed = 0
+
+    def poll(self, max_events=DEFAULT_BATCH_SIZE) -> List[ChangeEvent]:
+        """
+            Returns the events after the cursor's position and moves past them.
+
+            Args:
+                max_events (int): The largest number of events returned.
+
+            Returns:
+                List[ChangeEvent]: The events, oldest first.
+            """
+        events = self.feed.read(self.position, max_events)
+        if events:
+            self.missed += events[0].sequence - self.position
+            self.position = events[-1].sequence + 1
+        return events
+
+    def lag(self) -> int:
+        """ Returns the number of events published that the cursor has not read. """
+        return self.feed.next_sequence - self.position
+
+
+class Subscription:
+    """
+        A callback receiving a change feed in batches.
+
+        Attributes:
+            cursor (Cursor): The position of the subscriber.
+            callback: Called with each batch of events.
+            batch_size (int): The largest number of events per batch.
+            error (Exception): The exception the callback raised, which
+            unsubscribed it, or None.
+        """
+    def __init__(self, cursor, callback, batch_size):
+        self.cursor = cursor
+        self.callback = callback
+        self.batch_size = batch_size
+        self.error = None
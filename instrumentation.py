@@ -0,0 +1,409 @@
+"""
+Instrumentation of the checkout hot paths, and an on-demand sampling profiler.
+
+Instrumentation is off by default and then costs nothing: enable() wraps
+Store.order and Store.order_many, every buy_cents and apply_promotion
+implementation, Product.set_quantity and the lock acquisition of Store
+orders with timed versions that report to a sink, and disable() puts the
+original functions back. A sink receives:
+    observe(name, seconds)      the latency of each call, named "Class.method"
+    count(name, amount)         the calls that raised, as "Class.method.errors"
+    event(name, **fields)       "contention" when an order waits for a product
+                                lock, and "stock_out" when a product's stock
+                                reaches zero
+Classes defined after enable() are not instrumented until it is called again.
+
+A SamplingProfiler records the stacks of all other threads at a fixed
+interval; install_profiler_toggle starts and stops one on a signal.
+"""
+import collections
+import functools
+import math
+import signal
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from products import Product
+from promotions import Promotion
+from store import Store
+
+# Number of buckets per power of two in a Histogram, each at most 12.5% wide
+SUB_BUCKETS = 8
+# Bucket of zero values, below the bucket of any positive float
+_ZERO_BUCKET = -2 ** 31
+# Number of recent events a MemorySink keeps
+EVENT_HISTORY = 10_000
+
+
+class Sink:
+    """
+        Receives instrumentation data. The base class ignores everything.
+        """
+    def observe(self, name, value):
+        """ Records a measurement, such as the latency of a call in seconds. """
+
+    def count(self, name, amount=1):
+        """ Adds to a counter. """
+
+    def event(self, name, **fields):
+        """ Records an event, such as a product running out of stock. """
+
+
+class Histogram:
+    """
+        Counts values in logarithmic buckets, to estimate percentiles in constant memory.
+
+        Attributes:
+            count (int): The number of values.
+            total (float): The sum of the values.
+            maximum (float): The largest value.
+        """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, value):
+        """
+            Adds a value.
+
+            Args:
+                value (float): A non-negative value.
+            """
+        mantissa, exponent = math.frexp(value)
+        bucket = exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS) if value > 0 else _ZERO_BUCKET
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, fraction) -> float:
+        """
+            Estimates the value below which a fraction of the values lie.
+
+            Args:
+                fraction (float): The fraction, from 0 to 1.
+
+            Returns:
+                float: The upper bound of the bucket holding the percentile, or 0 without values.
+            """
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                if bucket == _ZERO_BUCKET:
+                    return 0.0
+                exponent, sub_bucket = divmod(bucket, SUB_BUCKETS)
+                return min(math.ldexp(0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS), exponent), self.maximum)
+        return self.maximum
+
+    def summary(self) -> dict:
+        """
+            Returns the count, mean, p50, p99 and maximum of the values.
+
+            Returns:
+                dict: The summary.
+            """
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(0.5), "p99": self.percentile(0.99), "max": self.maximum}
+
+
+class MemorySink(Sink):
+    """
+        Aggregates instrumentation data in memory.
+
+        Latencies go into a Histogram per name. Events are counted per name and
+        per product, and the most recent ones are kept.
+
+        Attributes:
+            counters (Dict[str, int]): The counters, including "event" and "event:product" counts.
+            histograms (Dict[str, Histogram]): The histograms of observed values.
+            events (Deque[Tuple[str, dict]]): The most recent events and their fields.
+        """
+    def __init__(self, history=EVENT_HISTORY):
+        """
+            Initializes a new, empty MemorySink instance.
+
+            Args:
+                history (int): The number of recent events to keep.
+            """
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = collections.Counter()
+        self.histograms: Dict[str, Histogram] = collections.defaultdict(Histogram)
+        self.events = collections.deque(maxlen=history)
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].add(value)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def event(self, name, **fields):
+        with self._lock:
+            self.counters[name] += 1
+            if "product" in fields:
+                self.counters[f"{name}:{fields['product']}"] += 1
+            self.events.append((name, fields))
+
+    def report(self) -> dict:
+        """
+            Returns a JSON-compatible summary of everything recorded.
+
+            Returns:
+                dict: The counters and the summary of each histogram.
+            """
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "latencies": {name: histogram.summary() for name, histogram in self.histograms.items()}}
+
+
+# The sink of the installed instrumentation, and the (owner, name, original) of each patched attribute
+_sink: Optional[Sink] = None
+_patched: List[Tuple[type, str, object]] = []
+_patch_lock = threading.Lock()
+
+
+def _timed(name, function, sink):
+    """ Wraps a function to report its latency, and the exceptions it raises, to a sink. """
+    clock = time.perf_counter
+    observe = sink.observe
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            sink.count(name + ".errors")
+            raise
+        finally:
+            observe(name, clock() - start)
+    return timed
+
+
+def _reporting_stock_outs(set_quantity, sink):
+    """ Wraps Product.set_quantity to report products whose stock reaches zero. """
+    @functools.wraps(set_quantity)
+    def instrumented(product, new_quantity):
+        old_quantity = product.quantity
+        set_quantity(product, new_quantity)
+        if new_quantity == 0 and old_quantity:
+            sink.event("stock_out", product=product.name)
+    return instrumented
+
+
+def _reporting_contention(sink):
+    """ Builds a Store._locked that reports every product lock an order had to wait for. """
+    clock = time.perf_counter
+
+    @contextmanager
+    def locked(products):
+        with ExitStack() as stack:
+            for product in sorted(set(products), key=id):
+                lock = product.lock
+                if not lock.acquire(blocking=False):
+                    start = clock()
+                    lock.acquire()
+                    sink.event("contention", product=product.name, seconds=clock() - start)
+                stack.callback(lock.release)
+            yield
+    return locked
+
+
+def _implementations(base, name):
+    """ Returns the classes of a hierarchy that define a method themselves. """
+    classes, pending = [], [base]
+    while pending:
+        cls = pending.pop()
+        if name in vars(cls) and not getattr(vars(cls)[name], "__isabstractmethod__", False):
+            classes.append(cls)
+        pending.extend(cls.__subclasses__())
+    return classes
+
+
+def _patch(owner, name, replacement):
+    """ Replaces a class attribute, remembering the original for disable(). """
+    _patched.append((owner, name, vars(owner)[name]))
+    setattr(owner, name, replacement)
+
+
+def enable(sink: Sink) -> Sink:
+    """
+        Instruments the checkout hot paths, reporting to a sink.
+
+        Enabling again replaces the previous sink.
+
+        Args:
+            sink (Sink): The sink to report to.
+
+        Returns:
+            Sink: The sink.
+        """
+    global _sink
+    with _patch_lock:
+        _unpatch()
+        _sink = sink
+        for owner, name in [(Store, "order"), (Store, "order_many")] \
+                + [(cls, "buy_cents") for cls in _implementations(Product, "buy_cents")] \
+                + [(cls, "apply_promotion") for cls in _implementations(Promotion, "apply_promotion")]:
+            _patch(owner, name, _timed(f"{owner.__name__}.{name}", vars(owner)[name], sink))
+        _patch(Product, "set_quantity", _reporting_stock_outs(vars(Product)["set_quantity"], sink))
+        _patch(Store, "_locked", staticmethod(_reporting_contention(sink)))
+    return sink
+
+
+def _unpatch():
+    """ Restores every patched attribute, newest first. """
+    global _sink
+    while _patched:
+        owner, name, original = _patched.pop()
+        setattr(owner, name, original)
+    _sink = None
+
+
+def disable():
+    """ Removes the instrumentation, restoring the original functions. """
+    with _patch_lock:
+        _unpatch()
+
+
+def is_enabled() -> bool:
+    """
+        Checks whether the hot paths are instrumented.
+
+        Returns:
+            bool: True if enable() was called since the last disable(), otherwise False.
+        """
+    return _sink is not None
+
+
+class SamplingProfiler:
+    """
+        Samples the call stacks of all other threads at a fixed interval.
+
+        Sampling runs in a daemon thread and needs no changes to the profiled
+        code; its cost is one stack walk per thread per interval, and nothing
+        while it is stopped.
+
+        Attributes:
+            interval (float): The number of seconds between samples.
+            stacks (Counter): The number of samples of each stack, outermost frame first.
+        """
+    def __init__(self, interval=0.005):
+        """
+            Initializes a new, stopped SamplingProfiler instance.
+
+            Args:
+                interval (float): The number of seconds between samples.
+            """
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """ Returns whether the profiler is sampling. """
+        return self._thread is not None
+
+    def start(self):
+        """ Starts sampling. Starting a running profiler is a no-op. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops sampling, keeping the samples taken so far. """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """ Takes samples until stopped. """
+        own_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def top(self, count=20) -> List[Tuple[str, int]]:
+        """
+            Returns the functions seen most often at the top of a stack.
+
+            Args:
+                count (int): The number of functions.
+
+            Returns:
+                List[Tuple[str, int]]: The functions and their sample counts.
+            """
+        leaves = collections.Counter()
+        for stack, samples in self.stacks.items():
+            leaves[stack[-1]] += samples
+        return leaves.most_common(count)
+
+    def collapsed(self) -> str:
+        """
+            Returns the samples in the collapsed stack format read by flame graph tools.
+
+            Returns:
+                str: One "frame;frame;frame count" line per stack.
+            """
+        return "".join(f"{';'.join(stack)} {samples}\n" for stack, samples in self.stacks.most_common())
+
+
+def install_profiler_toggle(path, signum=getattr(signal, "SIGUSR1", None), interval=0.005) -> SamplingProfiler:
+    """
+        Starts and stops a SamplingProfiler each time the process receives a signal.
+
+        Stopping writes the collapsed stacks of the run to a file. Must be called
+        from the main thread.
+
+        Args:
+            path (str): The file to write the collapsed stacks to.
+            signum (int): The signal, SIGUSR1 by default.
+            interval (float): The number of seconds between samples.
+
+        Returns:
+            SamplingProfiler: The profiler.
+
+        Raises:
+            ValueError: If the platform has no such signal.
+        """
+    if signum is None:
+        raise ValueError("This platform has no signal to toggle the profiler with.")
+    profiler = SamplingProfiler(interval)
+
+    def toggle(signum, frame):
+        if not profiler.running:
+            profiler.stacks.clear()
+            profiler.start()
+            return
+        # Stop and write from a thread, since joining the sampler inside a handler could wait on it
+        threading.Thread(target=_stop_and_write, args=(profiler, path), daemon=True).start()
+
+    signal.signal(signum, toggle)
+    return profiler
+
+
+def _stop_and_write(profiler, path):
+    """ Stops a profiler and writes its collapsed stacks to a file. """
+    profiler.stop()
+    with open(path, "w", encoding="utf-8") as stacks_file:
+        stacks_file.write(profiler.collapsed())
@@ -1,7 +1,15 @@
+import itertools
+import sys
+
+from catalog_io import import_products
+from persistence import DurableStore
 from store import Store
 import products
 import promotions
 
+# Number of products formatted and printed at a time when listing the store
+LISTING_PAGE_SIZE = 100
+
 
 def show_menu():
     """ Displays the menu options for the user """
@@ -12,20 +20,48 @@ def show_menu():
     print("4. Quit")
 
 
-def list_all_products(store):
+def list_all_products(store, page_size=LISTING_PAGE_SIZE):
     """
         Lists all active products in the given store.
 
+        Products are fetched, formatted and printed one page at a time, so a
+        large catalog is never held in memory as a whole.
+
         Args:
             store (Store): The store object.
+            page_size (int): The number of products printed at a time.
         """
     print("------")
     print("List of all products in store:")
-    for index, product in enumerate(store.get_all_products(), start=1):
-        print(f"{index}. {product.show()}")
+    number, token = 1, None
+    while True:
+        page = store.list_products(page_size, token=token)
+        if page.products:
+            print("\n".join(f"{index}. {product.show()}"
+                            for index, product in enumerate(page.products, start=number)))
+        number += len(page.products)
+        token = page.next_token
+        if token is None:
+            break
     print("------")
 
 
+def product_by_number(store, number):
+    """
+        Finds a product by its number in the listing of list_all_products.
+
+        Args:
+            store (Store): The store object.
+            number (int): The number of the product, starting at 1.
+
+        Returns:
+            Optional[Product]: The product, or None if there is no such number.
+        """
+    if number < 1:
+        return None
+    return next(itertools.islice(store.iter_products(), number - 1, None), None)
+
+
 def show_total_amount(store):
     """
         Displays the total quantity of all active products in the store.
@@ -55,11 +91,9 @@ def make_order(store):
             if not product_index:
                 break
 
-            product_index = int(product_index)
-            # Validate product index
-            if 1 <= product_index <= len(store.products):
-                product = store.products[product_index - 1]
-            else:
+            # Validate product number, counted over the active products as listed
+            product = product_by_number(store, int(product_index))
+            if product is None:
                 print("Invalid product number. Please try again.")
                 continue
 
@@ -114,14 +148,30 @@ def start(store):
             print("Invalid choice. Please enter a number between 1 and 4.")
 
 
-def main():
+def create_promotions():
     """
-        Initializes the store with an initial stock of products and starts the user interface.
+        Creates the promotion catalog of the store.
 
-        This function sets up an initial inventory of products for the store and then
-        initiates the user interface by calling the `start` function.
+        Returns:
+            Dict[str, Promotion]: The promotions, by name.
+        """
+    second_half_price = promotions.SecondHalfPrice("Second Half price!")
+    third_one_free = promotions.ThirdOneFree("Third One Free!")
+    thirty_percent = promotions.PercentDiscount("30% off!", percent=30)
+    return {promotion.name: promotion
+            for promotion in (second_half_price, third_one_free, thirty_percent)}
+
+
+def create_inventory(promotion_catalog):
+    """
+        Creates the initial stock of inventory, with promotions applied.
+
+        Args:
+            promotion_catalog (Dict[str, Promotion]): The promotions made by create_promotions.
+
+        Returns:
+            List[Product]: The products.
         """
-    # setup initial stock of inventory
     # setup initial stock of inventory
     product_list = [products.Product("MacBook Air M2", price=1450, quantity=100),
                     products.Product("Bose QuietComfort Earbuds", price=250, quantity=500),
@@ -130,15 +180,40 @@ def main():
                     products.LimitedProduct("Shipping", price=10, quantity=250, maximum=1)
                     ]
 
-    # Create promotion catalog
-    second_half_price = promotions.SecondHalfPrice("Second Half price!")
-    third_one_free = promotions.ThirdOneFree("Third One Free!")
-    thirty_percent = promotions.PercentDiscount("30% off!", percent=30)
-
     # Add promotions to products
-    product_list[0].set_promotion(second_half_price)
-    product_list[1].set_promotion(third_one_free)
-    product_list[3].set_promotion(thirty_percent)
+    product_list[0].set_promotion(promotion_catalog["Second Half price!"])
+    product_list[1].set_promotion(promotion_catalog["Third One Free!"])
+    product_list[3].set_promotion(promotion_catalog["30% off!"])
+    return product_list
+
+
+def main():
+    """
+        Initializes the store with an initial stock of products and starts the user interface.
+
+        This function sets up an initial inventory of products for the store and then
+        initiates the user interface by calling the `start` function. When a data
+        directory is given on the command line, the store is kept there and the
+        initial inventory is only added to an empty store. When a .csv or .jsonl
+        catalog file is given instead, the store is loaded from it.
+        """
+    promotion_catalog = create_promotions()
+    product_list = create_inventory(promotion_catalog)
+
+    if len(sys.argv) > 1 and sys.argv[1].endswith((".csv", ".jsonl")):
+        best_buy = Store([])
+        for error in import_products(best_buy, sys.argv[1], promotion_catalog):
+            print(f"Skipped {error}")
+        start(best_buy)
+        return
+
+    if len(sys.argv) > 1:
+        with DurableStore(sys.argv[1]) as best_buy:
+            if not len(best_buy):
+                for product in product_list:
+                    best_buy.add_product(product)
+            start(best_buy)
+        return
 
     best_buy = Store(product_list)
 
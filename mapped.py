@@ -0,0 +1,251 @@
+import json
+import mmap
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the mapped backend
+    np = None
+
+from columnar import ColumnarStore
+from products import Product
+from serialization import promotion_from_dict, promotion_to_dict
+
+# Identifies catalog files and the version of their layout
+MAGIC = b"BBCAT001"
+# The header holds the magic, the row count, and the promotion table as JSON
+HEADER_SIZE = 4096
+_HEADER = struct.Struct("<8sQI")
+NAME_SIZE = 64
+
+# One fixed-width record per product, in native little-endian layout
+RECORD_DTYPE = None if np is None else np.dtype([
+    ("name", f"S{NAME_SIZE}"),
+    ("price_cents", "<i8"),
+    ("quantity", "<i8"),
+    ("maximum", "<i8"),
+    ("promotion_id", "<i4"),
+    ("kind", "i1"),
+    ("active", "?"),
+    ("present", "?"),
+    ("padding", "V1"),
+])
+
+
+class MappedStore(ColumnarStore):
+    """
+        A ColumnarStore whose columns live in a memory-mapped catalog file.
+
+        The file starts with a fixed-size header followed by one fixed-width
+        record per row. Opening a catalog maps the file and reads only the
+        header, so startup takes the same time for any catalog size; the OS
+        pages records in as they are read. Products are row views created on
+        first access, and every change to a row, such as the quantity taken by
+        an order, is written straight to the mapped file.
+
+        Changes reach the disk when the OS writes the pages back, or on flush().
+        Names are not indexed, so that opening never reads every record;
+        get_product scans the name column instead.
+        """
+    def __init__(self, path):
+        """
+            Opens a catalog file created by MappedStore.create.
+
+            Args:
+                path (str): The path of the catalog file.
+
+            Raises:
+                ImportError: If NumPy is not installed.
+                ValueError: If the file is not a catalog file.
+            """
+        super().__init__(capacity=1)
+        self.path = path
+        self._file = open(path, "r+b")
+        file_size = os.fstat(self._file.fileno()).st_size
+        if file_size < HEADER_SIZE or self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a catalog file.")
+        self._map(file_size)
+        _, size, table_length = _HEADER.unpack_from(self._mmap)
+        self._size = size
+        table = json.loads(bytes(self._mmap[_HEADER.size:_HEADER.size + table_length]))
+        self._promotion_table = [promotion_from_dict(data) for data in table]
+        self._promotion_index = {id(promotion): index
+                                 for index, promotion in enumerate(self._promotion_table)}
+
+    @classmethod
+    def create(cls, path, products=(), capacity=1024) -> "MappedStore":
+        """
+            Creates an empty catalog file, adds products to it and opens it.
+
+            Args:
+                path (str): The path of the new catalog file.
+                products (List[Product]): The products to copy into the catalog.
+                capacity (int): The number of rows to allocate up front.
+
+            Returns:
+                MappedStore: The store over the new file.
+
+            Raises:
+                ImportError: If NumPy is not installed.
+            """
+        if np is None:
+            raise ImportError("MappedStore requires NumPy.")
+        with open(path, "wb") as catalog_file:
+            catalog_file.write(_HEADER.pack(MAGIC, 0, 2) + b"[]")
+            catalog_file.truncate(HEADER_SIZE + max(capacity, 1) * RECORD_DTYPE.itemsize)
+        store = cls(path)
+        for product in products:
+            store.add_product(product)
+        return store
+
+    @classmethod
+    def create_from_columns(cls, path, names, price_cents, quantities, kinds=None, maximums=None) \
+            -> "MappedStore":
+        """
+            Creates a catalog file straight from column data, like ColumnarStore.from_columns.
+
+            Args:
+                path (str): The path of the new catalog file.
+                names (List[str]): The names of the products.
+                price_cents: The prices of the products in cents.
+                quantities: The quantities of the products.
+                kinds: The product type of each row (PRODUCT, NON_STOCKED or LIMITED).
+                maximums: The maximum purchase quantity of each row, used by LIMITED rows.
+
+            Returns:
+                MappedStore: The store over the new file, with every product active.
+
+            Raises:
+                ValueError: If a column holds an invalid value or a name is too long.
+            """
+        columns = ColumnarStore.from_columns(names, price_cents, quantities, kinds, maximums)
+        size = len(names)
+        encoded = np.array([name.encode("utf-8") for name in names], dtype=object)
+        if size and max(map(len, encoded)) > NAME_SIZE:
+            raise ValueError(f"Product names must fit in {NAME_SIZE} bytes.")
+        store = cls.create(path, capacity=size)
+        store._records["name"][:size] = encoded.astype(RECORD_DTYPE["name"])
+        for attribute in ("_prices", "_quantities", "_active_flags", "_present", "_kinds",
+                          "_maximums", "_promotion_ids"):
+            getattr(store, attribute)[:size] = getattr(columns, attribute)[:size]
+        store._size = size
+        store._write_header()
+        return store
+
+    def _map(self, file_size):
+        """ Maps the file and binds every column to its field of the records. """
+        self._mmap = mmap.mmap(self._file.fileno(), file_size)
+        capacity = (file_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self._records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=capacity,
+                                      offset=HEADER_SIZE)
+        self._prices = self._records["price_cents"]
+        self._quantities = self._records["quantity"]
+        self._maximums = self._records["maximum"]
+        self._promotion_ids = self._records["promotion_id"]
+        self._kinds = self._records["kind"]
+        self._active_flags = self._records["active"]
+        self._present = self._records["present"]
+
+    def _write_header(self):
+        """ Writes the row count and the promotion table to the header. """
+        table = json.dumps([promotion_to_dict(promotion) for promotion in self._promotion_table])
+        table = table.encode("utf-8")
+        if _HEADER.size + len(table) > HEADER_SIZE:
+            raise ValueError("The catalog file has no room for more distinct promotions.")
+        _HEADER.pack_into(self._mmap, 0, MAGIC, self._size, len(table))
+        self._mmap[_HEADER.size:_HEADER.size + len(table)] = table
+
+    def _grow(self):
+        """ Doubles the number of records in the file and maps it again. """
+        capacity = 2 * len(self._records)
+        self._mmap.flush()
+        self._file.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        # The old mapping stays valid until the arrays that still use it are gone
+        self._map(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+
+    def _name_of(self, row) -> str:
+        """ Returns the name of the product in a row. """
+        return self._records["name"][row].decode("utf-8")
+
+    def _store_name(self, row, name):
+        """ Stores the name of the product in a new row. """
+        self._records["name"][row] = name.encode("utf-8")
+
+    def _forget_name(self, row, name):
+        """ Does nothing: lookups by name skip rows that are not present. """
+
+    def get_product(self, name):
+        """
+            Looks up a product by its name with one scan of the name column.
+
+            Args:
+                name (str): The name of the product.
+
+            Returns:
+                Optional[Product]: The first product added with the given name,
+                or None if not found.
+            """
+        with self._lock:
+            matches = (self._records["name"][:self._size] == name.encode("utf-8")) \
+                & self._present[:self._size]
+            rows = np.flatnonzero(matches)
+            return self._view(int(rows[0])) if len(rows) else None
+
+    def _intern_promotion(self, promotion) -> int:
+        """ Returns the index of a promotion in the promotion table, saving new ones. """
+        count = len(self._promotion_table)
+        index = super()._intern_promotion(promotion)
+        if len(self._promotion_table) > count:
+            try:
+                self._write_header()
+            except ValueError:
+                del self._promotion_index[id(self._promotion_table.pop())]
+                raise
+        return index
+
+    def add_product(self, product) -> Product:
+        """
+            Copies a product into a new record of the catalog file.
+
+            Args:
+                product (Product): The product to add to the store.
+
+            Returns:
+                Product: The view representing the product in the store.
+
+            Raises:
+                ValueError: If the encoded name is longer than NAME_SIZE bytes.
+            """
+        with self._lock:
+            if product in self:
+                return product
+            if len(product.name.encode("utf-8")) > NAME_SIZE:
+                raise ValueError(f"Product names must fit in {NAME_SIZE} bytes.")
+            view = super().add_product(product)
+            self._write_header()
+            return view
+
+    def flush(self):
+        """ Writes every change made through the mapping to the file. """
+        self._mmap.flush()
+
+    def close(self):
+        """ Flushes the file and releases it; the store cannot be used afterwards. """
+        self._views.clear()
+        self._records = self._prices = self._quantities = self._maximums = None
+        self._promotion_ids = self._kinds = self._active_flags = self._present = None
+        self._mmap.flush()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays taken from the columns still use the mapping; it closes with them
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
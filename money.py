@@ -0,0 +1,31 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Number of cents in one unit of money
+CENTS_PER_UNIT = 100
+
+
+def to_cents(amount) -> int:
+    """
+        Converts an amount of money to a whole number of cents, rounding half up.
+
+        Args:
+            amount: The amount, as an int, float, str or Decimal.
+
+        Returns:
+            int: The amount in cents.
+        """
+    cents = Decimal(str(amount)) * CENTS_PER_UNIT
+    return int(cents.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents) -> Decimal:
+    """
+        Converts a whole number of cents to an exact amount of money.
+
+        Args:
+            cents (int): The amount in cents.
+
+        Returns:
+            Decimal: The amount, with two decimal places.
+        """
+    return Decimal(int(cents)).scaleb(-2)
@@ -0,0 +1,436 @@
+import itertools
+import json
+import os
+import threading
+from typing import Dict, Iterator, Tuple
+
+from products import Product
+from serialization import product_from_dict, product_to_dict, promotion_from_dict, promotion_to_dict
+from store import Store
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+LOG_FILE = "wal.log"
+# The log being folded into a snapshot by a checkpoint
+OLD_LOG_FILE = "wal.old"
+
+
+def _fsync_directory(directory):
+    """ Makes renames and new files in a directory durable. """
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+def _set_logged_value(product, attribute, value):
+    """ Sets the attribute of a product not yet in a store, so nothing is notified. """
+    if attribute == "quantity":
+        product.quantity = value
+    elif attribute == "active":
+        product.active = value
+    elif attribute == "price":
+        product.price_cents = value
+    elif attribute == "promotion":
+        product.promotion = promotion_from_dict(value)
+
+
+def _scan_log(path) -> Iterator[Tuple[dict, int]]:
+    """
+        Reads the records of a log file with the byte offset after each, stopping at a torn final write.
+
+        Args:
+            path (str): The path of the log file.
+
+        Returns:
+            Iterator[Tuple[dict, int]]: The records, in log order, and where each one ends.
+        """
+    offset = 0
+    with open(path, "rb") as log_file:
+        for line in log_file:
+            # A crash can cut the last record short, even just its newline;
+            # nothing after it was committed
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            offset += len(line)
+            yield record, offset
+
+
+def read_log(path) -> Iterator[dict]:
+    """
+        Reads the records of a log file, stopping at a torn final write.
+
+        Args:
+            path (str): The path of the log file.
+
+        Returns:
+            Iterator[dict]: The records, in log order.
+        """
+    for record, _ in _scan_log(path):
+        yield record
+
+
+class WriteAheadLog:
+    """
+        An append-only log of JSON records with group commit.
+
+        Appending only buffers a record. sync() makes every record appended so far
+        durable with one fsync, and threads that call sync() while an fsync is in
+        flight are covered by the next one, so concurrent committers share fsyncs.
+
+        Attributes:
+            path (str): The path of the log file.
+            last_lsn (int): The log sequence number of the last appended record.
+            durable_lsn (int): The log sequence number up to which records are durable.
+            sync_count (int): The number of flushes made by sync(), each one fsync.
+        """
+    def __init__(self, path, last_lsn=0, fsync=True):
+        """
+            Opens a log file for appending.
+
+            Args:
+                path (str): The path of the log file.
+                last_lsn (int): The sequence number of the last record already written.
+                fsync (bool): Whether sync() calls fsync, or only flushes to the OS.
+            """
+        self.path = path
+        self.last_lsn = last_lsn
+        self.durable_lsn = last_lsn
+        self.sync_count = 0
+        self._fsync = fsync
+        self._file = open(path, "a", encoding="utf-8")
+        # Guards the file buffer and the sequence numbers
+        self._append_lock = threading.Lock()
+        # Lets one thread at a time flush and fsync
+        self._sync_lock = threading.Lock()
+
+    def append(self, record) -> int:
+        """
+            Buffers a record at the end of the log.
+
+            Args:
+                record (dict): The JSON-compatible record.
+
+            Returns:
+                int: The log sequence number of the record.
+            """
+        with self._append_lock:
+            self.last_lsn += 1
+            record["lsn"] = self.last_lsn
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            return self.last_lsn
+
+    def sync(self, lsn=None):
+        """
+            Makes the log durable up to a sequence number.
+
+            Args:
+                lsn (int): The sequence number to wait for, by default the last appended one.
+            """
+        lsn = self.last_lsn if lsn is None else lsn
+        if self.durable_lsn >= lsn:
+            return
+        with self._sync_lock:
+            if self.durable_lsn >= lsn:
+                # Another thread's fsync covered this record
+                return
+            with self._append_lock:
+                self._file.flush()
+                target = self.last_lsn
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            self.durable_lsn = target
+            self.sync_count += 1
+
+    def rotate(self, old_path) -> int:
+        """
+            Moves the log to old_path and starts an empty log in its place.
+
+            Args:
+                old_path (str): The new path of the current log.
+
+            Returns:
+                int: The sequence number of the last record in the moved log.
+            """
+        with self._sync_lock, self._append_lock:
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.path, old_path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self.durable_lsn = self.last_lsn
+            return self.last_lsn
+
+    def close(self):
+        """ Makes every record durable and closes the log file. """
+        self.sync()
+        with self._append_lock:
+            self._file.close()
+
+
+class DurableStore(Store):
+    """
+        A Store whose inventory survives restarts.
+
+        Every change to the catalog or to a product in it (stock, active flag,
+        price and promotion) is appended to a write-ahead log. Records hold the
+        new value rather than the difference, so replaying one twice is harmless.
+        Orders, reservation commits and catalog changes return only once their
+        records are durable. Changes made straight on products become durable
+        with the next commit or sync().
+
+        Once snapshot_every records have been logged, a checkpoint writes a
+        snapshot of the catalog and drops the log it covers, so recovery loads
+        the snapshot and replays a bounded log tail.
+        """
+    def __init__(self, directory, products=(), fsync=True, snapshot_every=100_000):
+        """
+            Opens the store kept in a directory, recovering its previous state.
+
+            Args:
+                directory (str): The directory holding the snapshot and the log.
+                products (List[Product]): Products to add on top of the recovered ones.
+                fsync (bool): Whether commits wait for fsync, or only for the OS buffers.
+                snapshot_every (int): The number of log records between checkpoints.
+            """
+        super().__init__([])
+        self._directory = directory
+        self._fsync = fsync
+        self._snapshot_every = snapshot_every
+        self._by_id: Dict[int, Product] = {}
+        self._checkpoint_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        recovered, last_lsn, next_id, replayed, log_end = self._recover()
+        for product_id in sorted(recovered):
+            self._next_sequence = product_id
+            super().add_product(recovered[product_id])
+            self._by_id[product_id] = recovered[product_id]
+        self._next_sequence = max(next_id, self._next_sequence)
+
+        log_path = self._path(LOG_FILE)
+        if os.path.exists(log_path) and os.path.getsize(log_path) > log_end:
+            # Cut a torn or garbage tail, or the records appended after it would be lost
+            os.truncate(log_path, log_end)
+        if replayed:
+            # Fold the replayed log into a snapshot, so the next start skips it
+            self._write_snapshot(last_lsn)
+            open(self._path(LOG_FILE), "w").close()
+        if os.path.exists(self._path(OLD_LOG_FILE)):
+            os.remove(self._path(OLD_LOG_FILE))
+        self._log = WriteAheadLog(self._path(LOG_FILE), last_lsn, fsync)
+        self._checkpoint_lsn = last_lsn
+
+        for product in products:
+            self.add_product(product)
+
+    def _path(self, file_name) -> str:
+        """ Returns the path of a file in the store directory. """
+        return os.path.join(self._directory, file_name)
+
+    def _recover(self) -> Tuple[Dict[int, Product], int, int, bool, int]:
+        """
+            Loads the latest snapshot and replays the log written after it.
+
+            Returns:
+                Tuple: The products by id, the last sequence number, the next
+                product id, whether any log record was replayed, and the byte
+                offset after the last valid record of the current log.
+            """
+        products: Dict[int, Product] = {}
+        snapshot_lsn = 0
+        next_id = 0
+        if os.path.exists(self._path(SNAPSHOT_FILE)):
+            with open(self._path(SNAPSHOT_FILE), encoding="utf-8") as snapshot_file:
+                header = json.loads(snapshot_file.readline())
+                snapshot_lsn, next_id = header["lsn"], header["next_id"]
+                for line in snapshot_file:
+                    entry = json.loads(line)
+                    products[entry["id"]] = product_from_dict(entry["product"])
+
+        last_lsn = snapshot_lsn
+        replayed = False
+        log_end = 0
+        for file_name in (OLD_LOG_FILE, LOG_FILE):
+            if not os.path.exists(self._path(file_name)):
+                continue
+            for record, end in _scan_log(self._path(file_name)):
+                replayed = True
+                if file_name == LOG_FILE:
+                    log_end = end
+                if record["lsn"] <= snapshot_lsn:
+                    continue
+                last_lsn = record["lsn"]
+                if record["op"] == "bulk":
+                    values = record["values"] if "values" in record else itertools.repeat(record["value"])
+                    for product_id, value in zip(record["ids"], values):
+                        if product_id in products:
+                            _set_logged_value(products[product_id], record["attribute"], value)
+                    continue
+                product_id = record["id"]
+                if record["op"] == "add":
+                    products[product_id] = product_from_dict(record["product"])
+                    next_id = max(next_id, product_id + 1)
+                elif record["op"] == "remove":
+                    products.pop(product_id, None)
+                elif product_id in products:
+                    _set_logged_value(products[product_id], record["op"], record["value"])
+        return products, last_lsn, next_id, replayed, log_end
+
+    def _write_snapshot(self, lsn):
+        """
+            Atomically replaces the snapshot with the current catalog.
+
+            Args:
+                lsn (int): The sequence number of the last record the snapshot covers.
+            """
+        temporary_path = self._path(SNAPSHOT_FILE + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as snapshot_file:
+            snapshot_file.write(json.dumps({"lsn": lsn, "next_id": self._next_sequence}) + "\n")
+            for product, product_id in list(self._catalog.items()):
+                snapshot_file.write(json.dumps({"id": product_id, "product": product_to_dict(product)},
+                                               separators=(",", ":")) + "\n")
+            snapshot_file.flush()
+            if self._fsync:
+                os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, self._path(SNAPSHOT_FILE))
+        if self._fsync:
+            _fsync_directory(self._directory)
+
+    def checkpoint(self):
+        """
+            Writes a snapshot of the catalog and drops the log records it covers.
+
+            The log is switched first and the catalog is read afterwards, without
+            stopping writers. Changes made meanwhile may already show in the
+            snapshot and are also in the new log, where replaying them is harmless.
+            """
+        with self._checkpoint_lock:
+            lsn = self._log.rotate(self._path(OLD_LOG_FILE))
+            self._checkpoint_lsn = lsn
+            self._write_snapshot(lsn)
+            os.remove(self._path(OLD_LOG_FILE))
+
+    def sync(self):
+        """ Makes every change so far durable, checkpointing when the log is long. """
+        self._log.sync()
+        if self._log.last_lsn - self._checkpoint_lsn >= self._snapshot_every \
+                and not self._checkpoint_lock.locked():
+            self.checkpoint()
+
+    def close(self):
+        """ Makes every change durable and closes the log. """
+        self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _on_product_changed(self, product, attribute, old_value):
+        """
+            Logs every change to a product of the store, then updates the aggregates.
+
+            Args:
+                product (Product): The product that changed.
+                attribute (str): The name of the attribute that changed.
+                old_value: The value of the attribute before the change.
+            """
+        super()._on_product_changed(product, attribute, old_value)
+        if attribute == "quantity":
+            value = product.quantity
+        elif attribute == "active":
+            value = product.is_active()
+        elif attribute == "price":
+            value = product.price_cents
+        elif attribute == "promotion":
+            value = promotion_to_dict(product.get_promotion())
+        else:
+            return
+        self._log.append({"op": attribute, "id": self._catalog[product], "value": value})
+
+    def _on_batch(self, batch):
+        """
+            Logs a bulk change as one record, then updates the aggregates.
+
+            Prices are logged per product; a promotion or active flag, which is
+            the same for every product of the batch, is logged once.
+
+            Args:
+                batch (ChangeBatch): The change.
+            """
+        super()._on_batch(batch)
+        if not batch.products:
+            return
+        record = {"op": "bulk", "attribute": batch.attribute,
+                  "ids": [self._catalog[product] for product in batch.products]}
+        if batch.attribute == "price":
+            record["values"] = batch.new_values
+        elif batch.attribute == "promotion":
+            record["value"] = promotion_to_dict(batch.new_values[0])
+        else:
+            record["value"] = batch.new_values[0]
+        self._log.append(record)
+
+    def _apply_batch(self, attribute, products, change):
+        """ Applies a bulk change, returning once it is durable. """
+        batch = super()._apply_batch(attribute, products, change)
+        self.sync()
+        return batch
+
+    def add_product(self, product):
+        """
+            Adds a new product to the store and logs it.
+
+            Args:
+                product (Product): The product to add to the store.
+            """
+        with product.lock, self._lock:
+            if product in self:
+                return
+            super().add_product(product)
+            product_id = self._catalog[product]
+            self._by_id[product_id] = product
+            self._log.append({"op": "add", "id": product_id, "product": product_to_dict(product)})
+        self.sync()
+
+    def remove_product(self, product):
+        """
+            Removes a product from the store and logs it.
+
+            Args:
+                product (Product): The product to remove from the store.
+            """
+        with product.lock, self._lock:
+            if product not in self:
+                return
+            product_id = self._catalog[product]
+            super().remove_product(product)
+            del self._by_id[product_id]
+            self._log.append({"op": "remove", "id": product_id})
+        self.sync()
+
+    def commit(self, reservation):
+        """ Buys the stock held by a reservation, returning once it is durable. """
+        total_cost = super().commit(reservation)
+        self.sync()
+        return total_cost
+
+    def order(self, shopping_list):
+        """ Places an order, returning once it is durable. """
+        total_cost = super().order(shopping_list)
+        self.sync()
+        return total_cost
+
+    def order_many(self, orders):
+        """ Places a batch of orders, returning once they are durable. """
+        results = super().order_many(orders)
+        self.sync()
+        return results
@@ -1,4 +1,8 @@
-from promotions import Promotion
+import threading
+from decimal import Decimal
+
+from money import from_cents, to_cents
+from promotions import Promotion, pricing_cache
 
 
 class Product:
@@ -7,10 +11,15 @@ class Product:
 
         Attributes:
             name (str): The name of the product.
-            price (float): The price of the product.
+            price (Decimal): The price of the product.
+            price_cents (int): The price of the product in cents, used for all pricing.
             quantity (int): The quantity of the product in stock.
             active (bool): Whether the product is active or not.
+            lock (threading.RLock): Guards the stock of the product against concurrent buyers.
         """
+    # Slots instead of a per-instance __dict__ keep large catalogs compact
+    __slots__ = ("name", "price_cents", "quantity", "active", "promotion", "_listeners", "lock")
+
     def __init__(self, name, price, quantity):
         """
             Initializes a new Product instance.
@@ -23,10 +32,36 @@ class Product:
                              "and price/quantity must be non-negative.")
 
         self.name = name
-        self.price = price
+        self.price_cents = to_cents(price)
         self.quantity = quantity
         self.active = True
         self.promotion = None  # Initialize promotion to None
+        # Replaced rather than mutated, so notifying needs no lock or copy
+        self._listeners = ()
+        self.lock = threading.RLock()
+
+    @property
+    def price(self) -> Decimal:
+        """
+            Getter function for the price, which is stored in cents.
+
+            Returns:
+                Decimal: The exact price of the product.
+            """
+        return from_cents(self.price_cents)
+
+    @price.setter
+    def price(self, price):
+        """
+            Setter function for the price, rounded half up to the cent.
+
+            Args:
+                price: The new price, as an int, float, str or Decimal.
+            """
+        with self.lock:
+            old_price_cents = self.price_cents
+            self.price_cents = to_cents(price)
+            self._notify("price", old_price_cents)
 
     def get_quantity(self) -> float:
         """
@@ -50,11 +85,14 @@ class Product:
         if new_quantity < 0:
             raise ValueError("Quantity must be non-negative.")
 
-        self.quantity = new_quantity
+        with self.lock:
+            old_quantity = self.quantity
+            self.quantity = new_quantity
+            self._notify("quantity", old_quantity)
 
-        # Deactivate the product if quantity reaches 0
-        if self.quantity == 0:
-            self.deactivate()
+            # Deactivate the product if quantity reaches 0
+            if self.quantity == 0:
+                self.deactivate()
 
     def is_active(self) -> bool:
         """
@@ -67,11 +105,53 @@ class Product:
 
     def activate(self):
         """ Activates the product. """
-        self.active = True
+        with self.lock:
+            if not self.active:
+                self.active = True
+                self._notify("active", False)
 
     def deactivate(self):
         """ Deactivates the product. """
-        self.active = False
+        with self.lock:
+            if self.active:
+                self.active = False
+                self._notify("active", True)
+
+    def add_listener(self, listener):
+        """
+        Registers a callback that is notified whenever the product changes.
+
+        The callback is invoked as listener(product, attribute, old_value)
+        after the attribute has been updated.
+
+        Args:
+            listener: The callable to register.
+        """
+        with self.lock:
+            self._listeners += (listener,)
+
+    def remove_listener(self, listener):
+        """
+        Unregisters a callback previously registered with add_listener.
+
+        Args:
+            listener: The callable to unregister.
+        """
+        with self.lock:
+            if listener in self._listeners:
+                index = self._listeners.index(listener)
+                self._listeners = self._listeners[:index] + self._listeners[index + 1:]
+
+    def _notify(self, attribute, old_value):
+        """ Notifies all listeners that an attribute of the product has changed. """
+        for listener in self._listeners:
+            listener(self, attribute, old_value)
+
+    def _notify_except(self, skipped, attribute, old_value):
+        """ Notifies all listeners but one that an attribute of the product has changed. """
+        for listener in self._listeners:
+            if listener != skipped:
+                listener(self, attribute, old_value)
 
     def set_promotion(self, promotion: Promotion):
         """
@@ -80,7 +160,10 @@ class Product:
         Args:
             promotion: The promotion instance to set.
         """
-        self.promotion = promotion
+        with self.lock:
+            old_promotion = self.promotion
+            self.promotion = promotion
+            self._notify("promotion", old_promotion)
 
     def get_promotion(self) -> Promotion:
         """
@@ -91,6 +174,48 @@ class Product:
         """
         return self.promotion
 
+    def get_price_cents(self, quantity) -> int:
+        """
+            Returns the price in cents of a given quantity of the product,
+            applying the promotion if it exists, without buying it.
+            Promotion prices are looked up in promotions.pricing_cache when it is enabled.
+
+            Args:
+                quantity: The quantity to price.
+
+            Returns:
+                int: The total price of the quantity in cents.
+            """
+        if self.promotion:
+            if pricing_cache.enabled:
+                return pricing_cache.price(self.promotion, self.price_cents, quantity)
+            return self.promotion.apply_promotion(self, quantity)
+        return quantity * self.price_cents
+
+    def get_price(self, quantity) -> Decimal:
+        """
+            Returns the price of a given quantity of the product,
+            applying the promotion if it exists, without buying it.
+
+            Args:
+                quantity: The quantity to price.
+
+            Returns:
+                Decimal: The total price of the quantity.
+            """
+        return from_cents(self.get_price_cents(quantity))
+
+    def check_purchase(self, quantity):
+        """
+            Validates product-specific purchase rules without changing the stock.
+
+            Args:
+                quantity: The quantity to buy.
+
+            Raises:
+                ValueError: If the purchase breaks a rule of the product.
+            """
+
     def show(self) -> str:
         """
             Returns a string representation of the product,
@@ -102,7 +227,7 @@ class Product:
         promotion_info = f", Promotion: {self.promotion.name}" if self.promotion else ""
         return f"{self.name}, Price: {self.price}, Quantity: {self.quantity}{promotion_info}"
 
-    def buy(self, quantity) -> float:
+    def buy(self, quantity) -> Decimal:
         """
             Buys a given quantity of the product,
             applying the promotion if it exists.
@@ -111,28 +236,42 @@ class Product:
                 quantity: The quantity to buy.
 
             Returns:
-                float: The total price of the purchase.
+                Decimal: The total price of the purchase.
 
             Raises:
                 ValueError: If the product is not active, or if the quantity is invalid.
             """
-        if not self.is_active():
-            raise ValueError("Product is not active. Cannot make a purchase.")
+        return from_cents(self.buy_cents(quantity))
 
-        if quantity > self.quantity:
-            raise ValueError("Invalid quantity for purchase.")
+    def buy_cents(self, quantity) -> int:
+        """
+            Buys a given quantity of the product, like buy, returning the price in cents.
 
-        if self.promotion:
-            self.set_quantity(self.quantity - quantity)
-            return self.promotion.apply_promotion(self, quantity)
-        else:
-            total_price = quantity * self.price
+            Args:
+                quantity: The quantity to buy.
+
+            Returns:
+                int: The total price of the purchase in cents.
+
+            Raises:
+                ValueError: If the product is not active, or if the quantity is invalid.
+            """
+        with self.lock:
+            if not self.is_active():
+                raise ValueError("Product is not active. Cannot make a purchase.")
+
+            if quantity > self.quantity:
+                raise ValueError("Invalid quantity for purchase.")
+
+            total_price = self.get_price_cents(quantity)
             self.set_quantity(self.quantity - quantity)
             return total_price
 
 
 class NonStockedProduct(Product):
     """ Represents a non-stocked product in the store """
+    __slots__ = ()
+
     def __init__(self, name, price):
         # Call the constructor of the parent class
         super().__init__(name, price, quantity=0)
@@ -147,7 +286,7 @@ class NonStockedProduct(Product):
         promotion_info = f", Promotion: {self.promotion.name}" if self.promotion else ""
         return f"{self.name}, Price: {self.price}, Quantity: Not Applicable (Non-Stocked){promotion_info}"
 
-    def buy(self, quantity) -> float:
+    def buy_cents(self, quantity) -> int:
         """
         Overrides the buy method to handle purchasing of a non-stocked product.
 
@@ -155,14 +294,11 @@ class NonStockedProduct(Product):
             quantity: The quantity to buy.
 
         Returns:
-            float: The total price of the purchase.
+            int: The total price of the purchase in cents.
         """
 
         # For non-stocked products, quantity is not relevant; proceed with the purchase
-        if self.promotion:
-            return self.promotion.apply_promotion(self, quantity)
-        else:
-            return self.price * quantity
+        return self.get_price_cents(quantity)
 
 
 class LimitedProduct(Product):
@@ -172,13 +308,15 @@ class LimitedProduct(Product):
     Attributes:
         maximum (int): The maximum quantity allowed for purchase.
     """
+    __slots__ = ("maximum",)
+
     def __init__(self, name, price, quantity, maximum):
         """
         Initializes a new LimitedProduct instance.
 
         Args:
             name (str): The name of the product.
-            price (float): The price of the product.
+            price: The price of the product.
             quantity (int): The initial quantity of the product.
             maximum (int): The maximum quantity allowed for purchase.
 
@@ -204,24 +342,38 @@ class LimitedProduct(Product):
         return f"{self.name}, Price: {self.price}, Quantity: {self.quantity}, " \
                f"Max Quantity: {self.maximum}{promotion_info}"
 
-    def buy(self, quantity) -> float:
+    def check_purchase(self, quantity):
         """
-        Overrides the buy method to handle limited purchase quantity.
+        Overrides the purchase validation to enforce the maximum quantity.
 
         Args:
             quantity: The quantity to buy.
 
-        Returns:
-            float: The total price of the purchase.
-
         Raises:
             ValueError: If the quantity exceeds the maximum allowed quantity.
         """
         if quantity > self.maximum:
             raise ValueError(f"Quantity exceeds the maximum allowed quantity ({self.maximum}).")
 
-        if self.promotion:
-            self.set_quantity(self.quantity - quantity)
-            return self.promotion.apply_promotion(self, quantity)
-        else:
-            return super().buy(quantity)
+    def buy_cents(self, quantity) -> int:
+        """
+        Overrides the buy method to handle limited purchase quantity.
+
+        Args:
+            quantity: The quantity to buy.
+
+        Returns:
+            int: The total price of the purchase in cents.
+
+        Raises:
+            ValueError: If the quantity exceeds the maximum allowed quantity.
+        """
+        with self.lock:
+            self.check_purchase(quantity)
+
+            if self.promotion:
+                total_price = self.get_price_cents(quantity)
+                self.set_quantity(self.quantity - quantity)
+                return total_price
+            else:
+                return super().buy_cents(quantity)
@@ -0,0 +1,239 @@
+from bisect import bisect_right
+from decimal import Decimal
+from fractions import Fraction
+from functools import reduce
+from math import lcm
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Batched pricing falls back to scalar calls without NumPy
+    np = None
+
+from promotions import _INT64_LIMIT, Promotion, SecondHalfPrice, ThirdOneFree, PercentDiscount
+
+# Unit price coefficients of one repeating group of units, for promotions that
+# discount units by their position in the cart line
+UNIT_CYCLES = {
+    SecondHalfPrice: (Fraction(1), Fraction(1, 2)),
+    ThirdOneFree: (Fraction(1), Fraction(1), Fraction(0)),
+}
+
+
+def _kept(percent) -> Fraction:
+    """ Returns the exact share of the price kept by a percentage discount. """
+    return 1 - Fraction(Decimal(str(percent))) / 100
+
+
+def promotion_stages(promotion) -> Tuple[Tuple[Fraction, ...], List[List[Tuple[int, Fraction]]]]:
+    """
+        Breaks a promotion down into the stages the rule engine compiles.
+
+        A line is priced by weighting each unit with the coefficient of its
+        position in a repeating unit cycle, then multiplying the total by every
+        multiplier stage. A multiplier stage is a table of (minimum quantity,
+        kept share) tiers; the tier with the largest minimum not above the
+        quantity applies.
+
+        Args:
+            promotion (Promotion): A built-in promotion or a compiled one.
+
+        Returns:
+            Tuple: The unit cycle, or None, and the list of multiplier stages.
+
+        Raises:
+            ValueError: If the promotion cannot be expressed as stages.
+        """
+    if isinstance(promotion, CompiledPromotion):
+        return promotion.cycle, promotion.multipliers
+    if type(promotion) in UNIT_CYCLES:
+        return UNIT_CYCLES[type(promotion)], []
+    if isinstance(promotion, PercentDiscount):
+        return None, [[(0, _kept(promotion.percent))]]
+    raise ValueError(f"{type(promotion).__name__} cannot be combined by the rule engine.")
+
+
+class CompiledPromotion(Promotion):
+    """
+    Base class for promotions priced with a compiled evaluation plan.
+
+    Subclasses declare their unit cycle and multiplier stages (see
+    promotion_stages) by calling _compile from __init__. Compiling folds the
+    stages into integer tables once, so pricing a line takes a few integer
+    operations, a bisect over the quantity tiers if there are any, and one
+    rounded division.
+
+    All stages are applied exactly and the line total is rounded half up to
+    the cent once, at the end.
+
+    Attributes:
+        cycle (Tuple[Fraction, ...]): The unit cycle, or None for full price units.
+        multipliers (List): The multiplier stages, in declaration order.
+    """
+    __slots__ = ("cycle", "multipliers", "_cycle_length", "_cycle_weight", "_prefix_weights",
+                 "_thresholds", "_numerators", "_denominators", "_numerator", "_denominator")
+
+    def _compile(self, cycle, multipliers):
+        """
+        Builds the evaluation plan of a unit cycle and multiplier stages.
+
+        Args:
+            cycle (Tuple[Fraction, ...]): The unit cycle, or None for full price units.
+            multipliers (List[List[Tuple[int, Fraction]]]): The multiplier stages.
+        """
+        self.cycle = cycle
+        self.multipliers = multipliers
+        coefficients = cycle or (Fraction(1),)
+        # Put the cycle coefficients over a common denominator, so unit weights are integers
+        weight_denominator = reduce(lcm, (coefficient.denominator for coefficient in coefficients))
+        weights = [int(coefficient * weight_denominator) for coefficient in coefficients]
+        self._cycle_length = len(weights)
+        self._cycle_weight = sum(weights)
+        self._prefix_weights = tuple(sum(weights[:count]) for count in range(len(weights)))
+
+        # Every quantity at which some stage changes tier starts a row of the branch table
+        self._thresholds = tuple(sorted({0} | {minimum for stage in multipliers for minimum, _ in stage}))
+        self._numerators = []
+        self._denominators = []
+        for threshold in self._thresholds:
+            factor = Fraction(1, weight_denominator)
+            for stage in multipliers:
+                factor *= _tier(stage, threshold)
+            self._numerators.append(factor.numerator)
+            self._denominators.append(factor.denominator)
+        # Plans without quantity tiers skip the branch table
+        tiered = len(self._thresholds) > 1
+        self._numerator = None if tiered else self._numerators[0]
+        self._denominator = None if tiered else self._denominators[0]
+
+    def apply_promotion(self, product, quantity) -> int:
+        """
+        Applies the compiled plan.
+
+        Args:
+            product: The product instance.
+            quantity: The quantity to apply the promotion to.
+
+        Returns:
+            int: The discounted price in cents after applying the promotion.
+        """
+        length = self._cycle_length
+        weight = quantity // length * self._cycle_weight + self._prefix_weights[quantity % length]
+        numerator = self._numerator
+        if numerator is None:
+            tier = bisect_right(self._thresholds, quantity) - 1
+            numerator = self._numerators[tier]
+            denominator = self._denominators[tier]
+        else:
+            denominator = self._denominator
+        return (product.price_cents * weight * numerator + denominator // 2) // denominator
+
+    def apply_promotion_batch(self, prices, quantities):
+        """ Applies the compiled plan to many lines at once. """
+        cycles, rest = np.divmod(quantities, self._cycle_length)
+        weights = cycles * self._cycle_weight + np.asarray(self._prefix_weights, dtype=np.int64)[rest]
+        tiers = np.searchsorted(np.asarray(self._thresholds), quantities, side="right") - 1
+        bound = int(prices.max(initial=0)) * int(weights.max(initial=0)) * max(self._numerators)
+        # Plans with very large coefficients are computed with exact Python integers
+        dtype = np.int64 if bound < _INT64_LIMIT and max(self._denominators) < _INT64_LIMIT else object
+        numerators = np.array(self._numerators, dtype=dtype)[tiers]
+        denominators = np.array(self._denominators, dtype=dtype)[tiers]
+        totals = (prices.astype(dtype) * weights.astype(dtype) * numerators + denominators // 2) \
+            // denominators
+        return totals.astype(np.int64)
+
+
+def _tier(stage, quantity) -> Fraction:
+    """ Returns the kept share of a multiplier stage at a quantity. """
+    kept = Fraction(1)
+    for minimum, share in stage:
+        if minimum <= quantity:
+            kept = share
+    return kept
+
+
+class TieredDiscount(CompiledPromotion):
+    """
+    Represents a percentage discount that grows with the quantity of a line.
+
+    Each tier is a (minimum quantity, percent) pair; the tier with the largest
+    minimum not above the quantity applies, to every unit of the line.
+    """
+    __slots__ = ("tiers",)
+
+    def __init__(self, name, tiers):
+        """
+        Initializes a new TieredDiscount instance.
+
+        Args:
+            name (str): The name of the promotion.
+            tiers: The (minimum quantity, percent) pairs.
+
+        Raises:
+            ValueError: If there are no tiers, or a tier is invalid.
+        """
+        super().__init__(name)
+        if not tiers:
+            raise ValueError("A tiered discount needs at least one tier.")
+        for minimum, percent in tiers:
+            if isinstance(minimum, bool) or not isinstance(minimum, int) or minimum <= 0 or not 0 <= percent <= 100:
+                raise ValueError("Tiers need a positive minimum quantity and a percent from 0 to 100.")
+        self.tiers = tuple(sorted((minimum, percent) for minimum, percent in tiers))
+        self._compile(None, [[(minimum, _kept(percent)) for minimum, percent in self.tiers]])
+
+    def get_parameters(self) -> dict:
+        """
+        Returns the tiers, which together with the name recreate the promotion.
+
+        Returns:
+            dict: The keyword arguments of the promotion's constructor.
+        """
+        return {"tiers": [list(tier) for tier in self.tiers]}
+
+
+class Stacked(CompiledPromotion):
+    """
+    Represents promotions that apply together, such as 30% off plus third one free.
+
+    At most one of the promotions may discount units by position (second half
+    price or third one free); percentage and tiered discounts multiply. The
+    stack is compiled once, so pricing costs about as much as one promotion.
+    """
+    __slots__ = ("promotions",)
+
+    def __init__(self, name, promotions):
+        """
+        Initializes a new Stacked instance.
+
+        Args:
+            name (str): The name of the promotion.
+            promotions: The promotions to combine, in order.
+
+        Raises:
+            ValueError: If a promotion cannot be combined, or more than one
+            discounts units by position.
+        """
+        super().__init__(name)
+        if not promotions:
+            raise ValueError("A stack needs at least one promotion.")
+        self.promotions = tuple(promotions)
+        cycle = None
+        multipliers = []
+        for promotion in promotions:
+            promotion_cycle, promotion_multipliers = promotion_stages(promotion)
+            if promotion_cycle is not None:
+                if cycle is not None:
+                    raise ValueError("A stack can hold only one promotion that discounts units "
+                                     "by position.")
+                cycle = promotion_cycle
+            multipliers.extend(promotion_multipliers)
+        self._compile(cycle, multipliers)
+
+    def get_parameters(self) -> dict:
+        """
+        Returns the stacked promotions, which together with the name recreate the promotion.
+
+        Returns:
+            dict: The keyword arguments of the promotion's constructor.
+        """
+        return {"promotions": list(self.promotions)}
@@ -1,13 +1,94 @@
-from abc import ABC, abstractmethod
+import functools
+import inspect
+import threading
+import weakref
+from abc import ABCMeta, abstractmethod
+from decimal import Decimal
+from fractions import Fraction
+from typing import List
 
+try:
+    import numpy as np
+except ImportError:  # Batched pricing falls back to scalar calls without NumPy
+    np = None
+
+# Promotion index of lines without a promotion in batched pricing
+NO_PROMOTION = -1
+# Number of (promotion, unit price, quantity) prices kept by the pricing cache.
+# The built-in promotions compute faster than a cache lookup, so it starts disabled.
+PRICING_CACHE_SIZE = 0
+# Largest intermediate value the NumPy kernels compute in int64
+_INT64_LIMIT = 2 ** 62
+
+
+def _freeze(value):
+    """ Turns list arguments into tuples, so they can be part of an interning key. """
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _create(cls, name, parameters):
+    """ Recreates a promotion from its name and parameters, as pickling and copying do. """
+    return cls(name, **parameters)
+
+
+class _Interned(ABCMeta):
+    """
+    Metaclass that interns promotions by class and constructor arguments.
+
+    Only a new promotion is initialized, so the arguments of a later equal
+    call, such as 30.0 for 30, never overwrite the attributes of the shared one.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        arguments = inspect.signature(cls.__init__).bind(None, *args, **kwargs)
+        arguments.apply_defaults()
+        key = (cls,) + tuple(_freeze(value) for value in arguments.arguments.values())[1:]
+        with Promotion._interned_lock:
+            promotion = Promotion._interned.get(key)
+        if promotion is not None:
+            return promotion
+        promotion = super().__call__(*args, **kwargs)
+        with Promotion._interned_lock:
+            # Another thread may have created an equal promotion meanwhile
+            return Promotion._interned.setdefault(key, promotion)
+
+
+class Promotion(metaclass=_Interned):
+    """
+    Abstract class for promotions.
+
+    Promotions price in whole cents, with integer arithmetic only. Each
+    promotion documents how it rounds to the cent.
+
+    Promotions are interned by value: creating a promotion with the same class
+    and arguments as a live one returns that same object, so a catalog shares
+    one instance per distinct promotion.
+    """
+    __slots__ = ("name", "__weakref__")
+
+    _interned = weakref.WeakValueDictionary()
+    _interned_lock = threading.Lock()
 
-class Promotion(ABC):
-    """ Abstract class for promotions. """
     def __init__(self, name):
         self.name = name
 
+    def __reduce__(self):
+        # Goes through the constructor, so unpickled and copied promotions are interned too
+        return _create, (type(self), self.name, self.get_parameters())
+
+    def get_parameters(self) -> dict:
+        """
+        Returns the arguments, besides the name, that recreate the promotion.
+
+        Returns:
+            dict: The keyword arguments of the promotion's constructor.
+        """
+        return {}
+
     @abstractmethod
-    def apply_promotion(self, product, quantity) -> float:
+    def apply_promotion(self, product, quantity) -> int:
         """
         Applies the promotion to the given product and quantity.
 
@@ -16,14 +97,36 @@ class Promotion(ABC):
             quantity: The quantity to apply the promotion to.
 
         Returns:
-            float: The discounted price after applying the promotion.
+            int: The discounted price in cents after applying the promotion.
+        """
+        pass
+
+    @abstractmethod
+    def apply_promotion_batch(self, prices, quantities):
+        """
+        Applies the promotion to many lines at once.
+
+        The result of each line is exactly what apply_promotion returns for it.
+
+        Args:
+            prices (numpy.ndarray): The unit price of each line in cents.
+            quantities (numpy.ndarray): The quantity of each line.
+
+        Returns:
+            numpy.ndarray: The discounted price of each line in cents.
         """
         pass
 
 
 class SecondHalfPrice(Promotion):
-    """ Represents a second item at half price promotion. """
-    def apply_promotion(self, product, quantity) -> float:
+    """
+    Represents a second item at half price promotion.
+
+    The half price items are charged half of their total price, rounded half up to the cent.
+    """
+    __slots__ = ()
+
+    def apply_promotion(self, product, quantity) -> int:
         """
         Applies the second item at half price promotion.
 
@@ -32,18 +135,26 @@ class SecondHalfPrice(Promotion):
             quantity: The quantity to apply the promotion to.
 
         Returns:
-            float: The discounted price after applying the promotion.
+            int: The discounted price in cents after applying the promotion.
         """
         half_price_items = quantity // 2
         full_price_items = quantity - half_price_items
-        discounted_price = (full_price_items * product.price + half_price_items * product.price / 2)
+        discounted_price = (full_price_items * product.price_cents
+                            + (half_price_items * product.price_cents + 1) // 2)
         return discounted_price
 
+    def apply_promotion_batch(self, prices, quantities):
+        """ Applies the second item at half price promotion to many lines at once. """
+        half_price_items = quantities // 2
+        full_price_items = quantities - half_price_items
+        return full_price_items * prices + (half_price_items * prices + 1) // 2
+
 
 class ThirdOneFree(Promotion):
     """ Represents a buy 2, get 1 free promotion. """
+    __slots__ = ()
 
-    def apply_promotion(self, product, quantity) -> float:
+    def apply_promotion(self, product, quantity) -> int:
         """
         Applies the buy 2, get 1 free promotion.
 
@@ -52,22 +163,47 @@ class ThirdOneFree(Promotion):
             quantity: The quantity to apply the promotion to.
 
         Returns:
-            float: The discounted price after applying the promotion.
+            int: The discounted price in cents after applying the promotion.
         """
         free_items = quantity // 3
         full_price_items = quantity - free_items
-        discounted_price = full_price_items * product.price
+        discounted_price = full_price_items * product.price_cents
         return discounted_price
 
+    def apply_promotion_batch(self, prices, quantities):
+        """ Applies the buy 2, get 1 free promotion to many lines at once. """
+        free_items = quantities // 3
+        full_price_items = quantities - free_items
+        return full_price_items * prices
+
 
 class PercentDiscount(Promotion):
-    """ Represents a percentage discount promotion. """
+    """
+    Represents a percentage discount promotion.
+
+    The discount is taken off the total price of a line, rounded half up to the cent.
+    """
+    __slots__ = ("percent", "_kept_numerator", "_kept_denominator")
 
     def __init__(self, name, percent):
         super().__init__(name)
         self.percent = percent
+        # The share of the price that is kept, as an exact fraction in lowest
+        # terms, so pricing stays integer-only and the numbers stay small
+        kept = 1 - Fraction(Decimal(str(percent))) / 100
+        self._kept_numerator = kept.numerator
+        self._kept_denominator = kept.denominator
+
+    def get_parameters(self) -> dict:
+        """
+        Returns the percentage, which together with the name recreates the promotion.
 
-    def apply_promotion(self, product, quantity) -> float:
+        Returns:
+            dict: The keyword arguments of the promotion's constructor.
+        """
+        return {"percent": self.percent}
+
+    def apply_promotion(self, product, quantity) -> int:
         """
         Applies the percentage discount promotion.
 
@@ -76,7 +212,169 @@ class PercentDiscount(Promotion):
             quantity: The quantity to apply the promotion to.
 
         Returns:
-            float: The discounted price after applying the promotion.
+            int: The discounted price in cents after applying the promotion.
+        """
+        return ((product.price_cents * quantity * self._kept_numerator + self._kept_denominator // 2)
+                // self._kept_denominator)
+
+    def apply_promotion_batch(self, prices, quantities):
+        """ Applies the percentage discount promotion to many lines at once. """
+        bound = int(prices.max(initial=0)) * int(quantities.max(initial=0)) * self._kept_numerator
+        if bound >= _INT64_LIMIT or self._kept_denominator >= _INT64_LIMIT:
+            # Percents such as 100 / 3 have huge fractions, so compute with exact Python integers
+            totals = ((prices.astype(object) * quantities.astype(object) * self._kept_numerator
+                       + self._kept_denominator // 2) // self._kept_denominator)
+            return totals.astype(np.int64)
+        return ((prices * quantities * self._kept_numerator + self._kept_denominator // 2)
+                // self._kept_denominator)
+
+
+class _UnitPrice:
+    """ Stands in for a product when pricing from its unit price alone. """
+    __slots__ = ("price_cents",)
+
+    def __init__(self, price_cents):
+        self.price_cents = price_cents
+
+
+def _apply(promotion, price_cents, quantity) -> int:
+    """ Prices a quantity at a unit price with a promotion. """
+    return promotion.apply_promotion(_UnitPrice(price_cents), quantity)
+
+
+class PricingCache:
+    """
+    A bounded LRU cache of promotion prices.
+
+    Entries are keyed on the promotion, the unit price in cents and the
+    quantity. Promotions are interned by value, so the promotion identifies
+    its parameters too. Changing a product's price or calling set_promotion
+    changes the key of its next lookup, which invalidates what was cached for
+    it: stale entries are never returned and age out of the cache. Products
+    with the same price and promotion share entries.
+
+    Promotions price from the unit price and quantity only, as their batch
+    kernels do, so a cached price is the one apply_promotion would return.
+    The cache pays off for promotions that cost more to compute than a
+    lookup; with a size of 0 it is disabled and products call apply_promotion.
+
+    Attributes:
+        enabled (bool): Whether the cache keeps prices.
+        price: Returns the price in cents, as price(promotion, price_cents, quantity).
+    """
+    def __init__(self, maxsize=PRICING_CACHE_SIZE):
+        """
+        Initializes a new PricingCache instance.
+
+        Args:
+            maxsize (int): The number of prices kept, or 0 to disable caching.
+        """
+        self.resize(maxsize)
+
+    def resize(self, maxsize):
+        """
+        Empties the cache, resets its counters and sets its size.
+
+        Args:
+            maxsize (int): The number of prices kept, or 0 to disable caching.
+        """
+        # functools.lru_cache keeps the lookup in C; it is thread-safe
+        self.price = functools.lru_cache(maxsize)(_apply)
+        self.enabled = maxsize > 0
+
+    def clear(self):
+        """ Empties the cache and resets its counters. """
+        self.resize(self.price.cache_info().maxsize)
+
+    @property
+    def hits(self) -> int:
+        """ Returns the number of lookups answered from the cache. """
+        return self.price.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        """ Returns the number of lookups that computed the price. """
+        return self.price.cache_info().misses
+
+    @property
+    def evictions(self) -> int:
+        """ Returns the number of prices dropped to make room for newer ones. """
+        info = self.price.cache_info()
+        # Every miss stores one price when caching is on, and only evictions drop them.
+        # Threads missing on the same key at once store it once, counting one eviction too many.
+        return info.misses - info.currsize if info.maxsize else 0
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            dict: The hits, misses, evictions, current size and maximum size.
         """
-        discounted_price = product.price * (1 - self.percent / 100)
-        return discounted_price * quantity
+        info = self.price.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "evictions": self.evictions,
+                "size": info.currsize, "maxsize": info.maxsize}
+
+
+# The cache used by Product.get_price_cents
+pricing_cache = PricingCache()
+
+
+def price_batch(prices, quantities, promotion_ids, promotion_table):
+    """
+    Prices many lines given as arrays, dispatching on the promotion of each line.
+
+    Lines without a promotion, whose id is NO_PROMOTION or whose table entry is
+    None, are priced with one multiplication, and each promotion prices all of
+    its lines with a single apply_promotion_batch call.
+
+    Args:
+        prices (numpy.ndarray): The unit price of each line in cents.
+        quantities (numpy.ndarray): The quantity of each line.
+        promotion_ids (numpy.ndarray): The index of each line's promotion in
+            promotion_table, or NO_PROMOTION.
+        promotion_table: The promotions referenced by promotion_ids.
+
+    Returns:
+        numpy.ndarray: The total price of each line in cents.
+    """
+    totals = quantities * prices
+    for index in np.unique(promotion_ids).tolist():
+        promotion = None if index == NO_PROMOTION else promotion_table[index]
+        if promotion is not None:
+            mask = promotion_ids == index
+            totals[mask] = promotion.apply_promotion_batch(prices[mask], quantities[mask])
+    return totals
+
+
+def price_lines(lines) -> List[int]:
+    """
+    Prices many (product, quantity) lines in cents without buying them.
+
+    The lines are turned into arrays and priced with price_batch, so the result
+    of each line is exactly what product.get_price_cents(quantity) returns. Without
+    NumPy every line is priced with a scalar call.
+
+    Args:
+        lines: The (product, quantity) pairs to price.
+
+    Returns:
+        List[int]: The total price of each line in cents.
+    """
+    if np is None or not lines:
+        return [product.get_price_cents(quantity) for product, quantity in lines]
+
+    # Number the distinct products, so each one's price and promotion is read once
+    product_index = {}
+    rows = np.array([product_index.setdefault(product, len(product_index)) for product, _ in lines],
+                    dtype=np.int64)
+    quantities = np.array([quantity for _, quantity in lines], dtype=np.int64)
+    prices = np.array([product.price_cents for product in product_index], dtype=np.int64)
+    promotions = [product.promotion for product in product_index]
+    # Number the distinct promotions by identity; None is priced as no promotion
+    distinct = {id(promotion): promotion for promotion in promotions}
+    table_index = {identity: index for index, identity in enumerate(distinct)}
+    promotion_ids = np.array([table_index[id(promotion)] for promotion in promotions],
+                             dtype=np.int64)
+    return price_batch(prices[rows], quantities, promotion_ids[rows],
+                       list(distinct.values())).tolist()
@@ -0,0 +1,365 @@
+"""
+Replenishment forecasting from order velocity, with low-stock signals.
+
+A ReplenishmentPlanner registered with Store.add_index counts the stock
+that orders take as units sold, in a rolling window of time buckets:
+two weeks of daily buckets by default. From the window it keeps, per
+product, the units sold and their sum of squares, updated as sales come in
+and as buckets expire, so the daily velocity, the days to stock-out and the
+reorder point of a product take O(1) to compute, without rescanning history.
+
+Restocks and manual adjustments do not count as sales. When any stock
+change takes a product to its reorder point or below, the planner raises a
+low-stock signal. Product.set_quantity notifies the store
+before it deactivates a product that sells out, so the signal always comes
+before the deactivation. A product is signalled once until it is
+restocked above its reorder point.
+
+Counters live in one flat array of doubles, so memory is a fixed number of
+bytes per product that has sold, whatever the number of sales.
+"""
+import collections
+import math
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Seconds per bucket of the sales window, and buckets per window
+DEFAULT_BUCKET_SECONDS = 24 * 60 * 60
+DEFAULT_BUCKET_COUNT = 14
+# Days between ordering stock and receiving it
+DEFAULT_LEAD_TIME_DAYS = 7
+# Standard deviations of daily demand kept as safety stock, about a 95% service level
+DEFAULT_SAFETY_FACTOR = 1.65
+# Number of signals kept for poll()
+SIGNAL_HISTORY = 10_000
+SECONDS_PER_DAY = 24 * 60 * 60
+# Positions in a row of the latest and first buckets with sales, the units
+# sold in the window and their sum of squares; the bucket counters follow
+_LATEST, _FIRST, _TOTAL, _SQUARES, _COUNTERS = range(5)
+
+
+class StockForecast(NamedTuple):
+    """
+        The stock outlook of a product.
+
+        Attributes:
+            product (Product): The product.
+            quantity (int): The stock of the product.
+            daily_velocity (float): The average units sold per day over the window.
+            days_to_stockout (float): The days until the stock runs out at that
+            velocity, or math.inf if the product has not sold.
+            reorder_point (float): The stock at which to reorder: the demand over
+            the lead time plus safety stock for its variation.
+        """
+    product: object
+    quantity: int
+    daily_velocity: float
+    days_to_stockout: float
+    reorder_point: float
+
+
+class ReplenishmentPlanner:
+    """
+        Tracks the sales velocity of the products of a store and forecasts stock-outs.
+
+        Each product that sells gets a row of a flat array of doubles, which
+        count units exactly up to 2 ** 53: the latest and first bucket it sold
+        in, the units sold in the window and their sum of squares, then one
+        counter per bucket. Keeping a row together makes a sale touch one or
+        two cache lines. Buckets of a row are expired lazily, when the row is
+        next touched, so the cost of time passing is paid only by products
+        that sell. The window counts the current bucket as a whole one, and
+        products that started selling recently are averaged over the buckets
+        since then.
+
+        Attributes:
+            bucket_seconds (float): The length of a bucket.
+            bucket_count (int): The number of buckets in the window.
+            lead_time_days (float): The days between ordering and receiving stock.
+            safety_factor (float): The standard deviations of demand kept as safety stock.
+            All four are fixed at construction.
+        """
+    def __init__(self, bucket_seconds=DEFAULT_BUCKET_SECONDS, bucket_count=DEFAULT_BUCKET_COUNT,
+                 lead_time_days=DEFAULT_LEAD_TIME_DAYS, safety_factor=DEFAULT_SAFETY_FACTOR,
+                 on_low_stock: Optional[Callable[[StockForecast], None]] = None, clock=time.time):
+        """
+            Initializes a new ReplenishmentPlanner instance, with no sales recorded.
+
+            Args:
+                bucket_seconds (float): The length of a bucket, one day by default.
+                bucket_count (int): The number of buckets in the window.
+                lead_time_days (float): The days between ordering and receiving stock.
+                safety_factor (float): The standard deviations of demand kept as safety stock.
+                on_low_stock: Called with the StockForecast of each low-stock signal,
+                while the store is locked, so it should only hand the signal over.
+                clock: Returns the current time in seconds.
+
+            Raises:
+                ValueError: If the bucket length or count is not positive, or the
+                lead time or safety factor is negative.
+            """
+        if bucket_seconds <= 0 or bucket_count <= 0:
+            raise ValueError("The bucket length and count must be positive.")
+        if lead_time_days < 0 or safety_factor < 0:
+            raise ValueError("The lead time and safety factor must be non-negative.")
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        self.lead_time_days = lead_time_days
+        self.safety_factor = safety_factor
+        # The lead time in buckets, and the safety stock per standard deviation
+        # of the units sold per bucket, which the reorder point is computed from
+        self._lead_buckets = lead_time_days * SECONDS_PER_DAY / bucket_seconds
+        self._safety_scale = safety_factor * math.sqrt(self._lead_buckets)
+        self._on_low_stock = on_low_stock
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._row_size = _COUNTERS + bucket_count
+        self._cells = array("d")
+        # Maps each product that sold to the position of its row in the cells
+        self._rows: Dict[object, int] = {}
+        # Rows of removed products, reused by the next products that sell
+        self._free_rows: List[int] = []
+        # Products signalled and not restocked since
+        self._low: Dict[object, None] = {}
+        self._signals = collections.deque(maxlen=SIGNAL_HISTORY)
+
+    def __len__(self) -> int:
+        """ Returns the number of products with sales recorded. """
+        return len(self._rows)
+
+    def _bucket(self) -> int:
+        """ Returns the number of the current bucket, counted from the epoch of the clock. """
+        return int(self._clock() // self.bucket_seconds)
+
+    def _new_row(self, product, bucket) -> int:
+        """ Allocates the row of a product at its first sale. """
+        row = self._free_rows.pop() if self._free_rows else len(self._cells)
+        self._cells[row:row + self._row_size] = array("d", [bucket, bucket]) + array("d", bytes(
+            8 * (self._row_size - _TOTAL)))
+        self._rows[product] = row
+        return row
+
+    def _roll(self, row, bucket):
+        """ Expires the buckets of a row that fell out of the window ending at a bucket. """
+        cells = self._cells
+        latest = int(cells[row + _LATEST])
+        if bucket <= latest:
+            return
+        count = self.bucket_count
+        counters = row + _COUNTERS
+        for number in range(max(latest + 1, bucket - count + 1), bucket + 1):
+            slot = counters + number % count
+            units = cells[slot]
+            if units:
+                cells[row + _TOTAL] -= units
+                cells[row + _SQUARES] -= units * units
+                cells[slot] = 0.0
+        cells[row + _LATEST] = bucket
+
+    def _add_sale(self, product, units, bucket) -> int:
+        """ Adds units sold to the current bucket of a product and returns its row. """
+        row = self._rows.get(product)
+        if row is None:
+            row = self._new_row(product, bucket)
+        else:
+            self._roll(row, bucket)
+        cells = self._cells
+        slot = row + _COUNTERS + bucket % self.bucket_count
+        units_before = cells[slot]
+        cells[slot] = units_before + units
+        cells[row + _TOTAL] += units
+        cells[row + _SQUARES] += units * (2 * units_before + units)
+        return row
+
+    def _window(self, row, bucket) -> Tuple[float, float]:
+        """ Returns the mean and the standard deviation of the units sold per bucket of a row. """
+        self._roll(row, bucket)
+        cells = self._cells
+        buckets_seen = min(self.bucket_count, bucket - cells[row + _FIRST] + 1)
+        mean = cells[row + _TOTAL] / buckets_seen
+        variance = cells[row + _SQUARES] / buckets_seen - mean * mean
+        return mean, math.sqrt(variance) if variance > 0 else 0.0
+
+    def record_sale(self, product, units, timestamp=None):
+        """
+            Records units of a product sold, such as when loading order history.
+
+            Sales older than the latest one recorded for the product count in
+            the bucket of the latest one.
+
+            Args:
+                product (Product): The product sold.
+                units (int): The number of units sold.
+                timestamp (float): When the units were sold, by default now.
+            """
+        bucket = self._bucket() if timestamp is None else int(timestamp // self.bucket_seconds)
+        with self._lock:
+            row = self._rows.get(product)
+            if row is not None:
+                bucket = max(bucket, int(self._cells[row + _LATEST]))
+            self._add_sale(product, units, bucket)
+
+    def _forecast(self, product, bucket) -> StockForecast:
+        """ Computes the forecast of a product from its window. """
+        quantity = product.quantity
+        row = self._rows.get(product)
+        if row is None:
+            return StockForecast(product, quantity, 0.0, math.inf, 0.0)
+        mean, deviation = self._window(row, bucket)
+        daily_velocity = mean * SECONDS_PER_DAY / self.bucket_seconds
+        days_to_stockout = quantity / daily_velocity if daily_velocity else math.inf
+        return StockForecast(product, quantity, daily_velocity, days_to_stockout,
+                             mean * self._lead_buckets + self._safety_scale * deviation)
+
+    def forecast(self, product) -> StockForecast:
+        """
+            Returns the stock outlook of a product.
+
+            Args:
+                product (Product): The product.
+
+            Returns:
+                StockForecast: The velocity, days to stock-out and reorder point of the product.
+            """
+        bucket = self._bucket()
+        with self._lock:
+            return self._forecast(product, bucket)
+
+    def low_stock(self) -> List[StockForecast]:
+        """
+            Returns the products signalled as low on stock and not restocked since.
+
+            Returns:
+                List[StockForecast]: The current forecast of each product, soonest stock-out first.
+            """
+        bucket = self._bucket()
+        with self._lock:
+            forecasts = [self._forecast(product, bucket) for product in self._low]
+        return sorted(forecasts, key=lambda forecast: forecast.days_to_stockout)
+
+    def poll(self) -> List[StockForecast]:
+        """
+            Returns the signals raised since the last poll, oldest first.
+
+            Returns:
+                List[StockForecast]: The forecast of each product when it was signalled.
+            """
+        with self._lock:
+            signals = list(self._signals)
+            self._signals.clear()
+        return signals
+
+    # Catalog hooks, called by Store for every registered index
+
+    def add_all(self, products):
+        """ Does nothing: rows are allocated when products first sell. """
+
+    def add(self, product):
+        """ Does nothing: rows are allocated when products first sell. """
+
+    def remove(self, product):
+        """ Forgets the sales of a product, freeing its row for reuse. """
+        with self._lock:
+            self._low.pop(product, None)
+            row = self._rows.pop(product, None)
+            if row is not None:
+                self._free_rows.append(row)
+
+    def _signal(self, product, bucket):
+        """ Raises a low-stock signal for a product not signalled since its last restock. """
+        forecast = self._forecast(product, bucket)
+        self._low[product] = None
+        self._signals.append(forecast)
+        if self._on_low_stock is not None:
+            self._on_low_stock(forecast)
+
+    def update(self, product, attribute, old_value):
+        """
+            Checks a stock change that is not a sale, such as a restock or a
+            manual adjustment, against the reorder point of a product that has
+            sold. Called as a product listener would be.
+
+            Args:
+                product (Product): The product that changed.
+                attribute (str): The name of the attribute that changed.
+                old_value: The value of the attribute before the change.
+            """
+        if attribute != "quantity":
+            return
+        bucket = self._bucket()
+        with self._lock:
+            if product not in self._rows:
+                return
+            if product.quantity > self._forecast(product, bucket).reorder_point:
+                # Restocked above the reorder point, so it can be signalled again
+                self._low.pop(product, None)
+            elif product not in self._low:
+                self._signal(product, bucket)
+
+    def sold(self, product, old_quantity):
+        """
+            Records the stock an order took as a sale and checks the product
+            against its reorder point. The store calls this instead of update
+            for sales, and for the stock a failed order puts back, which takes
+            back the sale.
+
+            Args:
+                product (Product): The product sold.
+                old_quantity (int): The stock of the product before the sale.
+            """
+        bucket = int(self._clock() // self.bucket_seconds)
+        quantity = product.quantity
+        sold = old_quantity - quantity
+        if sold < 0:
+            self._take_back(product, -sold, bucket)
+            return
+        if not sold:
+            return
+        # The bodies of _add_sale and _window, inlined since this runs for every
+        # stocked line of every order
+        with self._lock:
+            row = self._rows.get(product)
+            if row is None:
+                row = self._new_row(product, bucket)
+            cells = self._cells
+            if cells[row] != bucket:
+                self._roll(row, bucket)
+            slot = row + _COUNTERS + bucket % self.bucket_count
+            units_before = cells[slot]
+            cells[slot] = units_before + sold
+            total = cells[row + _TOTAL] = cells[row + _TOTAL] + sold
+            squares = cells[row + _SQUARES] = cells[row + _SQUARES] + sold * (2 * units_before + sold)
+            buckets_seen = bucket - cells[row + _FIRST] + 1
+            if buckets_seen > self.bucket_count:
+                buckets_seen = self.bucket_count
+            mean = total / buckets_seen
+            variance = squares / buckets_seen - mean * mean
+            deviation = math.sqrt(variance) if variance > 0 else 0.0
+            low = self._low
+            if quantity > mean * self._lead_buckets + self._safety_scale * deviation:
+                if low and product in low:
+                    # Above a reorder point lowered by slowing sales, so it can be signalled again
+                    del low[product]
+                return
+            if product not in low:
+                self._signal(product, bucket)
+
+    def _take_back(self, product, units, bucket):
+        """ Removes units of a sale taken back from the current bucket of a product. """
+        with self._lock:
+            row = self._rows.get(product)
+            if row is None:
+                return
+            self._roll(row, bucket)
+            cells = self._cells
+            slot = row + _COUNTERS + bucket % self.bucket_count
+            units_before = cells[slot]
+            units = min(units, units_before)
+            cells[slot] = units_before - units
+            cells[row + _TOTAL] -= units
+            cells[row + _SQUARES] -= units * (2 * units_before - units)
+
+    def update_many(self, batch):
+        """ Does nothing: bulk operations do not change stock. """
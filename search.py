@@ -0,0 +1,458 @@
+"""
+Secondary indexes for finding products without scanning the catalog.
+
+A SearchIndex registered with Store.add_index keeps a sorted name index for
+prefix (typeahead) queries, a sorted price index for price band queries, an
+inverted index from promotion to products and, optionally, a trigram index
+for substring queries. The store updates it as products are added, removed,
+repriced or given a new promotion.
+"""
+import itertools
+import math
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from money import to_cents
+
+# Length of the name fragments indexed for substring queries
+NGRAM_SIZE = 3
+# Sorts after every character, so (prefix + _MAX_CHAR) bounds all names with a prefix
+_MAX_CHAR = "\U0010ffff"
+# Default of SearchIndex.search, matching products with any promotion or none
+_ANY_PROMOTION = object()
+# Number of items a block of a SortedList holds before it is split in two
+BLOCK_SIZE = 1000
+# Share of the indexed products a bulk repricing must change for the price
+# list to be sorted again, rather than updated product by product
+REBUILD_SHARE = 0.125
+
+
+def _name_key(name) -> str:
+    """ Returns the case-insensitive form of a name that the indexes sort and match on. """
+    return name.casefold()
+
+
+def _ngrams(key) -> Set[str]:
+    """ Returns the distinct fragments of a name key indexed for substring queries. """
+    return {key[start:start + NGRAM_SIZE] for start in range(len(key) - NGRAM_SIZE + 1)}
+
+
+class SortedList:
+    """
+        A sorted list kept as a list of sorted blocks.
+
+        Inserting into or deleting from one flat list of a million items moves
+        megabytes of pointers; here only one block of at most 2 * BLOCK_SIZE
+        items is shifted, after a bisect over the block maxima.
+        """
+    def __init__(self, items=()):
+        """
+            Initializes a new SortedList instance.
+
+            Args:
+                items: The initial items, in any order.
+            """
+        items = sorted(items)
+        self._blocks = [items[start:start + BLOCK_SIZE] for start in range(0, len(items), BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._blocks]
+
+    def __len__(self) -> int:
+        """ Returns the number of items. """
+        return sum(len(block) for block in self._blocks)
+
+    def add(self, item):
+        """ Inserts an item in sorted position. """
+        if not self._blocks:
+            self._blocks.append([item])
+            self._maxes.append(item)
+            return
+        position = min(bisect_left(self._maxes, item), len(self._blocks) - 1)
+        block = self._blocks[position]
+        insort(block, item)
+        self._maxes[position] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks.insert(position + 1, block[BLOCK_SIZE:])
+            del block[BLOCK_SIZE:]
+            self._maxes.insert(position, block[-1])
+
+    def remove(self, item):
+        """
+            Deletes an item.
+
+            Raises:
+                ValueError: If the item is not present, as list.remove does.
+            """
+        position = bisect_left(self._maxes, item)
+        if position == len(self._blocks):
+            raise ValueError(f"{item!r} is not in the list.")
+        block = self._blocks[position]
+        offset = bisect_left(block, item)
+        # Deleting whatever sorts there would drop a neighbour and corrupt the index
+        if block[offset] != item:
+            raise ValueError(f"{item!r} is not in the list.")
+        del block[offset]
+        if block:
+            self._maxes[position] = block[-1]
+        else:
+            del self._blocks[position]
+            del self._maxes[position]
+
+    def _locate(self, key) -> Tuple[int, int]:
+        """ Returns the block and offset of the first item not below a key. """
+        position = bisect_left(self._maxes, key)
+        if position == len(self._blocks):
+            return position, 0
+        return position, bisect_left(self._blocks[position], key)
+
+    def count(self, low, high) -> int:
+        """ Returns the number of items from low, inclusive, to high, exclusive. """
+        low_block, low_offset = self._locate(low)
+        high_block, high_offset = self._locate(high)
+        return (sum(len(block) for block in self._blocks[low_block:high_block])
+                - low_offset + high_offset)
+
+    def irange(self, low, high=None) -> Iterator:
+        """ Iterates over the items from low, inclusive, to high, exclusive, or to the end without a high. """
+        position, offset = self._locate(low)
+        for block in itertools.islice(self._blocks, position, None):
+            for item in itertools.islice(block, offset, None):
+                if high is not None and not item < high:
+                    return
+                yield item
+            offset = 0
+
+    def __iter__(self) -> Iterator:
+        """ Iterates over all items in order. """
+        return itertools.chain.from_iterable(self._blocks)
+
+
+class SearchIndex:
+    """
+        Indexes the products of a store by name, price and promotion.
+
+        Name and price queries bisect sorted lists of (key, sequence) pairs,
+        where the sequence number is the order in which the index saw the
+        product, so each query takes O(log n) plus the size of its result.
+        Adding, removing or repricing a product updates one block of each
+        list; a whole catalog is indexed with one sort.
+
+        Queries return active products only, unless include_inactive is set,
+        and stop after limit results if a limit is given. Name matching is
+        case-insensitive.
+
+        Attributes:
+            substrings (bool): Whether the trigram index for substring queries is kept.
+        """
+    def __init__(self, substrings=False):
+        """
+            Initializes a new, empty SearchIndex instance.
+
+            Args:
+                substrings (bool): Whether to keep a trigram index, which makes
+                substring queries sublinear at the cost of memory.
+            """
+        self.substrings = substrings
+        self._lock = threading.RLock()
+        self._sequences = itertools.count()
+        # Maps each product to its (sequence, name key, price in cents, promotion) entry
+        self._entries: Dict[object, Tuple[int, str, int, object]] = {}
+        self._products: Dict[int, object] = {}
+        self._names = SortedList()
+        self._prices = SortedList()
+        self._promotions: Dict[object, Dict[int, None]] = {}
+        self._ngrams: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        """ Returns the number of products in the index, active or not. """
+        return len(self._entries)
+
+    def add_all(self, products: Iterable):
+        """
+            Indexes many products, sorting the name and price lists once.
+
+            Args:
+                products: The products to index.
+            """
+        with self._lock:
+            names, prices = list(self._names), list(self._prices)
+            for product in products:
+                entry = self._add_entry(product)
+                if entry is not None:
+                    sequence, key, price_cents, _ = entry
+                    names.append((key, sequence))
+                    prices.append((price_cents, sequence))
+            self._names = SortedList(names)
+            self._prices = SortedList(prices)
+
+    def add(self, product):
+        """
+            Indexes a product. Adding a product twice is a no-op.
+
+            Args:
+                product (Product): The product to index.
+            """
+        with self._lock:
+            entry = self._add_entry(product)
+            if entry is not None:
+                sequence, key, price_cents, _ = entry
+                self._names.add((key, sequence))
+                self._prices.add((price_cents, sequence))
+
+    def _add_entry(self, product) -> Optional[Tuple[int, str, int, object]]:
+        """ Indexes a product everywhere but in the sorted lists, which the caller updates. """
+        if product in self._entries:
+            return None
+        sequence = next(self._sequences)
+        key = _name_key(product.name)
+        entry = (sequence, key, product.price_cents, product.get_promotion())
+        self._entries[product] = entry
+        self._products[sequence] = product
+        self._promotions.setdefault(entry[3], {})[sequence] = None
+        if self.substrings:
+            for ngram in _ngrams(key):
+                self._ngrams.setdefault(ngram, set()).add(sequence)
+        return entry
+
+    def remove(self, product):
+        """
+            Stops indexing a product. Removing a product that is not indexed is a no-op.
+
+            Args:
+                product (Product): The product to forget.
+            """
+        with self._lock:
+            entry = self._entries.pop(product, None)
+            if entry is None:
+                return
+            sequence, key, price_cents, promotion = entry
+            del self._products[sequence]
+            self._names.remove((key, sequence))
+            self._prices.remove((price_cents, sequence))
+            self._unlink_promotion(promotion, sequence)
+            if self.substrings:
+                for ngram in _ngrams(key):
+                    postings = self._ngrams[ngram]
+                    postings.discard(sequence)
+                    if not postings:
+                        del self._ngrams[ngram]
+
+    def update(self, product, attribute, old_value):
+        """
+            Reindexes a product after a change, called as a product listener would be.
+
+            Args:
+                product (Product): The product that changed.
+                attribute (str): The name of the attribute that changed.
+                old_value: The value of the attribute before the change.
+            """
+        if attribute not in ("price", "promotion"):
+            return
+        with self._lock:
+            entry = self._entries.get(product)
+            if entry is None:
+                return
+            sequence, key, price_cents, promotion = entry
+            if attribute == "price" and product.price_cents != price_cents:
+                self._prices.remove((price_cents, sequence))
+                self._prices.add((product.price_cents, sequence))
+                self._entries[product] = (sequence, key, product.price_cents, promotion)
+            elif attribute == "promotion" and product.get_promotion() is not promotion:
+                self._unlink_promotion(promotion, sequence)
+                self._promotions.setdefault(product.get_promotion(), {})[sequence] = None
+                self._entries[product] = (sequence, key, price_cents, product.get_promotion())
+
+    def update_many(self, batch):
+        """
+            Reindexes the products of a bulk change.
+
+            A repricing of a large share of the products sorts the price list
+            again in one go, which is much faster than moving every product in it.
+
+            Args:
+                batch (store.ChangeBatch): The change.
+            """
+        if batch.attribute == "price" and len(batch.products) > REBUILD_SHARE * len(self._entries):
+            with self._lock:
+                for product in batch.products:
+                    entry = self._entries.get(product)
+                    if entry is not None:
+                        sequence, key, _, promotion = entry
+                        self._entries[product] = (sequence, key, product.price_cents, promotion)
+                self._prices = SortedList((price_cents, sequence)
+                                          for sequence, _, price_cents, _ in self._entries.values())
+            return
+        for product, old_value in zip(batch.products, batch.old_values):
+            self.update(product, batch.attribute, old_value)
+
+    def _unlink_promotion(self, promotion, sequence):
+        """ Removes a product from the inverted index entry of a promotion. """
+        products = self._promotions[promotion]
+        del products[sequence]
+        if not products:
+            del self._promotions[promotion]
+
+    def _collect(self, sequences: Iterable[int], include_inactive, limit, accept=None) -> List:
+        """
+            Resolves sequence numbers to products, filtering and stopping at the limit.
+
+            Args:
+                sequences: The sequence numbers of the candidates, in result order.
+                include_inactive (bool): Whether inactive products are returned.
+                limit (int): The largest number of results, or None for all.
+                accept: A predicate on the product's entry, if any.
+
+            Returns:
+                List[Product]: The matching products.
+            """
+        results = []
+        if limit is not None and limit <= 0:
+            return results
+        for sequence in sequences:
+            product = self._products[sequence]
+            if not include_inactive and not product.is_active():
+                continue
+            if accept is not None and not accept(self._entries[product]):
+                continue
+            results.append(product)
+            if len(results) == limit:
+                break
+        return results
+
+    @staticmethod
+    def _name_bounds(key) -> Tuple[tuple, tuple]:
+        """ Returns the bounds of the name list entries whose key starts with a prefix key. """
+        return (key,), (key + _MAX_CHAR,)
+
+    @staticmethod
+    def _price_bounds(min_cents, max_cents) -> Tuple[tuple, tuple]:
+        """ Returns the bounds of the price list entries within a band, in cents. """
+        return (() if min_cents is None else (min_cents,),
+                (math.inf,) if max_cents is None else (max_cents + 1,))
+
+    def by_prefix(self, prefix, limit=None, include_inactive=False) -> List:
+        """
+            Finds the products whose name starts with a prefix, in name order.
+
+            Args:
+                prefix (str): The start of the name, matched case-insensitively.
+                limit (int): The largest number of results, or None for all.
+                include_inactive (bool): Whether inactive products are returned.
+
+            Returns:
+                List[Product]: The matching products.
+            """
+        with self._lock:
+            entries = self._names.irange(*self._name_bounds(_name_key(prefix)))
+            return self._collect((sequence for _, sequence in entries), include_inactive, limit)
+
+    def by_substring(self, text, limit=None, include_inactive=False) -> List:
+        """
+            Finds the products whose name contains a text, in name order.
+
+            With the trigram index, only the products that share every trigram
+            of the text are checked; texts shorter than a trigram, or an index
+            without trigrams, fall back to scanning the names.
+
+            Args:
+                text (str): The text to look for, matched case-insensitively.
+                limit (int): The largest number of results, or None for all.
+                include_inactive (bool): Whether inactive products are returned.
+
+            Returns:
+                List[Product]: The matching products.
+            """
+        key = _name_key(text)
+        with self._lock:
+            if self.substrings and len(key) >= NGRAM_SIZE:
+                postings = sorted((self._ngrams.get(ngram, set()) for ngram in _ngrams(key)), key=len)
+                candidates = set.intersection(*postings)
+                entries, products = self._entries, self._products
+                sequences = sorted(candidates, key=lambda sequence: (entries[products[sequence]][1], sequence))
+            else:
+                sequences = (sequence for name, sequence in self._names)
+            return self._collect(sequences, include_inactive, limit,
+                                 accept=lambda entry: key in entry[1])
+
+    def by_price(self, min_price=None, max_price=None, limit=None, include_inactive=False) -> List:
+        """
+            Finds the products priced within a band, cheapest first.
+
+            Args:
+                min_price: The lowest price, inclusive, or None for no lower bound.
+                max_price: The highest price, inclusive, or None for no upper bound.
+                limit (int): The largest number of results, or None for all.
+                include_inactive (bool): Whether inactive products are returned.
+
+            Returns:
+                List[Product]: The matching products.
+            """
+        bounds = self._price_bounds(None if min_price is None else to_cents(min_price),
+                                    None if max_price is None else to_cents(max_price))
+        with self._lock:
+            return self._collect((sequence for _, sequence in self._prices.irange(*bounds)),
+                                 include_inactive, limit)
+
+    def by_promotion(self, promotion, limit=None, include_inactive=False) -> List:
+        """
+            Finds the products with a promotion, in the order they were indexed.
+
+            Args:
+                promotion (Promotion): The promotion, or None for products without one.
+                limit (int): The largest number of results, or None for all.
+                include_inactive (bool): Whether inactive products are returned.
+
+            Returns:
+                List[Product]: The matching products.
+            """
+        with self._lock:
+            return self._collect(iter(self._promotions.get(promotion, ())), include_inactive, limit)
+
+    def search(self, prefix=None, min_price=None, max_price=None, promotion=_ANY_PROMOTION,
+               limit=None, include_inactive=False) -> List:
+        """
+            Finds the products matching every given filter.
+
+            The candidates come from whichever index narrows the query most,
+            which is judged from the sizes of the index ranges, and are checked
+            against the other filters.
+
+            Args:
+                prefix (str): The start of the name, or None for any name.
+                min_price: The lowest price, inclusive, or None for no lower bound.
+                max_price: The highest price, inclusive, or None for no upper bound.
+                promotion (Promotion): The promotion to match, None for products
+                without one, or omitted for any promotion.
+                limit (int): The largest number of results, or None for all.
+                include_inactive (bool): Whether inactive products are returned.
+
+            Returns:
+                List[Product]: The matching products, in the order of the index used.
+            """
+        min_cents = None if min_price is None else to_cents(min_price)
+        max_cents = None if max_price is None else to_cents(max_price)
+        key = None if prefix is None else _name_key(prefix)
+
+        def accept(entry):
+            _, name_key, price_cents, product_promotion = entry
+            return ((key is None or name_key.startswith(key))
+                    and (min_cents is None or price_cents >= min_cents)
+                    and (max_cents is None or price_cents <= max_cents)
+                    and (promotion is _ANY_PROMOTION or product_promotion is promotion))
+
+        with self._lock:
+            # (estimated size, candidate sequence numbers) of every usable index
+            candidates = [(len(self._entries), lambda: iter(self._products))]
+            if key is not None:
+                names, name_bounds = self._names, self._name_bounds(key)
+                candidates.append((names.count(*name_bounds),
+                                   lambda: (sequence for _, sequence in names.irange(*name_bounds))))
+            if min_cents is not None or max_cents is not None:
+                prices, price_bounds = self._prices, self._price_bounds(min_cents, max_cents)
+                candidates.append((prices.count(*price_bounds),
+                                   lambda: (sequence for _, sequence in prices.irange(*price_bounds))))
+            if promotion is not _ANY_PROMOTION:
+                matches = self._promotions.get(promotion, {})
+                candidates.append((len(matches), lambda: iter(matches)))
+            _, sequences = min(candidates, key=lambda candidate: candidate[0])
+            return self._collect(sequences(), include_inactive, limit, accept)
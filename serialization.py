@@ -0,0 +1,146 @@
+from typing import Optional
+
+from money import from_cents
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import Promotion, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from promotion_rules import TieredDiscount, Stacked
+
+# Product and promotion classes by the type name used in serialized data
+PRODUCT_TYPES = {cls.__name__: cls for cls in (Product, NonStockedProduct, LimitedProduct)}
+PROMOTION_TYPES = {cls.__name__: cls for cls in (SecondHalfPrice, ThirdOneFree, PercentDiscount,
+                                                                TieredDiscount, Stacked)}
+
+
+def product_type(product) -> str:
+    """
+        Returns the serialized type name of a product, which is the name of its
+        product class even for subclasses such as columnar row views.
+
+        Args:
+            product (Product): The product.
+
+        Returns:
+            str: The type name.
+        """
+    if isinstance(product, NonStockedProduct):
+        return NonStockedProduct.__name__
+    if isinstance(product, LimitedProduct):
+        return LimitedProduct.__name__
+    return Product.__name__
+
+
+def _parameter_to_data(value):
+    """ Converts a promotion parameter, which may hold promotions itself, to JSON-compatible data. """
+    if isinstance(value, Promotion):
+        return promotion_to_dict(value)
+    if isinstance(value, (list, tuple)):
+        return [_parameter_to_data(item) for item in value]
+    return value
+
+
+def _parameter_from_data(value):
+    """ Recreates a promotion parameter from the data made by _parameter_to_data. """
+    if isinstance(value, dict):
+        return promotion_from_dict(value)
+    if isinstance(value, list):
+        return [_parameter_from_data(item) for item in value]
+    return value
+
+
+def promotion_to_dict(promotion: Optional[Promotion]) -> Optional[dict]:
+    """
+        Converts a promotion to a JSON-compatible dictionary.
+
+        Args:
+            promotion (Promotion): The promotion, or None.
+
+        Returns:
+            Optional[dict]: The type, name and parameters of the promotion, or None.
+        """
+    if promotion is None:
+        return None
+    parameters = {key: _parameter_to_data(value) for key, value in promotion.get_parameters().items()}
+    return {"type": type(promotion).__name__, "name": promotion.name, **parameters}
+
+
+def promotion_from_dict(data: Optional[dict]) -> Optional[Promotion]:
+    """
+        Recreates a promotion from the dictionary made by promotion_to_dict.
+
+        Args:
+            data (dict): The serialized promotion, or None.
+
+        Returns:
+            Optional[Promotion]: The promotion, or None.
+
+        Raises:
+            ValueError: If the promotion type is unknown or its arguments are invalid.
+        """
+    if data is None:
+        return None
+    arguments = dict(data)
+    promotion_class = PROMOTION_TYPES.get(arguments.pop("type", None))
+    if promotion_class is None:
+        raise ValueError(f"Unknown promotion type: {data.get('type')!r}.")
+    try:
+        return promotion_class(**{key: _parameter_from_data(value) for key, value in arguments.items()})
+    except TypeError as error:
+        raise ValueError(f"Invalid promotion {data!r}: {error}") from error
+
+
+def product_to_dict(product: Product) -> dict:
+    """
+        Converts a product, including its stock state and promotion, to a
+        JSON-compatible dictionary.
+
+        Args:
+            product (Product): The product.
+
+        Returns:
+            dict: The serialized product.
+        """
+    data = {
+        "type": product_type(product),
+        "name": product.name,
+        "price_cents": product.price_cents,
+        "quantity": product.quantity,
+        "active": product.is_active(),
+        "promotion": promotion_to_dict(product.get_promotion()),
+    }
+    if isinstance(product, LimitedProduct):
+        data["maximum"] = product.maximum
+    return data
+
+
+def product_from_dict(data: dict) -> Product:
+    """
+        Recreates a product from the dictionary made by product_to_dict.
+
+        Args:
+            data (dict): The serialized product.
+
+        Returns:
+            Product: The product.
+
+        Raises:
+            ValueError: If a field is missing or invalid.
+        """
+    try:
+        type_name = data.get("type", Product.__name__)
+        price = from_cents(data["price_cents"])
+        if type_name == NonStockedProduct.__name__:
+            product = NonStockedProduct(data["name"], price)
+        elif type_name == LimitedProduct.__name__:
+            product = LimitedProduct(data["name"], price, data["quantity"], data["maximum"])
+        elif type_name == Product.__name__:
+            product = Product(data["name"], price, data["quantity"])
+        else:
+            raise ValueError(f"Unknown product type: {type_name!r}.")
+    except KeyError as error:
+        raise ValueError(f"Missing field {error.args[0]!r}.") from error
+    except TypeError as error:
+        raise ValueError(f"Invalid field: {error}") from error
+    if not data.get("active", True):
+        product.deactivate()
+    product.set_promotion(promotion_from_dict(data.get("promotion")))
+    return product
@@ -0,0 +1,216 @@
+"""
+An asyncio order service that serves many shoppers against one Store.
+
+Sessions speak a JSON Lines protocol over TCP or stdio. Each request line is
+an object with a "command", mirroring the menu of main.py:
+    {"command": "list"}
+    {"command": "total"}
+    {"command": "order", "items": [{"name": "Google Pixel 7", "quantity": 2}]}
+    {"command": "quit"}
+Each response line is {"ok": true, ...} or {"ok": false, "error": "..."}.
+
+Run from the repository root:
+    python server.py [--port PORT | --stdio] [--catalog FILE] [--profile FILE]
+With --profile, sending the process SIGUSR1 starts a sampling profiler and
+sending it again writes the collapsed stacks to FILE.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from catalog_io import import_products, product_to_row
+from instrumentation import install_profiler_toggle
+from main import create_inventory, create_promotions
+from store import Store
+
+DEFAULT_PORT = 8765
+
+
+class OrderService:
+    """
+        Answers order service requests against one store.
+
+        Store calls run on the event loop thread by default, so they are
+        serialized with each other and never block on a lock held by another
+        session. A store whose calls block, such as a DurableStore waiting for
+        fsync, should be given an executor; the store's own locks then keep
+        concurrent orders safe.
+
+        Attributes:
+            store (Store): The store being served.
+        """
+    def __init__(self, store, executor=None):
+        """
+            Initializes a new OrderService instance.
+
+            Args:
+                store (Store): The store to serve.
+                executor (concurrent.futures.Executor): Runs the store calls, if given.
+            """
+        self.store = store
+        self._executor = executor
+
+    async def _call(self, function, *args):
+        """ Runs a store call on the executor, or inline without one. """
+        if self._executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _shopping_list(self, items):
+        """
+            Resolves the items of an order request to (product, quantity) pairs.
+
+            Raises:
+                ValueError: If an item is malformed or names an unknown product.
+            """
+        if not isinstance(items, list) or not items:
+            raise ValueError("An order needs a non-empty list of items.")
+        shopping_list = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError("Each item needs a name and a quantity.")
+            quantity = item.get("quantity")
+            if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+                raise ValueError("Invalid quantity. Please enter a positive number.")
+            if not isinstance(item.get("name"), str):
+                raise ValueError("Each item needs a product name.")
+            product = self.store.get_product(item["name"])
+            if product is None:
+                raise ValueError(f"Unknown product: {item.get('name')!r}.")
+            if not product.is_active():
+                # Store.order skips inactive products, which would charge nothing
+                raise ValueError(f"{product.name} is not available.")
+            shopping_list.append((product, quantity))
+        return shopping_list
+
+    async def handle(self, request) -> dict:
+        """
+            Answers one request.
+
+            Args:
+                request (dict): The decoded request.
+
+            Returns:
+                dict: The response.
+            """
+        command = request.get("command") if isinstance(request, dict) else None
+        try:
+            if command == "list":
+                products = await self._call(self.store.get_all_products)
+                return {"ok": True, "products": [product_to_row(product) for product in products]}
+            if command == "total":
+                return {"ok": True, "total_quantity": await self._call(self.store.get_total_quantity)}
+            if command == "order":
+                shopping_list = self._shopping_list(request.get("items"))
+                total_cost = await self._call(self.store.order, shopping_list)
+                return {"ok": True, "total_cost": str(total_cost)}
+            if command == "quit":
+                return {"ok": True}
+            raise ValueError(f"Unknown command: {command!r}.")
+        except ValueError as error:
+            return {"ok": False, "error": str(error)}
+        except Exception as error:
+            # Anything else is a bug, but it should fail the request, not the session
+            return {"ok": False, "error": f"Internal error: {type(error).__name__}: {error}"}
+
+    async def serve_lines(self, reader, write):
+        """
+            Answers request lines until the session quits or the input ends.
+
+            Args:
+                reader (asyncio.StreamReader): The request lines.
+                write: Sends one response line; may return an awaitable.
+            """
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as error:
+                response = {"ok": False, "error": f"Invalid request: {error.msg}."}
+                request = None
+            else:
+                response = await self.handle(request)
+            sent = write((json.dumps(response, separators=(",", ":")) + "\n").encode("utf-8"))
+            if sent is not None:
+                await sent
+            if isinstance(request, dict) and request.get("command") == "quit":
+                return
+
+    async def _serve_connection(self, reader, writer):
+        """ Serves one TCP session. """
+        async def write(data):
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.serve_lines(reader, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start_server(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+            Starts serving TCP sessions.
+
+            Args:
+                host (str): The address to listen on.
+                port (int): The port to listen on, or 0 for any free port.
+
+            Returns:
+                asyncio.Server: The running server.
+            """
+        return await asyncio.start_server(self._serve_connection, host, port, backlog=4096)
+
+    async def serve_stdio(self):
+        """ Serves one session over standard input and output. """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        def write(data):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+        await self.serve_lines(reader, write)
+
+
+async def serve(arguments):
+    """ Builds the store and serves it as the command line arguments say. """
+    promotion_catalog = create_promotions()
+    if arguments.catalog:
+        store = Store([])
+        for error in import_products(store, arguments.catalog, promotion_catalog):
+            print(f"Skipped {error}", file=sys.stderr)
+    else:
+        store = Store(create_inventory(promotion_catalog))
+    service = OrderService(store)
+    if arguments.stdio:
+        await service.serve_stdio()
+        return
+    server = await service.start_server(port=arguments.port)
+    print(f"Serving on port {server.sockets[0].getsockname()[1]}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """ Parses the command line and runs the order service. """
+    parser = argparse.ArgumentParser(description="Serve the store over a JSON Lines protocol.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--stdio", action="store_true", help="serve one session on stdin/stdout")
+    parser.add_argument("--catalog", help="a .csv or .jsonl catalog file to load")
+    parser.add_argument("--profile", help="toggle a sampling profiler on SIGUSR1, writing stacks to this file")
+    arguments = parser.parse_args()
+    if arguments.profile:
+        install_profiler_toggle(arguments.profile)
+    asyncio.run(serve(arguments))
+
+
+if __name__ == "__main__":
+    main()
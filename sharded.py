@@ -0,0 +1,453 @@
+import itertools
+import multiprocessing
+import zlib
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from money import from_cents
+from products import Product
+from serialization import product_from_dict, product_to_dict
+from store import Store
+
+# Seconds a prepared multi-shard order holds its stock if the coordinator never
+# commits or aborts it, e.g. because the coordinator process died
+PREPARE_TTL = 30
+
+
+def shard_of(name, shard_count) -> int:
+    """
+        Returns the shard owning a product key.
+
+        The key is hashed with CRC-32 rather than hash(), which is randomized
+        per process and would route the same name differently in each one.
+
+        Args:
+            name (str): The name of the product.
+            shard_count (int): The number of shards.
+
+        Returns:
+            int: The index of the owning shard.
+        """
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+def _resolve(store, lines) -> List[Tuple[Product, int]]:
+    """
+        Turns (name, quantity) lines into (product, quantity) lines of a shard's store.
+
+        Raises:
+            ValueError: If a name is not in the store.
+        """
+    shopping_list = []
+    for name, quantity in lines:
+        product = store.get_product(name)
+        if product is None:
+            raise ValueError(f"Unknown product: {name!r}.")
+        shopping_list.append((product, quantity))
+    return shopping_list
+
+
+def _error_message(error) -> str:
+    """ Describes an error raised by a shard request, naming the type of unexpected ones. """
+    return str(error) if isinstance(error, ValueError) else f"{type(error).__name__}: {error}"
+
+
+def _serve_shard(connection):
+    """
+        Runs a shard: answers requests from the coordinator until told to close.
+
+        Every request is a tuple whose first item names the operation, and every
+        reply is ("ok", result) or ("error", message). A request that raises,
+        whatever the exception, gets an error reply and the shard keeps serving.
+
+        Args:
+            connection (multiprocessing.connection.Connection): The coordinator's pipe.
+        """
+    store = Store([])
+    sequences: Dict[Product, int] = {}
+    prepared = {}
+    while True:
+        request = connection.recv()
+        try:
+            operation = request[0]
+            if operation == "close":
+                connection.send(("ok", None))
+                return
+            if operation == "add":
+                _, sequence, data = request
+                product = product_from_dict(data)
+                store.add_product(product)
+                sequences[product] = sequence
+                result = None
+            elif operation == "remove":
+                product = store.get_product(request[1])
+                if product is not None:
+                    store.remove_product(product)
+                    del sequences[product]
+                result = None
+            elif operation == "order":
+                total_cost = store.order(_resolve(store, request[1]))
+                result = int(total_cost.scaleb(2))
+            elif operation == "order_many":
+                carts, failures = [], {}
+                for index, lines in enumerate(request[1]):
+                    try:
+                        carts.append(_resolve(store, lines))
+                    except Exception as error:
+                        carts.append([])
+                        failures[index] = _error_message(error)
+                totals, errors = store.order_many(carts)
+                failures.update((index, str(error)) for index, error in errors.items())
+                result = ([None if index in failures or total is None else int(total.scaleb(2))
+                           for index, total in enumerate(totals)], failures)
+            elif operation == "prepare":
+                _, transaction_id, lines = request
+                prepared[transaction_id] = store.reserve(_resolve(store, lines), ttl=PREPARE_TTL)
+                result = None
+            elif operation == "commit":
+                reservation = prepared.pop(request[1], None)
+                if reservation is None:
+                    raise ValueError("Transaction is not prepared on this shard.")
+                total_cost = store.commit(reservation)
+                result = int(total_cost.scaleb(2))
+            elif operation == "abort":
+                reservation = prepared.pop(request[1], None)
+                if reservation is not None:
+                    store.release(reservation)
+                result = None
+            elif operation == "prepare_many":
+                result = {}
+                for transaction_id, lines in request[1]:
+                    try:
+                        prepared[transaction_id] = store.reserve(_resolve(store, lines),
+                                                                 ttl=PREPARE_TTL)
+                    except Exception as error:
+                        result[transaction_id] = _error_message(error)
+            elif operation == "finish_many":
+                _, commits, aborts = request
+                for transaction_id in aborts:
+                    reservation = prepared.pop(transaction_id, None)
+                    if reservation is not None:
+                        store.release(reservation)
+                result = {}
+                for transaction_id in commits:
+                    reservation = prepared.pop(transaction_id, None)
+                    try:
+                        if reservation is None:
+                            raise ValueError("Transaction is not prepared on this shard.")
+                        result[transaction_id] = int(store.commit(reservation).scaleb(2))
+                    except Exception as error:
+                        result[transaction_id] = _error_message(error)
+            elif operation == "total":
+                result = store.get_total_quantity()
+            elif operation == "list":
+                active_only = request[1]
+                products = store.get_all_products() if active_only else store.products
+                result = [(sequences[product], product_to_dict(product)) for product in products]
+            else:
+                raise ValueError(f"Unknown shard operation: {operation!r}.")
+        except Exception as error:
+            connection.send(("error", _error_message(error)))
+        else:
+            connection.send(("ok", result))
+
+
+class ShardedStore:
+    """
+        A store whose catalog is partitioned across worker processes.
+
+        Each product lives in the Store of one shard process, chosen by a hash of
+        its name, so orders on different shards run on different cores. This
+        object is the coordinator: it routes each cart's lines to the owning
+        shards. A cart on one shard is a single order there; a cart spanning
+        shards is committed atomically with two-phase commit, where every shard
+        first reserves its lines and the reservations are committed only once
+        all shards have accepted theirs.
+
+        Products are addressed by name. Listings return copies of the products
+        as they were when listed; changing a copy does not change the store.
+        The coordinator is not thread-safe; use one per thread or process.
+        """
+    def __init__(self, products=(), shard_count=None):
+        """
+            Starts the shard processes and adds the initial products.
+
+            Args:
+                products (List[Product]): The initial list of products in the store.
+                shard_count (int): The number of shard processes, by default one per core.
+            """
+        self.shard_count = shard_count or multiprocessing.cpu_count()
+        self._connections = []
+        self._processes = []
+        for _ in range(self.shard_count):
+            connection, shard_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard, args=(shard_connection,),
+                                              daemon=True)
+            process.start()
+            shard_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._sequences = itertools.count()
+        self._transaction_ids = itertools.count()
+        for product in products:
+            self.add_product(product)
+
+    def _gather(self, requests: Dict[int, tuple]) -> Dict[int, tuple]:
+        """
+            Sends one request to each given shard, then collects every reply.
+
+            The requests are all sent before any reply is awaited, so the shards
+            work on them in parallel.
+
+            Args:
+                requests (Dict[int, tuple]): The request for each shard.
+
+            Returns:
+                Dict[int, tuple]: The ("ok", result) or ("error", message) reply of each shard.
+            """
+        for shard, request in requests.items():
+            self._connections[shard].send(request)
+        return {shard: self._connections[shard].recv() for shard in requests}
+
+    def _gather_results(self, requests: Dict[int, tuple]) -> Dict[int, object]:
+        """
+            Sends one request to each given shard and returns the result of each.
+
+            Raises:
+                ValueError: If any shard reports an error.
+            """
+        replies = self._gather(requests)
+        for status, result in replies.values():
+            if status == "error":
+                raise ValueError(result)
+        return {shard: result for shard, (_, result) in replies.items()}
+
+    def _request(self, shard, request):
+        """
+            Sends a request to one shard and returns its result.
+
+            Raises:
+                ValueError: If the shard reports an error.
+            """
+        return self._gather_results({shard: request})[shard]
+
+    @staticmethod
+    def _name(product) -> str:
+        """ Returns the product key of a product or a product name. """
+        return product if isinstance(product, str) else product.name
+
+    def _route(self, shopping_list) -> Dict[int, List[Tuple[str, int]]]:
+        """ Groups the lines of a shopping list by owning shard. """
+        lines_by_shard: Dict[int, List[Tuple[str, int]]] = {}
+        for product, quantity in shopping_list:
+            name = self._name(product)
+            lines_by_shard.setdefault(shard_of(name, self.shard_count), []).append((name, quantity))
+        return lines_by_shard
+
+    def add_product(self, product):
+        """
+            Adds a copy of a product to the shard owning its name.
+
+            Args:
+                product (Product): The product to add to the store.
+            """
+        shard = shard_of(product.name, self.shard_count)
+        self._request(shard, ("add", next(self._sequences), product_to_dict(product)))
+
+    def remove_product(self, product):
+        """
+            Removes a product from the store.
+
+            Args:
+                product: The product, or its name.
+            """
+        name = self._name(product)
+        self._request(shard_of(name, self.shard_count), ("remove", name))
+
+    def get_total_quantity(self) -> float:
+        """
+            Returns the total quantity of all active products, summed across shards.
+
+            Returns:
+                float: The total quantity in the store.
+            """
+        results = self._gather_results({shard: ("total",) for shard in range(self.shard_count)})
+        return float(sum(results.values()))
+
+    def _list(self, active_only) -> List[Product]:
+        """ Gathers product copies from every shard, in the order they were added. """
+        results = self._gather_results({shard: ("list", active_only)
+                                        for shard in range(self.shard_count)})
+        entries = sorted((entry for result in results.values() for entry in result),
+                         key=lambda entry: entry[0])
+        return [product_from_dict(data) for _, data in entries]
+
+    @property
+    def products(self) -> List[Product]:
+        """
+            Returns copies of all products in the store, active or not, in insertion order.
+
+            Returns:
+                List[Product]: The list of products in the store.
+            """
+        return self._list(active_only=False)
+
+    def get_all_products(self) -> List[Product]:
+        """
+            Returns copies of all active products in the store, in insertion order.
+
+            Returns:
+                List[Product]: A list of all active products in the store.
+            """
+        return self._list(active_only=True)
+
+    def order(self, shopping_list) -> Decimal:
+        """
+            Places an order, atomically across the shards it spans.
+
+            Args:
+                shopping_list: The (product or name, quantity) pairs to order.
+
+            Returns:
+                Decimal: The total cost of the order.
+
+            Raises:
+                ValueError: If a product is unknown, or a line breaks its stock or rules.
+                No shard's stock changes then.
+            """
+        lines_by_shard = self._route(shopping_list)
+        if len(lines_by_shard) == 1:
+            (shard, lines), = lines_by_shard.items()
+            return from_cents(self._request(shard, ("order", lines)))
+        if not lines_by_shard:
+            return from_cents(0)
+
+        transaction_id = next(self._transaction_ids)
+        replies = self._gather({shard: ("prepare", transaction_id, lines)
+                                for shard, lines in lines_by_shard.items()})
+        failed = [result for status, result in replies.values() if status == "error"]
+        if failed:
+            self._gather({shard: ("abort", transaction_id)
+                          for shard, (status, _) in replies.items() if status == "ok"})
+            raise ValueError(failed[0])
+        replies = self._gather({shard: ("commit", transaction_id) for shard in lines_by_shard})
+        failed = [result for status, result in replies.values() if status == "error"]
+        if failed:
+            # Only a reservation held past PREPARE_TTL can fail to commit
+            raise ValueError(f"Order was only partly committed: {failed[0]}")
+        return from_cents(sum(result for _, result in replies.values()))
+
+    def order_many(self, orders) -> Tuple[List[Optional[Decimal]], Dict[int, ValueError]]:
+        """
+            Places a batch of orders, every shard working on its share in parallel.
+
+            Orders within one shard keep their batch order. Orders spanning
+            shards are placed afterwards, each atomically, with the two phases
+            of all of them batched into one round trip per shard each.
+
+            Args:
+                orders: The shopping lists to order.
+
+            Returns:
+                Tuple: The total cost of each order, None for failed orders, and the
+                error of each failed order keyed by its position in the batch.
+
+            Raises:
+                ValueError: If a shard fails a request as a whole.
+            """
+        totals: List[Optional[Decimal]] = [None] * len(orders)
+        failures: Dict[int, ValueError] = {}
+        batches: Dict[int, List[Tuple[int, List[Tuple[str, int]]]]] = {}
+        spanning: Dict[int, Dict[int, List[Tuple[str, int]]]] = {}
+        for index, shopping_list in enumerate(orders):
+            lines_by_shard = self._route(shopping_list)
+            if len(lines_by_shard) == 1:
+                (shard, lines), = lines_by_shard.items()
+                batches.setdefault(shard, []).append((index, lines))
+            elif lines_by_shard:
+                spanning[index] = lines_by_shard
+            else:
+                totals[index] = from_cents(0)
+
+        results = self._gather_results({shard: ("order_many", [lines for _, lines in batch])
+                                        for shard, batch in batches.items()})
+        for shard, (cents, errors) in results.items():
+            for position, (index, _) in enumerate(batches[shard]):
+                if position in errors:
+                    failures[index] = ValueError(errors[position])
+                else:
+                    totals[index] = from_cents(cents[position])
+        if spanning:
+            self._order_spanning(spanning, totals, failures)
+        return totals, failures
+
+    def _order_spanning(self, spanning, totals, failures):
+        """
+            Places orders spanning shards with one batched two-phase commit.
+
+            Args:
+                spanning (Dict[int, Dict[int, List]]): The lines of each order by
+                    shard, keyed by the order's position in the batch.
+                totals (List[Optional[Decimal]]): Receives the total cost of each order.
+                failures (Dict[int, ValueError]): Receives the error of each failed order.
+
+            Raises:
+                ValueError: If a shard fails a phase as a whole. After the first
+                phase, every prepared transaction is aborted first.
+            """
+        transactions = {index: next(self._transaction_ids) for index in spanning}
+        prepares: Dict[int, List[Tuple[int, List[Tuple[str, int]]]]] = {}
+        for index, lines_by_shard in spanning.items():
+            for shard, lines in lines_by_shard.items():
+                prepares.setdefault(shard, []).append((transactions[index], lines))
+        replies = self._gather({shard: ("prepare_many", batch) for shard, batch in prepares.items()})
+        failed = [result for status, result in replies.values() if status == "error"]
+        if failed:
+            self._gather({shard: ("finish_many", [], [transaction_id for transaction_id, _ in batch])
+                          for shard, batch in prepares.items() if replies[shard][0] == "ok"})
+            raise ValueError(failed[0])
+        refused: Dict[int, str] = {}
+        for _, errors in replies.values():
+            refused.update(errors)
+
+        finishes = {}
+        for shard, batch in prepares.items():
+            commits = [transaction_id for transaction_id, _ in batch if transaction_id not in refused]
+            aborts = [transaction_id for transaction_id, _ in batch if transaction_id in refused]
+            finishes[shard] = ("finish_many", commits, aborts)
+        committed: Dict[int, List] = {}
+        for results in self._gather_results(finishes).values():
+            for transaction_id, result in results.items():
+                committed.setdefault(transaction_id, []).append(result)
+
+        for index, transaction_id in transactions.items():
+            if transaction_id in refused:
+                failures[index] = ValueError(refused[transaction_id])
+                continue
+            results = committed[transaction_id]
+            errors = [result for result in results if isinstance(result, str)]
+            if errors:
+                # Only a reservation held past PREPARE_TTL can fail to commit
+                failures[index] = ValueError(f"Order was only partly committed: {errors[0]}")
+            else:
+                totals[index] = from_cents(sum(results))
+
+    def close(self):
+        """ Stops the shard processes. """
+        for connection in self._connections:
+            try:
+                connection.send(("close",))
+                connection.recv()
+            except (EOFError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,11 +1,109 @@
-from typing import List, Tuple
+import base64
+import binascii
+import heapq
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from fractions import Fraction
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from money import from_cents
 from products import Product, NonStockedProduct
+from promotions import price_lines
+from search import SortedList
+
+# How long a reservation holds stock unless a ttl is given, in seconds
+DEFAULT_RESERVATION_TTL = 15 * 60
+# Number of products per page of a listing unless a page size is given
+DEFAULT_PAGE_SIZE = 100
+# Sort orders of list_products: the function giving the part of a product's
+# listing position that comes before its sequence number, and the types of
+# that part, to validate page tokens
+LISTING_KEYS = {
+    "catalog": (lambda product: (), ()),
+    "name": (lambda product: (product.name.casefold(),), (str,)),
+    "price": (lambda product: (product.price_cents,), (int,)),
+}
+# Product attribute set by the bulk operations, by the name products notify changes with
+_BULK_FIELDS = {"price": "price_cents", "promotion": "promotion", "active": "active"}
+
+
+class Reservation:
+    """
+        Represents stock held for a shopping list until it is committed or released.
+
+        Attributes:
+            reservation_id (int): The identifier of the reservation within its store.
+            lines (List[Tuple[Product, int]]): The validated lines bought on commit.
+            holds (Dict[Product, int]): The stock held per stocked product.
+            expires_at (float): The time.monotonic() deadline of the reservation.
+        """
+    def __init__(self, reservation_id, lines, holds, expires_at):
+        self.reservation_id = reservation_id
+        self.lines = lines
+        self.holds = holds
+        self.expires_at = expires_at
+
+    def is_expired(self) -> bool:
+        """
+            Checks whether the reservation has outlived its ttl.
+
+            Returns:
+                bool: True if the reservation has expired, otherwise False.
+            """
+        return time.monotonic() >= self.expires_at
+
+
+class ProductPage(NamedTuple):
+    """
+        A page of a product listing.
+
+        Attributes:
+            products (List[Product]): The products of the page, in listing order.
+            next_token (Optional[str]): The token that resumes the listing after
+            this page, or None on the last page.
+        """
+    products: List[Product]
+    next_token: Optional[str]
+
+
+class ChangeBatch(NamedTuple):
+    """
+        One bulk change to the products of a store, recorded as a whole.
+
+        Only the products whose value actually changed are recorded.
+
+        Attributes:
+            attribute (str): The attribute changed: "price", "promotion" or "active".
+            products (List[Product]): The products that changed.
+            old_values (list): The value of each product before the change, prices in cents.
+            new_values (list): The value of each product after the change.
+        """
+    attribute: str
+    products: List[Product]
+    old_values: list
+    new_values: list
 
 
 class Store:
     """
         Represents a store that manages a list of products.
 
+        The catalog is kept in an insertion-ordered dictionary keyed by product
+        identity, with a secondary index keyed by product name, so membership,
+        lookup and removal are O(1). The set of active products and their total
+        quantity are maintained incrementally from product change notifications.
+
+        Orders are all-or-nothing: every line is validated against the stock
+        that is not held by reservations before any stock is taken.
+
+        Orders are safe under concurrent threads. An order holds the locks of
+        the products in its cart, taken in a fixed order to avoid deadlocks,
+        so orders on disjoint products never wait for each other. The store's
+        own lock only guards its bookkeeping and is always taken last.
+
         Attributes:
             products (List[Product]): The list of products in the store.
         """
@@ -16,7 +114,57 @@ class Store:
             Args:
                 products (List[Product]): The initial list of products in the store.
             """
-        self.products = products
+        # Maps each product to its insertion sequence number
+        self._catalog: Dict[Product, int] = {}
+        self._lock = threading.RLock()
+        self._by_name: Dict[str, Dict[Product, None]] = {}
+        self._next_sequence = 0
+        self._active: Dict[Product, None] = {}
+        self._active_list: Optional[List[Product]] = None
+        self._total_quantity = 0
+        self._reservations: Dict[int, Reservation] = {}
+        self._reserved: Dict[Product, int] = {}
+        self._reservation_ids = itertools.count(1)
+        # Heap of (expires_at, reservation_id), used to release expired holds
+        self._expiries: List[Tuple[float, int]] = []
+        # Secondary indexes kept up to date with the catalog, see add_index, and
+        # those of them told about sales apart from other stock changes
+        self._indexes = ()
+        self._sale_indexes: Dict[object, None] = {}
+        # Products whose stock is being taken by an order on some thread; their
+        # locks are held meanwhile, so no other stock change can interleave
+        self._selling: Set[Product] = set()
+        # Sorted (key..., sequence, product) entries per sort order of list_products,
+        # built on first use of the order
+        self._listings: Dict[str, SortedList] = {}
+        for product in products:
+            self.add_product(product)
+
+    @property
+    def products(self) -> List[Product]:
+        """
+            Returns all products in the store, active or not, in insertion order.
+
+            Returns:
+                List[Product]: The list of products in the store.
+            """
+        return list(self._catalog)
+
+    def __contains__(self, product) -> bool:
+        """
+            Checks whether a product belongs to the store.
+
+            Args:
+                product (Product): The product to look for.
+
+            Returns:
+                bool: True if the product is in the store, otherwise False.
+            """
+        return product in self._catalog
+
+    def __len__(self) -> int:
+        """ Returns the number of products in the store, active or not. """
+        return len(self._catalog)
 
     def add_product(self, product):
         """
@@ -25,7 +173,19 @@ class Store:
             Args:
                 product (Product): The product to add to the store.
             """
-        self.products.append(product)
+        with product.lock, self._lock:
+            if product in self._catalog:
+                return
+            self._catalog[product] = self._next_sequence
+            self._next_sequence += 1
+            self._by_name.setdefault(product.name, {})[product] = None
+            for sort_key, listing in self._listings.items():
+                listing.add(self._listing_entry(sort_key, product))
+            product.add_listener(self._on_product_changed)
+            if product.is_active():
+                self._activate(product)
+            for index in self._indexes:
+                index.add(product)
 
     def remove_product(self, product):
         """
@@ -34,17 +194,265 @@ class Store:
             Args:
                 product (Product): The product to remove from the store.
             """
-        if product in self.products:
-            self.products.remove(product)
+        with product.lock, self._lock:
+            if product not in self._catalog:
+                return
+            product.remove_listener(self._on_product_changed)
+            if product in self._active:
+                self._deactivate(product)
+            for sort_key, listing in self._listings.items():
+                listing.remove(self._listing_entry(sort_key, product))
+            del self._catalog[product]
+            namesakes = self._by_name[product.name]
+            del namesakes[product]
+            if not namesakes:
+                del self._by_name[product.name]
+            for index in self._indexes:
+                index.remove(product)
+
+    def add_index(self, index):
+        """
+            Registers a secondary index, such as a search.SearchIndex, and fills it
+            with the catalog. Other catalog observers, such as a feed.ChangeFeed,
+            register the same way.
+
+            The store keeps the index up to date: it calls index.add and
+            index.remove as products come and go, index.update(product,
+            attribute, old_value) when a product changes, and
+            index.update_many(batch) with the ChangeBatch of a bulk operation.
+            An index that defines sold(product, old_quantity), such as a
+            replenishment.ReplenishmentPlanner, gets that call instead of
+            update when an order, a committed reservation or order_many takes
+            stock, so it can tell sales from restocks and manual adjustments;
+            when a failed order puts back stock it took, sold is called with an
+            old quantity below the current one.
+
+            Args:
+                index: The index to register.
+
+            Returns:
+                The index.
+            """
+        with self._lock:
+            index.add_all(self._catalog)
+            self._indexes += (index,)
+            if hasattr(index, "sold"):
+                self._sale_indexes[index] = None
+        return index
+
+    def get_product(self, name) -> Optional[Product]:
+        """
+            Looks up a product by its name.
+
+            Args:
+                name (str): The name of the product.
+
+            Returns:
+                Optional[Product]: The first product added with the given name,
+                or None if not found.
+            """
+        namesakes = self._by_name.get(name)
+        return next(iter(namesakes)) if namesakes else None
+
+    def _activate(self, product):
+        """ Adds a product to the active set and its stock to the running total. """
+        self._active[product] = None
+        self._active_list = None
+        self._total_quantity += product.quantity
+
+    def _deactivate(self, product):
+        """ Removes a product from the active set and its stock from the running total. """
+        del self._active[product]
+        self._active_list = None
+        self._total_quantity -= product.quantity
+
+    def _on_product_changed(self, product, attribute, old_value):
+        """
+            Keeps the active set and the running total in sync with product changes.
+
+            Args:
+                product (Product): The product that changed.
+                attribute (str): The name of the attribute that changed.
+                old_value: The value of the attribute before the change.
+            """
+        with self._lock:
+            if attribute == "quantity":
+                if product in self._active:
+                    self._total_quantity += product.quantity - old_value
+            elif attribute == "active":
+                if product.is_active():
+                    self._activate(product)
+                elif product in self._active:
+                    self._deactivate(product)
+            elif attribute == "price" and "price" in self._listings:
+                listing = self._listings["price"]
+                sequence = self._catalog[product]
+                listing.remove((old_value, sequence, product))
+                listing.add((product.price_cents, sequence, product))
+            if attribute == "quantity" and self._selling and product in self._selling:
+                for index in self._indexes:
+                    if index in self._sale_indexes:
+                        index.sold(product, old_value)
+                    else:
+                        index.update(product, attribute, old_value)
+                return
+            for index in self._indexes:
+                index.update(product, attribute, old_value)
+
+    def _on_batch(self, batch):
+        """
+            Keeps the active set, the listings and the indexes in sync with a bulk
+            change. Called with the store lock held.
+
+            Args:
+                batch (ChangeBatch): The change.
+            """
+        if batch.attribute == "active":
+            for product, active in zip(batch.products, batch.new_values):
+                if active:
+                    self._activate(product)
+                elif product in self._active:
+                    self._deactivate(product)
+        elif batch.attribute == "price" and "price" in self._listings:
+            listing = self._listings["price"]
+            for product, old_cents in zip(batch.products, batch.old_values):
+                sequence = self._catalog[product]
+                listing.remove((old_cents, sequence, product))
+                listing.add((product.price_cents, sequence, product))
+        for index in self._indexes:
+            index.update_many(batch)
+
+    def _select(self, products, where) -> List[Product]:
+        """
+            Returns the distinct products a bulk operation changes, in one pass.
+
+            Args:
+                products: The candidate products, or None for the whole catalog.
+                where: A predicate the products must satisfy, or None to take every candidate.
+
+            Returns:
+                List[Product]: The selected products.
+
+            Raises:
+                ValueError: If a candidate is not in the store.
+            """
+        if products is None:
+            products = self.products
+            return products if where is None else [product for product in products if where(product)]
+        selected = {}
+        for product in products:
+            if product not in self:
+                raise ValueError(f"{product.name} is not in the store.")
+            if where is None or where(product):
+                selected[product] = None
+        return list(selected)
+
+    def _apply_batch(self, attribute, products, change) -> ChangeBatch:
+        """
+            Changes an attribute of many products as one transaction.
+
+            Every product lock is held while the new values are computed and set,
+            so orders see either none or all of the batch. The store's own
+            bookkeeping and its indexes get a single ChangeBatch; other listeners
+            of the products, such as other stores, are notified per product.
+
+            Args:
+                attribute (str): The attribute to change: "price", "promotion" or "active".
+                products (List[Product]): The products to change.
+                change: Returns the new value of a product from its old value.
+
+            Returns:
+                ChangeBatch: The products that changed, with their old and new values.
+            """
+        field = _BULK_FIELDS[attribute]
+        batch = ChangeBatch(attribute, [], [], [])
+        catalog = self._catalog
+        with self._locked(products):
+            with self._lock:
+                for product in products:
+                    # Products removed since they were selected are left out
+                    if product not in catalog:
+                        continue
+                    old_value = getattr(product, field)
+                    new_value = change(old_value)
+                    if new_value != old_value:
+                        batch.products.append(product)
+                        batch.old_values.append(old_value)
+                        batch.new_values.append(new_value)
+                for product, new_value in zip(batch.products, batch.new_values):
+                    setattr(product, field, new_value)
+                self._on_batch(batch)
+            for product, old_value in zip(batch.products, batch.old_values):
+                product._notify_except(self._on_product_changed, attribute, old_value)
+        return batch
+
+    def bulk_reprice(self, percent, products=None, where=None) -> ChangeBatch:
+        """
+            Changes the price of many products by a percentage, rounding half up to the cent.
+
+            Args:
+                percent (float): The price change, e.g. 10 for +10% or -25 for -25%.
+                products: The products to reprice, or None for the whole catalog.
+                where: A predicate selecting which of those products to reprice, or None for all.
+
+            Returns:
+                ChangeBatch: The products whose price changed, with their old and new prices in cents.
+
+            Raises:
+                ValueError: If the change would make prices negative, or if a
+                product is not in the store. No price is changed then.
+            """
+        if percent < -100:
+            raise ValueError("Price must be non-negative.")
+        factor = 1 + Fraction(Decimal(str(percent))) / 100
+        numerator, denominator = factor.numerator, factor.denominator
+        return self._apply_batch("price", self._select(products, where),
+                                 lambda cents: (cents * numerator + denominator // 2) // denominator)
+
+    def bulk_set_promotion(self, promotion, products=None, where=None) -> ChangeBatch:
+        """
+            Sets the promotion of many products, or removes it with None.
+
+            Args:
+                promotion (Promotion): The promotion to set, or None.
+                products: The products to change, or None for the whole catalog.
+                where: A predicate selecting which of those products to change, or None for all.
+
+            Returns:
+                ChangeBatch: The products whose promotion changed, with their old and new promotions.
+
+            Raises:
+                ValueError: If a product is not in the store. No promotion is changed then.
+            """
+        return self._apply_batch("promotion", self._select(products, where), lambda old_promotion: promotion)
+
+    def bulk_set_active(self, active, products=None, where=None) -> ChangeBatch:
+        """
+            Activates or deactivates many products.
+
+            Args:
+                active (bool): True to activate the products, False to deactivate them.
+                products: The products to change, or None for the whole catalog.
+                where: A predicate selecting which of those products to change, or None for all.
+
+            Returns:
+                ChangeBatch: The products whose active flag changed.
+
+            Raises:
+                ValueError: If a product is not in the store. No product is changed then.
+            """
+        active = bool(active)
+        return self._apply_batch("active", self._select(products, where), lambda was_active: active)
 
     def get_total_quantity(self) -> int:
         """
-            Calculates and returns the total quantity of all active products in the store.
+            Returns the total quantity of all active products in the store.
 
             Returns:
                 int: The total quantity in the store.
             """
-        return sum(product.get_quantity() for product in self.products if product.is_active())
+        with self._lock:
+            return float(self._total_quantity)
 
     def get_all_products(self) -> List[Product]:
         """
@@ -53,30 +461,395 @@ class Store:
             Returns:
                 List[Product]: A list of all active products in the store.
             """
-        return [product for product in self.products if product.is_active()]
+        with self._lock:
+            if self._active_list is None:
+                # Keep the catalog order, which the active set loses on reactivation
+                self._active_list = sorted(self._active, key=self._catalog.__getitem__)
+            return list(self._active_list)
+
+    def _listing_entry(self, sort_key, product) -> tuple:
+        """ Returns the entry of a product in the listing of a sort order. """
+        return LISTING_KEYS[sort_key][0](product) + (self._catalog[product], product)
+
+    @staticmethod
+    def _page_token(sort_key, position) -> str:
+        """ Encodes the listing position of the last product of a page as an opaque token. """
+        return base64.urlsafe_b64encode(json.dumps([sort_key, *position]).encode()).decode()
+
+    @staticmethod
+    def _page_position(page_size, sort_key, token) -> Optional[tuple]:
+        """
+            Validates the arguments of list_products and decodes its token.
+
+            Returns:
+                Optional[tuple]: The listing position the page starts after, or None for the first page.
+
+            Raises:
+                ValueError: If the page size is not positive, the sort order is
+                unknown, or the token is not one of a listing in that order.
+            """
+        if page_size <= 0:
+            raise ValueError("The page size must be positive.")
+        if sort_key not in LISTING_KEYS:
+            raise ValueError(f"Unknown sort order: {sort_key}. Use one of {', '.join(LISTING_KEYS)}.")
+        if token is None:
+            return None
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except (AttributeError, binascii.Error, UnicodeDecodeError, ValueError):
+            decoded = None
+        key_types = LISTING_KEYS[sort_key][1] + (int,)
+        if not isinstance(decoded, list) or decoded[:1] != [sort_key] or len(decoded) != len(key_types) + 1 \
+                or not all(type(value) is key_type for value, key_type in zip(decoded[1:], key_types)):
+            raise ValueError(f"Invalid page token for a listing by {sort_key}.")
+        return tuple(decoded[1:])
+
+    def list_products(self, page_size=DEFAULT_PAGE_SIZE, sort_key="catalog", token=None,
+                      include_inactive=False) -> ProductPage:
+        """
+            Returns one page of the products of the store.
+
+            Products are listed in catalog (insertion) order, by case-insensitive
+            name or by price, ties broken by catalog order. Pages are found by
+            position, not by offset: a token holds the position of the last
+            product of its page, and the next page starts right after it. So a
+            listing never skips or repeats a product because others were
+            deactivated, added or removed in the meantime. A product repriced
+            during a listing by price moves to its new position.
+
+            The sorted entries of an order are built on its first listing and then
+            kept up to date, so a page costs O(log n) plus its size, plus the
+            inactive products it skips.
+
+            Args:
+                page_size (int): The largest number of products on the page.
+                sort_key (str): The sort order: "catalog", "name" or "price".
+                token (str): The next_token of the previous page, or None for the first page.
+                include_inactive (bool): Whether inactive products are listed.
+
+            Returns:
+                ProductPage: The products and the token of the next page.
+
+            Raises:
+                ValueError: If the page size is not positive, the sort order is
+                unknown, or the token is not one of a listing in that order.
+            """
+        position = self._page_position(page_size, sort_key, token)
+        # Entries sort after their position without the product, so the page
+        # starts at the first entry after the position of the token
+        start = () if position is None else position[:-1] + (position[-1] + 1,)
+        products = []
+        with self._lock:
+            listing = self._listings.get(sort_key)
+            if listing is None:
+                listing = self._listings[sort_key] = SortedList(
+                    self._listing_entry(sort_key, product) for product in self._catalog)
+            for entry in listing.irange(start):
+                product = entry[-1]
+                if not include_inactive and not product.is_active():
+                    continue
+                if len(products) == page_size:
+                    return ProductPage(products, self._page_token(sort_key, last_entry[:-1]))
+                products.append(product)
+                last_entry = entry
+        return ProductPage(products, None)
+
+    def iter_products(self, sort_key="catalog", include_inactive=False,
+                      page_size=DEFAULT_PAGE_SIZE) -> Iterator[Product]:
+        """
+            Iterates over the products of the store lazily, one page at a time.
+
+            The store is only locked while a page is fetched, and the iteration
+            stays consistent while products change, as with list_products.
+
+            Args:
+                sort_key (str): The sort order: "catalog", "name" or "price".
+                include_inactive (bool): Whether inactive products are listed.
+                page_size (int): The number of products fetched at a time.
+
+            Returns:
+                Iterator[Product]: The products.
+            """
+        token = None
+        while True:
+            page = self.list_products(page_size, sort_key, token, include_inactive)
+            yield from page.products
+            token = page.next_token
+            if token is None:
+                return
+
+    def get_available_quantity(self, product) -> int:
+        """
+            Returns the stock of a product that is not held by reservations.
+
+            Args:
+                product (Product): The product to check.
+
+            Returns:
+                int: The quantity that can still be ordered or reserved.
+            """
+        self._expire_reservations()
+        with product.lock:
+            return product.quantity - self._reserved.get(product, 0)
 
-    def order(self, shopping_list: List[Tuple[Product, int]]) -> float:
+    @staticmethod
+    @contextmanager
+    def _locked(products):
+        """
+            Holds the locks of the given products, taken in a fixed order to avoid deadlocks.
+
+            Args:
+                products: The products to lock.
+            """
+        # A plain list of held locks, which is much cheaper than an ExitStack
+        # when a bulk operation locks a large part of the catalog
+        held = []
+        try:
+            for product in sorted(set(products), key=id):
+                product.lock.acquire()
+                held.append(product.lock)
+            yield
+        finally:
+            for lock in reversed(held):
+                lock.release()
+
+    def _plan(self, shopping_list, taken=None) -> Tuple[List[Tuple[Product, int]], Dict[Product, int]]:
+        """
+            Validates a shopping list without changing any stock.
+
+            Lines for inactive products, or for stocked products outside the store,
+            are skipped just like a sequential order would skip them. The caller
+            must hold the locks of the products in the shopping list: holds only
+            grow under those locks, so the reserved stock read here can only be
+            an overestimate.
+
+            Args:
+                shopping_list (List[Tuple[Product, int]]): The products and quantities to order.
+                taken (Dict[Product, int]): Stock already taken by earlier orders
+                of the same batch, if any.
+
+            Returns:
+                Tuple: The lines to buy and the stock needed per stocked product.
+
+            Raises:
+                ValueError: If a line exceeds the available stock or a product rule.
+            """
+        taken = taken or {}
+        lines = []
+        holds: Dict[Product, int] = {}
+        for product, quantity in shopping_list:
+            if isinstance(product, NonStockedProduct):
+                if product.is_active():
+                    lines.append((product, quantity))
+                continue
+            if product not in self or not product.is_active():
+                continue
+            used = taken.get(product, 0) + holds.get(product, 0)
+            remaining = product.quantity - used
+            if used and remaining == 0:
+                # An earlier line emptied the stock, which deactivates the product
+                continue
+            if quantity > remaining - self._reserved.get(product, 0):
+                raise ValueError(f"Not enough stock for {product.name}.")
+            product.check_purchase(quantity)
+            holds[product] = holds.get(product, 0) + quantity
+            lines.append((product, quantity))
+        return lines, holds
+
+    def _buy_all(self, lines) -> int:
+        """
+            Buys every line, restoring the previous stock of all products if one fails.
+
+            Args:
+                lines (List[Tuple[Product, int]]): The validated lines to buy.
+
+            Returns:
+                int: The total cost of the lines in cents.
+            """
+        snapshot = {}
+        total_cost = 0
+        selling = self._selling
+        try:
+            for product, quantity in lines:
+                if product not in snapshot:
+                    snapshot[product] = (product.quantity, product.is_active())
+                    selling.add(product)
+                total_cost += product.buy_cents(quantity)
+        except Exception:
+            # Still selling, so sale indexes see the stock put back and can take back the sale
+            for product, (quantity, active) in snapshot.items():
+                if product.quantity == quantity and product.is_active() == active:
+                    # Nothing to restore, e.g. for non-stocked products, so nothing is notified
+                    continue
+                product.set_quantity(quantity)
+                if active:
+                    product.activate()
+                else:
+                    product.deactivate()
+            selling.difference_update(snapshot)
+            raise
+        selling.difference_update(snapshot)
+        return total_cost
+
+    def reserve(self, shopping_list: List[Tuple[Product, int]],
+                ttl: float = DEFAULT_RESERVATION_TTL) -> Reservation:
+        """
+            Validates a shopping list and holds its stock until it is committed or released.
+
+            Args:
+                shopping_list (List[Tuple[Product, int]]): The products and quantities to hold.
+                ttl (float): The number of seconds after which the hold expires.
+
+            Returns:
+                Reservation: The reservation to commit or release.
+
+            Raises:
+                ValueError: If a line exceeds the available stock or a product rule.
+            """
+        self._expire_reservations()
+        with self._locked(product for product, _ in shopping_list):
+            lines, holds = self._plan(shopping_list)
+            with self._lock:
+                for product, quantity in holds.items():
+                    self._reserved[product] = self._reserved.get(product, 0) + quantity
+                reservation = Reservation(next(self._reservation_ids), lines, holds,
+                                          time.monotonic() + ttl)
+                self._reservations[reservation.reservation_id] = reservation
+                heapq.heappush(self._expiries,
+                               (reservation.expires_at, reservation.reservation_id))
+        return reservation
+
+    def commit(self, reservation: Reservation) -> Decimal:
+        """
+            Buys the stock held by a reservation.
+
+            Args:
+                reservation (Reservation): The reservation to commit.
+
+            Returns:
+                Decimal: The total cost of the reservation.
+
+            Raises:
+                ValueError: If the reservation has expired, or was already committed or
+                released, or a product can no longer be bought; in the last case the
+                reservation is still held, to retry or release.
+            """
+        self._expire_reservations()
+        with self._locked(product for product, _ in reservation.lines):
+            with self._lock:
+                if self._reservations.get(reservation.reservation_id) is not reservation:
+                    raise ValueError("Reservation has expired or is no longer held.")
+            # The holds are dropped only once the stock is bought, so a failed
+            # commit leaves the reservation as it was
+            total_cost = self._buy_all(reservation.lines)
+            with self._lock:
+                if self._reservations.get(reservation.reservation_id) is reservation:
+                    self._drop_holds(reservation)
+            return from_cents(total_cost)
+
+    def release(self, reservation: Reservation):
+        """
+            Returns the stock held by a reservation. Releasing twice is a no-op.
+
+            Args:
+                reservation (Reservation): The reservation to release.
+            """
+        with self._lock:
+            if self._reservations.get(reservation.reservation_id) is reservation:
+                self._drop_holds(reservation)
+
+    def _drop_holds(self, reservation):
+        """ Forgets a reservation and the stock it holds. The caller must hold the store lock. """
+        del self._reservations[reservation.reservation_id]
+        for product, quantity in reservation.holds.items():
+            remaining = self._reserved[product] - quantity
+            if remaining:
+                self._reserved[product] = remaining
+            else:
+                del self._reserved[product]
+
+    def _expire_reservations(self):
+        """ Releases every reservation whose ttl has run out. """
+        now = time.monotonic()
+        if not self._expiries or self._expiries[0][0] > now:
+            return
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                _, reservation_id = heapq.heappop(self._expiries)
+                reservation = self._reservations.get(reservation_id)
+                if reservation is not None:
+                    self._drop_holds(reservation)
+
+    def order(self, shopping_list: List[Tuple[Product, int]]) -> Decimal:
         """
             Places an order for the products in the shopping list and returns the total cost.
 
+            Every line is validated before any stock is taken, so an order either
+            succeeds as a whole or leaves the stock untouched. Concurrent orders
+            never oversell, since the cart's products stay locked until the order
+            is done.
+
             Args:
                 shopping_list (List[Tuple[Product, int]]): The list of products
                 and quantities to order.
 
             Returns:
-                float: The total cost of the order.
+                Decimal: The total cost of the order.
 
             Raises:
                 ValueError: If a product is not active or if the quantity in the order is invalid.
             """
-        total_cost = 0.0
+        self._expire_reservations()
+        with self._locked(product for product, _ in shopping_list):
+            lines, _ = self._plan(shopping_list)
+            return from_cents(self._buy_all(lines))
 
-        for product, quantity in shopping_list:
-            if isinstance(product, NonStockedProduct) and product.is_active():
-                total_cost += product.buy(quantity)
-            elif product in self.products and product.is_active():
-                if quantity > product.quantity:
-                    raise ValueError(f"Not enough stock for {product.name}.")
-                total_cost += product.buy(quantity)
+    def order_many(self, orders: List[List[Tuple[Product, int]]]) \
+            -> Tuple[List[Optional[Decimal]], Dict[int, ValueError]]:
+        """
+            Places a batch of orders with the same outcome as calling order() for each in turn.
 
-        return total_cost
+            Stock is checked against a running tally of the batch, every accepted
+            line is priced in one batched pass, and each product's stock is updated
+            once for the whole batch. An order that fails does not
+            affect the others.
+
+            Args:
+                orders (List[List[Tuple[Product, int]]]): The shopping lists to order.
+
+            Returns:
+                Tuple: The total cost of each order, None for failed orders, and the
+                error of each failed order keyed by its position in the batch.
+            """
+        self._expire_reservations()
+        products = {product for shopping_list in orders for product, _ in shopping_list}
+        with self._locked(products):
+            taken: Dict[Product, int] = {}
+            accepted = []
+            failures: Dict[int, ValueError] = {}
+            for index, shopping_list in enumerate(orders):
+                try:
+                    lines, holds = self._plan(shopping_list, taken)
+                except ValueError as error:
+                    failures[index] = error
+                    continue
+                for product, quantity in holds.items():
+                    taken[product] = taken.get(product, 0) + quantity
+                accepted.append((index, lines))
+
+            # Price every accepted line in one pass, then add them up per order
+            line_prices = iter(price_lines([line for _, lines in accepted for line in lines]))
+            totals: List[Optional[Decimal]] = [None] * len(orders)
+            for index, lines in accepted:
+                total_cost = 0
+                for _ in lines:
+                    total_cost += next(line_prices)
+                totals[index] = from_cents(total_cost)
+
+            self._selling.update(taken)
+            try:
+                for product, quantity in taken.items():
+                    product.set_quantity(product.quantity - quantity)
+            finally:
+                self._selling.difference_update(taken)
+        return totals, failures
@@ -0,0 +1,64 @@
+import pytest
+from catalog_io import export_products, import_products
+from products import Product
+from promotions import SecondHalfPrice, PercentDiscount
+from store import Store
+
+PROMOTIONS = {promotion.name: promotion for promotion in (SecondHalfPrice("Second Half price!"),
+                                                          PercentDiscount("30% off!", percent=30))}
+
+
+def describe(product):
+    return (type(product), product.name, product.price_cents, product.quantity, product.is_active(),
+            product.get_promotion(), getattr(product, "maximum", None))
+
+
+@pytest.mark.parametrize("file_name", ["catalog.csv", "catalog.jsonl"])
+def test_export_then_import_round_trips(tmp_path, file_name, make_products):
+    # Test that every product type, its promotion and its state survive a round trip
+    laptop, license_key, shipping = make_products()
+    laptop.price = 1200.5
+    license_key.set_promotion(PROMOTIONS["30% off!"])
+    mouse = Product("Mouse", price=20, quantity=15)
+    mouse.deactivate()
+    store = Store([laptop, license_key, shipping, mouse])
+    path = str(tmp_path / file_name)
+    assert export_products(store, path, chunk_size=3) == 4
+    imported = Store([])
+    assert import_products(imported, path, PROMOTIONS) == []
+    assert [describe(product) for product in imported.products] == \
+        [describe(product) for product in store.products]
+
+
+def test_import_reports_invalid_rows(tmp_path):
+    # Test that invalid rows are reported with their line and the valid ones imported
+    path = tmp_path / "catalog.csv"
+    path.write_text("type,name,price,quantity,maximum,promotion\n"
+                    "Product,Laptop,1200,50,,\n"
+                    "Product,,10,5,,\n"
+                    "LimitedProduct,Shipping,10,250,,\n"
+                    "Product,Mouse,-20,15,,\n"
+                    "Gadget,Phone,500,3,,\n"
+                    "Product,Cable,abc,3,,\n"
+                    "Product,Case,10,3,,Half off\n"
+                    "NonStockedProduct,Windows License,125,,,30% off!\n")
+    store = Store([])
+    errors = import_products(store, str(path), PROMOTIONS)
+    assert [product.name for product in store.products] == ["Laptop", "Windows License"]
+    assert [error.line for error in errors] == [3, 4, 5, 6, 7, 8]
+    assert "Missing field 'maximum'" in str(errors[1])
+    assert "Unknown promotion: 'Half off'" in str(errors[5])
+
+
+def test_import_reports_invalid_json_lines(tmp_path):
+    # Test that malformed JSON lines are reported without stopping the import
+    path = tmp_path / "catalog.jsonl"
+    path.write_text('{"name": "Laptop", "price": 1200, "quantity": 50}\n'
+                    '{"name": "Mouse", "price": \n'
+                    '\n'
+                    '["Phone"]\n'
+                    '{"name": "Cable", "price": "9.99", "quantity": 2.5}\n')
+    store = Store([])
+    errors = import_products(store, str(path))
+    assert [product.name for product in store.products] == ["Laptop"]
+    assert [error.line for error in errors] == [2, 4, 5]
@@ -0,0 +1,102 @@
+import pytest
+from products import NonStockedProduct
+from promotions import SecondHalfPrice
+
+np = pytest.importorskip("numpy")
+from columnar import ColumnarStore, LIMITED, NON_STOCKED  # noqa: E402
+
+
+def test_views_read_and_write_their_row(make_products):
+    # Test that products of a columnar store are views over its columns
+    store = ColumnarStore(make_products())
+    laptop, license_key, shipping = store.products
+    assert isinstance(license_key, NonStockedProduct)
+    assert shipping.maximum == 1
+    assert laptop.get_promotion().name == "Second Half price!"
+    assert store.get_product("Laptop") is laptop
+    laptop.set_quantity(0)
+    assert not laptop.is_active()
+    assert store.get_all_products() == [license_key, shipping]
+    assert store.get_total_quantity() == 250
+
+
+def test_order_through_columnar_store(make_products):
+    # Test that ordering works the same as with the object store
+    store = ColumnarStore(make_products())
+    laptop, license_key, shipping = store.products
+    assert store.order([(laptop, 3), (license_key, 1), (shipping, 1)]) == 2 * 1200 + 600 + 125 + 10
+    assert laptop.quantity == 47
+    with pytest.raises(ValueError, match="maximum allowed quantity"):
+        store.order([(laptop, 1), (shipping, 2)])
+    assert laptop.quantity == 47
+
+
+def test_bulk_operations():
+    # Test that aggregate queries and bulk updates run over the columns
+    store = ColumnarStore.from_columns(["A", "B", "C"], price_cents=[1000, 2000, 3000],
+                                       quantities=[1, 2, 3], kinds=[0, 0, LIMITED],
+                                       maximums=[0, 0, 2])
+    assert store.get_total_value() == 10 + 40 + 90
+    store.reprice(10, rows=[1])
+    assert store.get_product("B").price == 22
+    store.update_stock([0, 2, 2], [-1, 1, 1])
+    assert [product.quantity for product in store.products] == [0, 2, 5]
+    assert [product.name for product in store.get_all_products()] == ["B", "C"]
+    with pytest.raises(ValueError, match="Quantity must be non-negative."):
+        store.update_stock([1, 2], [1, -6])
+    assert store.get_total_quantity() == 7
+
+
+def test_update_stock_keeps_non_stocked_rows_active():
+    # Test that non-stocked rows, whose quantity is always 0, are not deactivated by stock updates
+    store = ColumnarStore.from_columns(["A", "License"], price_cents=[1000, 12500], quantities=[1, 0],
+                                       kinds=[0, NON_STOCKED])
+    store.update_stock([0, 1], [-1, 0])
+    assert [product.name for product in store.get_all_products()] == ["License"]
+
+
+def test_paginated_listing():
+    # Test that a columnar store pages through its rows by catalog order and by price
+    store = ColumnarStore.from_columns([f"P{row}" for row in range(7)],
+                                       price_cents=[500, 100, 300, 100, 700, 200, 300],
+                                       quantities=[1, 1, 0, 1, 1, 1, 1])
+    store.get_product("P2").deactivate()
+    assert list(store.iter_products(page_size=2)) == store.get_all_products()
+    page = store.list_products(page_size=3, sort_key="price", include_inactive=True)
+    assert [product.name for product in page.products] == ["P1", "P3", "P5"]
+    page = store.list_products(page_size=3, sort_key="price", token=page.next_token)
+    assert [product.name for product in page.products] == ["P6", "P0", "P4"]
+    assert page.next_token is None
+    with pytest.raises(ValueError, match="catalog order or price only"):
+        store.list_products(sort_key="name")
+
+
+def test_bulk_changes_return_batches(make_products):
+    # Test that bulk operations of a columnar store change the columns and report the changed rows
+    store = ColumnarStore(make_products())
+    laptop, license_key, shipping = store.products
+    batch = store.bulk_reprice(-50, where=lambda product: product.price_cents > 100_00)
+    assert (batch.products, batch.old_values, batch.new_values) == ([laptop, license_key],
+                                                                    [1200_00, 125_00], [600_00, 62_50])
+    promotion = SecondHalfPrice("Second Half price!")
+    batch = store.bulk_set_promotion(promotion)
+    assert batch.products == [license_key, shipping]
+    assert batch.old_values == [None, None] and shipping.get_promotion() is promotion
+    store.bulk_set_active(False, products=[laptop, shipping])
+    assert store.get_all_products() == [license_key]
+
+
+def test_bulk_operations_select_rows_by_mask():
+    # Test that whole-catalog and masked bulk changes only build views of the rows they change
+    store = ColumnarStore.from_columns(["A", "B", "C", "D"], price_cents=[1000, 2000, 3000, 4000],
+                                       quantities=[1, 2, 3, 4])
+    store.remove_product(store.get_product("B"))
+    store._views.clear()
+    batch = store.bulk_set_active(False, where=store.column("price_cents") < 3500)
+    assert [product.name for product in batch.products] == ["A", "C"]
+    assert sorted(store._views) == [0, 2]
+    assert store.bulk_set_active(False).products == [store.get_product("D")]
+    with pytest.raises(ValueError, match="one entry per row"):
+        store.bulk_reprice(10, where=store.column("price_cents")[:2] > 0)
+    with pytest.raises(ValueError):
+        store.column("price_cents")[0] = 1
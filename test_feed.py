@@ -0,0 +1,109 @@
+import sys
+import threading
+
+import pytest
+from feed import (ChangeFeed, ADDED, REMOVED, STOCK_CHANGED, DEACTIVATED, PRICE_CHANGED,
+                  PROMOTION_SET)
+from products import Product
+from promotions import PercentDiscount
+from store import Store
+
+
+def test_store_changes_are_published_in_order():
+    # Test that every kind of catalog change reaches the feed, in order
+    laptop = Product("Laptop", price=1200, quantity=2)
+    store = Store([laptop])
+    feed = store.add_index(ChangeFeed())
+    cursor = feed.cursor()
+    phone = Product("Phone", price=500, quantity=5)
+    store.add_product(phone)
+    store.order([(laptop, 2)])
+    promotion = PercentDiscount("30% off!", percent=30)
+    phone.set_promotion(promotion)
+    phone.price = 450
+    store.remove_product(phone)
+    events = cursor.poll()
+    assert [(event.kind, event.product.name) for event in events] == [
+        (ADDED, "Phone"), (STOCK_CHANGED, "Laptop"), (DEACTIVATED, "Laptop"),
+        (PROMOTION_SET, "Phone"), (PRICE_CHANGED, "Phone"), (REMOVED, "Phone")]
+    assert (events[1].old_value, events[1].new_value) == (2, 0)
+    assert events[3].new_value is promotion and events[4].new_value == 45000
+    assert [event.sequence for event in events] == list(range(6))
+    assert cursor.poll() == [] and cursor.lag() == 0
+
+
+def test_ring_buffer_overwrites_and_counts_missed_events():
+    # Test that a slow cursor skips overwritten events and counts them as missed
+    product = Product("Item", price=1, quantity=100)
+    feed = ChangeFeed(capacity=5)
+    assert feed.capacity == 8
+    cursor = feed.cursor()
+    for quantity in range(20):
+        feed.update(product, "quantity", quantity)
+    events = cursor.poll(max_events=3)
+    assert [event.sequence for event in events] == [12, 13, 14]
+    assert cursor.missed == 12
+    assert [event.sequence for event in cursor.poll()] == [15, 16, 17, 18, 19]
+    with pytest.raises(ValueError):
+        ChangeFeed(capacity=0)
+
+
+def test_concurrent_publishers_never_move_reads_back():
+    # Test that with many publishers the next sequence and a cursor's reads only move forward
+    product = Product("Item", price=1, quantity=100)
+    feed = ChangeFeed(capacity=64)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        publishers = [threading.Thread(target=lambda: [feed.update(product, "quantity", 0)
+                                                       for _ in range(5000)])
+                      for _ in range(4)]
+        for publisher in publishers:
+            publisher.start()
+        cursor = feed.cursor(0)
+        hints, sequences = [], []
+        while any(publisher.is_alive() for publisher in publishers):
+            hints.append(feed.next_sequence)
+            sequences.extend(event.sequence for event in cursor.poll())
+        for publisher in publishers:
+            publisher.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert hints == sorted(hints)
+    assert sequences == sorted(set(sequences))
+    assert feed.next_sequence == 20000
+
+
+def test_subscribers_receive_batches():
+    # Test that subscribers receive every event in batches of at most their batch size
+    store = Store([])
+    feed = store.add_index(ChangeFeed())
+    batches = []
+    subscription = feed.subscribe(batches.append, batch_size=4)
+    for index in range(10):
+        store.add_product(Product(f"Product {index}", price=1, quantity=1))
+    feed.start(interval=0.01)
+    feed.stop()
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    feed.unsubscribe(subscription)
+    store.add_product(Product("Late", price=1, quantity=1))
+    assert feed.deliver() == 0
+
+
+def test_failing_subscriber_does_not_stop_delivery():
+    # Test that a callback that raises is unsubscribed while the others keep receiving events
+    store = Store([])
+    feed = store.add_index(ChangeFeed())
+    batches = []
+
+    def fail(events):
+        raise RuntimeError("consumer down")
+    failing = feed.subscribe(fail)
+    feed.subscribe(batches.append)
+    store.add_product(Product("Laptop", price=1200, quantity=5))
+    feed.start(interval=0.01)
+    feed.stop()
+    store.add_product(Product("Mouse", price=20, quantity=15))
+    assert feed.deliver() == 1
+    assert isinstance(failing.error, RuntimeError)
+    assert [event.product.name for batch in batches for event in batch] == ["Laptop", "Mouse"]
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+import instrumentation
+from products import Product
+from promotions import PercentDiscount
+from store import Store
+
+
+@pytest.fixture
+def sink():
+    # Instruments the hot paths for one test, always restoring them afterwards
+    try:
+        yield instrumentation.enable(instrumentation.MemorySink())
+    finally:
+        instrumentation.disable()
+
+
+def test_disable_restores_original_functions():
+    # Test that disabled instrumentation leaves the original functions in place
+    originals = (Store.order, Store._locked, Product.set_quantity, Product.buy_cents,
+                 PercentDiscount.apply_promotion)
+    instrumentation.enable(instrumentation.MemorySink())
+    assert Store.order is not originals[0]
+    instrumentation.disable()
+    assert (Store.order, Store._locked, Product.set_quantity, Product.buy_cents,
+            PercentDiscount.apply_promotion) == originals
+    assert not instrumentation.is_enabled()
+
+
+def test_latencies_errors_and_stock_outs_are_reported(sink):
+    # Test that calls, failed orders and products selling out reach the sink
+    product = Product("Item", price=10, quantity=3)
+    product.set_promotion(PercentDiscount("30% off!", percent=30))
+    store = Store([product])
+    assert store.order([(product, 3)]) == 21
+    with pytest.raises(ValueError):
+        product.buy(1)
+    report = sink.report()
+    assert report["latencies"]["Store.order"]["count"] == 1
+    assert report["latencies"]["Product.buy_cents"]["count"] == 2
+    assert report["latencies"]["PercentDiscount.apply_promotion"]["count"] == 1
+    assert report["counters"]["Product.buy_cents.errors"] == 1
+    assert report["counters"]["stock_out:Item"] == 1
+
+
+def test_contention_is_reported(sink):
+    # Test that an order waiting for a product lock held elsewhere reports contention
+    product = Product("Item", price=10, quantity=10)
+    store = Store([product])
+    with product.lock:
+        buyer = threading.Thread(target=store.order, args=([(product, 1)],))
+        buyer.start()
+        time.sleep(0.05)
+    buyer.join()
+    name, fields = sink.events[-1]
+    assert name == "contention" and fields["product"] == "Item" and fields["seconds"] > 0
+
+
+def test_histogram_percentiles_are_close():
+    # Test that histogram percentiles are within a bucket width of the exact values
+    histogram = instrumentation.Histogram()
+    for value in range(1, 1001):
+        histogram.add(value / 1e6)
+    assert 500e-6 <= histogram.percentile(0.5) <= 500e-6 * 1.125
+    assert histogram.percentile(1) == 1000e-6
+
+
+def test_sampling_profiler_records_busy_thread():
+    # Test that the sampling profiler sees the function a thread is busy in
+    def busy_loop(deadline):
+        while time.perf_counter() < deadline:
+            pass
+
+    profiler = instrumentation.SamplingProfiler(interval=0.001)
+    worker = threading.Thread(target=busy_loop, args=(time.perf_counter() + 0.2,))
+    profiler.start()
+    worker.start()
+    worker.join()
+    profiler.stop()
+    assert any(frame.endswith(":busy_loop") for frame, _ in profiler.top(5))
+    assert "busy_loop" in profiler.collapsed()
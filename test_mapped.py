@@ -0,0 +1,56 @@
+import pytest
+from products import Product
+from promotions import PercentDiscount
+
+np = pytest.importorskip("numpy")
+from mapped import MappedStore  # noqa: E402
+
+
+def test_orders_write_through_to_the_file(tmp_path, make_products):
+    # Test that stock taken by orders is kept in the catalog file
+    path = str(tmp_path / "catalog.bin")
+    with MappedStore.create(path, make_products(), capacity=2) as store:
+        laptop, license_key, shipping = store.products
+        assert store.order([(laptop, 50), (license_key, 1), (shipping, 1)]) == 25 * 1200 + 25 * 600 + 135
+        shipping.set_promotion(PercentDiscount("30% off!", percent=30))
+
+    with MappedStore(path) as store:
+        # Opening reads no record until a product is accessed
+        assert store._views == {}
+        laptop = store.get_product("Laptop")
+        shipping = store.get_product("Shipping")
+        assert laptop.quantity == 0 and not laptop.is_active()
+        assert shipping.quantity == 249 and shipping.maximum == 1
+        assert shipping.get_promotion() is PercentDiscount("30% off!", percent=30)
+        assert [product.name for product in store.get_all_products()] == ["Windows License", "Shipping"]
+        assert store.get_total_quantity() == 249
+
+
+def test_catalog_grows_and_keeps_removals(tmp_path, make_products):
+    # Test that adding past the capacity grows the file and removals are kept
+    path = str(tmp_path / "catalog.bin")
+    with MappedStore.create(path, make_products(), capacity=2) as store:
+        store.add_product(Product("Mouse", price=20, quantity=15))
+        store.remove_product(store.get_product("Windows License"))
+        with pytest.raises(ValueError, match="64 bytes"):
+            store.add_product(Product("x" * 65, price=1, quantity=1))
+
+    with MappedStore(path) as store:
+        assert [product.name for product in store.products] == ["Laptop", "Shipping", "Mouse"]
+        assert store.get_product("Windows License") is None
+
+
+def test_create_from_columns(tmp_path):
+    # Test that a catalog can be written from columns and opened again
+    path = str(tmp_path / "catalog.bin")
+    MappedStore.create_from_columns(path, ["Laptop", "Mouse"], [120000, 2000], [50, 15]).close()
+    with MappedStore(path) as store:
+        assert store.get_total_value() == 50 * 1200 + 15 * 20
+
+
+def test_rejects_other_files(tmp_path):
+    # Test that a file without the catalog header is refused
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a catalog")
+    with pytest.raises(ValueError, match="not a catalog file"):
+        MappedStore(str(path))
@@ -0,0 +1,88 @@
+import os
+
+from persistence import DurableStore, LOG_FILE
+from products import Product
+from promotions import PercentDiscount
+
+
+def snapshot(store):
+    return [(product.name, product.price_cents, product.quantity, product.is_active(),
+             product.get_promotion()) for product in store.products]
+
+
+def test_store_recovers_orders_and_changes(tmp_path, make_products):
+    # Test that orders and product changes survive reopening the store
+    with DurableStore(str(tmp_path), make_products(), fsync=False) as store:
+        laptop, license_key, shipping = store.products
+        store.order([(laptop, 3), (shipping, 1)])
+        laptop.price = 1100
+        license_key.set_promotion(PercentDiscount("30% off!", percent=30))
+        store.remove_product(shipping)
+        store.order([(laptop, 47)])
+        expected = snapshot(store)
+
+    with DurableStore(str(tmp_path), fsync=False) as recovered:
+        assert snapshot(recovered) == expected
+        assert not recovered.get_product("Laptop").is_active()
+        assert recovered.get_all_products() == [recovered.get_product("Windows License")]
+
+
+def test_store_recovers_after_checkpoints(tmp_path, make_products):
+    # Test that recovery combines the latest snapshot with the log after it
+    with DurableStore(str(tmp_path), make_products(), fsync=False, snapshot_every=5) as store:
+        laptop = store.get_product("Laptop")
+        for _ in range(20):
+            store.order([(laptop, 1)])
+        store.add_product(Product("Mouse", price=20, quantity=15))
+        expected = snapshot(store)
+
+    with DurableStore(str(tmp_path), fsync=False) as recovered:
+        assert snapshot(recovered) == expected
+        assert recovered.get_product("Laptop").quantity == 30
+        # New products keep getting fresh ids after recovery
+        recovered.add_product(Product("Keyboard", price=45, quantity=5))
+        assert [product.name for product in recovered.products][-2:] == ["Mouse", "Keyboard"]
+
+
+def test_store_ignores_torn_log_tail(tmp_path, make_products):
+    # Test that a record cut short by a crash is dropped and earlier records are kept
+    with DurableStore(str(tmp_path), make_products(), fsync=False) as store:
+        laptop = store.get_product("Laptop")
+        store.order([(laptop, 2)])
+    log_path = os.path.join(str(tmp_path), LOG_FILE)
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        log_file.write('{"op":"quantity","id":0,"val')
+
+    with DurableStore(str(tmp_path), fsync=False) as recovered:
+        assert recovered.get_product("Laptop").quantity == 48
+
+
+def test_store_truncates_torn_only_log(tmp_path, make_products):
+    # Test that a log holding only a torn record is cut back so later orders survive
+    with DurableStore(str(tmp_path), make_products(), fsync=False) as store:
+        store.checkpoint()
+    log_path = os.path.join(str(tmp_path), LOG_FILE)
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        log_file.write('{"op":"quantity","id":0,"val')
+
+    with DurableStore(str(tmp_path), fsync=False) as store:
+        store.order([(store.get_product("Laptop"), 4)])
+
+    with DurableStore(str(tmp_path), fsync=False) as recovered:
+        assert recovered.get_product("Laptop").quantity == 46
+
+
+def test_store_recovers_bulk_changes(tmp_path, make_products):
+    # Test that bulk changes are logged as one record each and survive reopening the store
+    with DurableStore(str(tmp_path), make_products(), fsync=False) as store:
+        store.bulk_reprice(-10)
+        store.bulk_set_promotion(PercentDiscount("30% off!", percent=30),
+                                 where=lambda product: product.price_cents < 1000_00)
+        store.bulk_set_active(False, products=[store.get_product("Shipping")])
+        expected = snapshot(store)
+    with open(os.path.join(str(tmp_path), LOG_FILE), encoding="utf-8") as log_file:
+        assert sum('"bulk"' in line for line in log_file) == 3
+
+    with DurableStore(str(tmp_path), fsync=False) as recovered:
+        assert snapshot(recovered) == expected
+        assert [product.name for product in recovered.get_all_products()] == ["Laptop", "Windows License"]
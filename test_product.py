@@ -1,5 +1,5 @@
 import pytest
-from products import Product
+from products import Product, LimitedProduct
 
 
 def test_create_normal_product():
@@ -74,4 +74,8 @@ def test_activate_and_deactivate():
     assert product.is_active()
 
 
-pytest.main()
+def test_products_have_no_instance_dict():
+    # Test that products keep their attributes in slots
+    product = LimitedProduct("Shipping", price=10, quantity=250, maximum=1)
+    assert not hasattr(product, "__dict__")
+    assert (product.name, product.price, product.quantity, product.maximum) == ("Shipping", 10, 250, 1)
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+from products import Product
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount, price_lines, _apply
+from promotion_rules import TieredDiscount, Stacked
+from serialization import promotion_from_dict, promotion_to_dict
+
+
+def reference_price(stack, price_cents, quantity):
+    # Applies the scalar apply_promotion of every stacked promotion in turn, each to the
+    # unit price the previous ones left. Prices are scaled so that no step rounds, and
+    # the line total is rounded half up to the cent once, as the compiled plan does.
+    if not quantity:
+        return 0
+    scale = 10 ** 18 * quantity ** len(stack.promotions)
+    unit_price = price_cents * scale
+    for promotion in stack.promotions:
+        total = _apply(promotion, unit_price, quantity)
+        assert total % quantity == 0
+        unit_price = total // quantity
+    return (unit_price * quantity + scale // 2) // scale
+
+
+def random_stack(rng):
+    # Builds a random stack of at most one unit-cycle promotion and some discounts
+    promotions = [PercentDiscount(f"{percent}% off", percent=percent)
+                  for percent in rng.sample([5, 12.5, 30, 33, 50], rng.randint(0, 2))]
+    promotions += [TieredDiscount("Bulk", [(rng.randint(1, 10), 5), (rng.randint(11, 40), 15)])
+                   for _ in range(rng.randint(0, 1))]
+    promotions += [rng.choice([SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!")])
+                   for _ in range(rng.randint(0, 1))]
+    rng.shuffle(promotions)
+    return Stacked("Stack", promotions or [PercentDiscount("10% off", percent=10)])
+
+
+def test_stacked_single_promotion_matches_builtin():
+    # Test that a stack of one built-in promotion prices exactly like the promotion
+    for promotion in (SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+                      PercentDiscount("30% off!", percent=30), PercentDiscount("12.5% off!", percent=12.5)):
+        stacked = Stacked("Stack", [promotion])
+        for price in (0.01, 0.99, 1.05, 19.99, 1000):
+            product = Product("Item", price=price, quantity=100)
+            for quantity in range(0, 12):
+                assert stacked.apply_promotion(product, quantity) == promotion.apply_promotion(product, quantity)
+
+
+def test_compiled_plan_matches_sequential_reference():
+    # Test that compiled stacks, scalar and batched, match applying each promotion in turn
+    rng = random.Random(0)
+    cases = []
+    for _ in range(300):
+        stack = random_stack(rng)
+        product = Product("Item", price=rng.randint(1, 200_000) / 100, quantity=100)
+        quantity = rng.randint(0, 100)
+        expected = reference_price(stack, product.price_cents, quantity)
+        assert stack.apply_promotion(product, quantity) == expected
+        cases.append((stack, product.price_cents, quantity, expected))
+    np = pytest.importorskip("numpy")
+    for stack, price_cents, quantity, expected in cases:
+        batch = stack.apply_promotion_batch(np.array([price_cents] * 2, dtype=np.int64),
+                                            np.array([quantity] * 2, dtype=np.int64))
+        assert batch.tolist() == [expected] * 2
+
+
+def test_tiered_discount_uses_largest_reached_tier():
+    # Test that a tiered discount applies the tier of the largest minimum reached
+    bulk = TieredDiscount("Bulk", [(50, 10), (10, 5)])
+    product = Product("Item", price=1, quantity=100)
+    assert bulk.apply_promotion(product, 9) == 900
+    assert bulk.apply_promotion(product, 10) == 950
+    assert bulk.apply_promotion(product, 50) == 4500
+
+
+def test_batched_pricing_matches_scalar_pricing():
+    # Test that batched pricing of compiled promotions matches scalar pricing
+    pytest.importorskip("numpy")
+    rng = random.Random(1)
+    lines = []
+    for index in range(2000):
+        product = Product(f"Product {index}", price=rng.randint(1, 200_000) / 100, quantity=100)
+        product.set_promotion(random_stack(rng))
+        lines.append((product, rng.randint(0, 100)))
+    assert price_lines(lines) == [product.get_price_cents(quantity) for product, quantity in lines]
+
+
+def test_invalid_rules_are_rejected():
+    # Test that invalid tiers and stacks of two unit-cycle promotions raise ValueError
+    with pytest.raises(ValueError):
+        TieredDiscount("Bulk", [])
+    with pytest.raises(ValueError):
+        TieredDiscount("Bulk", [(0, 10)])
+    with pytest.raises(ValueError):
+        Stacked("Stack", [SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!")])
+
+
+def test_rules_survive_serialization():
+    # Test that stacked and tiered promotions round-trip through their dictionaries
+    stack = Stacked("Stack", [PercentDiscount("30% off!", percent=30),
+                              TieredDiscount("Bulk", [(10, 5), (50, 10)]), ThirdOneFree("Third One Free!")])
+    assert promotion_from_dict(promotion_to_dict(stack)) is stack
@@ -0,0 +1,117 @@
+import copy
+import pickle
+import random
+from decimal import Decimal
+
+import pytest
+from products import Product
+from promotions import (SecondHalfPrice, ThirdOneFree, PercentDiscount, PRICING_CACHE_SIZE,
+                        price_lines, pricing_cache)
+from promotion_rules import Stacked, TieredDiscount
+
+
+def make_lines(count, seed=0):
+    # Builds random lines over every promotion, including no promotion at all
+    rng = random.Random(seed)
+    promotion_catalog = [None, SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+                         PercentDiscount("30% off!", percent=30),
+                         PercentDiscount("12.5% off!", percent=12.5)]
+    lines = []
+    for index in range(count):
+        price = rng.choice([rng.randint(1, 2000), round(rng.uniform(0.01, 999.99), 2)])
+        product = Product(f"Product {index}", price=price, quantity=100)
+        product.set_promotion(rng.choice(promotion_catalog))
+        lines.append((product, rng.randint(0, 50)))
+    return lines
+
+
+def test_price_lines_matches_scalar_pricing():
+    # Test that batched pricing returns exactly the scalar result of every line
+    lines = make_lines(2000)
+    assert price_lines(lines) == [product.get_price_cents(quantity) for product, quantity in lines]
+
+
+@pytest.mark.parametrize("promotion", [SecondHalfPrice("Second Half price!"),
+                                       ThirdOneFree("Third One Free!"),
+                                       PercentDiscount("30% off!", percent=30)])
+def test_batch_kernel_matches_apply_promotion(promotion):
+    # Test that each promotion's batch kernel matches its scalar apply_promotion
+    np = pytest.importorskip("numpy")
+    lines = make_lines(500, seed=1)
+    prices = np.array([product.price_cents for product, _ in lines], dtype=np.int64)
+    quantities = np.array([quantity for _, quantity in lines], dtype=np.int64)
+    expected = [promotion.apply_promotion(product, quantity) for product, quantity in lines]
+    assert promotion.apply_promotion_batch(prices, quantities).tolist() == expected
+
+
+def test_percent_with_a_huge_fraction_does_not_overflow():
+    # Test that batched pricing stays exact when the percent has a huge reduced fraction
+    np = pytest.importorskip("numpy")
+    from columnar import ColumnarStore
+    from store import Store
+    promotion = PercentDiscount("A third off!", percent=100 / 3)
+    products = [Product(f"Camera {index}", price=Decimal("1234.56"), quantity=100) for index in range(2)]
+    for product in products:
+        product.set_promotion(promotion)
+    expected = products[0].get_price_cents(7)
+    assert price_lines([(products[0], 7)]) == [expected]
+    assert Store([products[0]]).order_many([[(products[0], 7)]])[0] == [Store([products[1]]).order(
+        [(products[1], 7)])]
+    columnar = ColumnarStore([Product("Camera", price=Decimal("1234.56"), quantity=100)])
+    columnar.products[0].set_promotion(promotion)
+    assert columnar.price_rows(np.array([0]), np.array([7])).tolist() == [expected]
+
+
+def test_promotions_round_half_up_to_the_cent():
+    # Test the rounding rule of every promotion on prices with odd cents
+    product = Product("Cable", price=Decimal("0.99"), quantity=100)
+    assert SecondHalfPrice("Second Half price!").apply_promotion(product, 3) == 198 + 50
+    assert ThirdOneFree("Third One Free!").apply_promotion(product, 3) == 198
+    assert PercentDiscount("30% off!", percent=30).apply_promotion(product, 1) == 69
+    assert PercentDiscount("12.5% off!", percent=12.5).apply_promotion(product, 3) == 260
+
+
+def test_money_sums_are_exact():
+    # Test that prices which are inexact as floats add up exactly
+    product = Product("Sticker", price=0.1, quantity=100)
+    assert product.price_cents == 10
+    assert sum(product.buy(1) for _ in range(3)) == Decimal("0.3")
+
+
+def test_promotions_are_interned_by_value():
+    # Test that equal promotions are one shared object and different ones are not
+    assert PercentDiscount("30% off!", 30) is PercentDiscount("30% off!", percent=30)
+    assert PercentDiscount("30% off!", 30) is not PercentDiscount("30% off!", 20)
+    assert ThirdOneFree("Third One Free!") is ThirdOneFree("Third One Free!")
+    assert ThirdOneFree("Third One Free!") is not SecondHalfPrice("Third One Free!")
+
+
+def test_interned_promotions_copy_and_pickle():
+    # Test that copies and unpickled promotions are the interned object, left unchanged by equal calls
+    discount = PercentDiscount("30% off!", 30)
+    stack = Stacked("Stack", [discount, ThirdOneFree("Third One Free!")])
+    assert PercentDiscount("30% off!", 30.0) is discount
+    assert type(discount.percent) is int
+    for promotion in (discount, stack, TieredDiscount("Bulk", [(10, 5), (50, 10)])):
+        assert copy.copy(promotion) is promotion
+        assert copy.deepcopy(promotion) is promotion
+        assert pickle.loads(pickle.dumps(promotion)) is promotion
+
+
+def test_pricing_cache_counts_and_follows_changes():
+    # Test that cached prices are reused and never outlive a price or promotion change
+    pricing_cache.resize(2)
+    try:
+        mouse = Product("Mouse", price=20, quantity=15)
+        mouse.set_promotion(SecondHalfPrice("Second Half price!"))
+        assert mouse.get_price(2) == 30
+        assert mouse.get_price(2) == 30
+        assert (pricing_cache.hits, pricing_cache.misses) == (1, 1)
+        mouse.price = 10
+        assert mouse.get_price(2) == 15
+        mouse.set_promotion(ThirdOneFree("Third One Free!"))
+        assert mouse.get_price(3) == 20
+        assert pricing_cache.stats() == {"hits": 1, "misses": 3, "evictions": 1, "size": 2,
+                                         "maxsize": 2}
+    finally:
+        pricing_cache.resize(PRICING_CACHE_SIZE)
@@ -0,0 +1,29 @@
+import pytest
+from benchmarks.generators import make_catalog
+from benchmarks.replay import compare, generate_trace, read_trace, simulate, write_trace
+
+
+def test_same_seed_replays_the_same_orders(tmp_path):
+    # Test that a seed gives the same order stream, through a trace file too, and the same outcome
+    trace = generate_trace(make_catalog(200, seed=3), 500, seed=3)
+    assert generate_trace(make_catalog(200, seed=3), 500, seed=3) == trace
+    assert generate_trace(make_catalog(200, seed=3), 500, seed=4) != trace
+    path = str(tmp_path / "trace.jsonl")
+    write_trace(trace, path)
+    with open(path, "a", encoding="utf-8") as trace_file:
+        trace_file.write('{"command": "total"}\n')
+    assert read_trace(path) == trace
+    results = [simulate(lambda: make_catalog(200, seed=3, stock=20), trace, rounds=2) for _ in range(2)]
+    assert results[0]["reproducible"] and results[0]["outcome"] == results[1]["outcome"]
+    assert results[0]["outcome"]["out_of_stock"] > 0
+
+
+def test_compare_refuses_other_configurations():
+    # Test that comparing with a baseline of another configuration raises instead of flagging
+    trace = generate_trace(make_catalog(100), 200)
+    run = dict(simulate(lambda: make_catalog(100), trace, rounds=1),
+               metadata={"trace": None, "orders": 200, "catalog": "generated", "concurrency": 1, "seed": 0})
+    baseline = dict(run, metadata=dict(run["metadata"], concurrency=2))
+    with pytest.raises(ValueError, match="concurrency 2 != 1"):
+        compare(run, baseline)
+    assert compare(run, run) == 0
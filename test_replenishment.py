@@ -0,0 +1,100 @@
+import math
+
+import pytest
+from products import Product
+from replenishment import ReplenishmentPlanner
+from store import Store
+
+DAY = 24 * 60 * 60
+
+
+class FakeClock:
+    # A clock that only moves when told to
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_forecast_follows_the_sales_window():
+    # Test that velocity, days to stock-out and reorder point come from the rolling window
+    clock = FakeClock()
+    laptop = Product("Laptop", price=1200, quantity=1000)
+    store = Store([laptop])
+    planner = store.add_index(ReplenishmentPlanner(bucket_count=4, lead_time_days=2, clock=clock))
+    for units in (2, 6):
+        store.order([(laptop, units)])
+        clock.now += DAY
+    clock.now -= DAY
+    forecast = planner.forecast(laptop)
+    assert forecast.daily_velocity == 4.0
+    assert forecast.days_to_stockout == 992 / 4
+    assert forecast.reorder_point == pytest.approx(4 * 2 + 1.65 * 2 * math.sqrt(2))
+    clock.now += 3 * DAY
+    assert planner.forecast(laptop).daily_velocity == 1.5
+    clock.now += 10 * DAY
+    assert planner.forecast(laptop).days_to_stockout == math.inf
+
+
+def test_low_stock_is_signalled_once_before_deactivation():
+    # Test that a product is signalled at its reorder point, before it deactivates, until restocked
+    clock = FakeClock()
+    phone = Product("Phone", price=500, quantity=30)
+    store = Store([phone])
+    signalled = []
+    store.add_index(ReplenishmentPlanner(lead_time_days=3, safety_factor=0, clock=clock,
+                                         on_low_stock=lambda forecast: signalled.append(
+                                             (forecast.quantity, forecast.product.is_active()))))
+    for _ in range(4):
+        store.order([(phone, 5)])
+    assert signalled == [(20, True)]
+    store.order([(phone, 10)])
+    assert signalled == [(20, True)]
+    phone.set_quantity(100)
+    phone.activate()
+    phone.set_quantity(0)
+    assert signalled == [(20, True), (0, True)]
+    assert not phone.is_active()
+
+
+def test_history_loading_and_row_reuse():
+    # Test that recorded history feeds the forecast and that removed products free their rows
+    clock = FakeClock()
+    clock.now = 20 * DAY
+    products = [Product(f"Item {index}", price=1, quantity=50) for index in range(3)]
+    store = Store(products)
+    planner = store.add_index(ReplenishmentPlanner(clock=clock))
+    for day in range(10, 20):
+        planner.record_sale(products[0], 7, timestamp=day * DAY)
+    assert planner.forecast(products[0]).daily_velocity == 70 / 11
+    assert [forecast.product for forecast in planner.low_stock()] == []
+    planner.record_sale(products[1], 49)
+    assert [forecast.product for forecast in planner.low_stock()] == []
+    store.order([(products[1], 1)])
+    assert [forecast.product for forecast in planner.poll()] == [products[1]]
+    store.remove_product(products[1])
+    assert len(planner) == 1 and planner.low_stock() == []
+    store.order([(products[2], 3)])
+    assert len(planner) == 2
+    assert planner.forecast(products[2]).daily_velocity == 3.0
+
+
+def test_only_orders_count_as_sales():
+    # Test that manual adjustments and rolled back orders are not sales, unlike order and order_many
+    clock = FakeClock()
+    laptop, mouse = Product("Laptop", price=1200, quantity=100), Product("Mouse", price=20, quantity=1)
+    store = Store([laptop, mouse])
+    planner = store.add_index(ReplenishmentPlanner(clock=clock))
+    laptop.set_quantity(90)
+    assert len(planner) == 0
+    store.order([(laptop, 4)])
+    store.order_many([[(laptop, 2)], [(laptop, 1000)]])
+    laptop.set_quantity(50)
+    mouse.deactivate()
+    with pytest.raises(ValueError):
+        # The mouse line fails after the laptop's stock was taken, which is then restored
+        store._buy_all([(laptop, 3), (mouse, 1)])
+    assert laptop.quantity == 50
+    assert planner.forecast(laptop).daily_velocity == 6.0
+    assert len(planner) == 1
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+import search
+from products import Product
+from promotions import PercentDiscount, SecondHalfPrice
+from search import SearchIndex, SortedList
+from store import Store
+
+
+def make_store(count=500, seed=0):
+    # Builds a store of random products, some promoted and some inactive
+    rng = random.Random(seed)
+    promotions = [None, SecondHalfPrice("Second Half price!"), PercentDiscount("30% off!", percent=30)]
+    products = []
+    for index in range(count):
+        product = Product(f"{rng.choice(['Mac', 'Pixel', 'Bose'])} {rng.randint(0, 999)} #{index}",
+                          price=rng.randint(1, 50_000) / 100, quantity=10)
+        product.set_promotion(rng.choice(promotions))
+        if rng.random() < 0.1:
+            product.deactivate()
+        products.append(product)
+    return Store(products), promotions, rng
+
+
+def check_queries(store, index, promotions):
+    # Compares every kind of query with a scan of the store
+    active = store.get_all_products()
+    assert index.by_prefix("mac 1") == sorted((product for product in active
+                                               if product.name.lower().startswith("mac 1")),
+                                              key=lambda product: product.name.lower())
+    assert set(index.by_substring("x 4")) == set()
+    assert set(index.by_substring("9 #")) == {product for product in active if "9 #" in product.name}
+    assert index.by_price(10, 20.5) == sorted((product for product in active
+                                               if 1000 <= product.price_cents <= 2050),
+                                              key=lambda product: product.price_cents)
+    for promotion in promotions:
+        assert set(index.by_promotion(promotion)) == {product for product in active
+                                                      if product.get_promotion() is promotion}
+    assert set(index.search(prefix="pixel", max_price=100, promotion=promotions[2])) == {
+        product for product in active if product.name.startswith("Pixel")
+        and product.price_cents <= 10_000 and product.get_promotion() is promotions[2]}
+
+
+@pytest.mark.parametrize("substrings", [False, True])
+def test_queries_match_catalog_scan(substrings):
+    # Test that every query matches a scan of the catalog, with and without trigrams
+    store, promotions, _ = make_store()
+    index = store.add_index(SearchIndex(substrings=substrings))
+    check_queries(store, index, promotions)
+
+
+def test_index_follows_catalog_changes(monkeypatch):
+    # Test that the index stays in sync as products are added, removed, repriced and repromoted
+    monkeypatch.setattr(search, "BLOCK_SIZE", 8)  # Split and empty many blocks of the sorted lists
+    store, promotions, rng = make_store()
+    index = store.add_index(SearchIndex(substrings=True))
+    for step in range(300):
+        products = store.products
+        action = rng.randrange(4)
+        if action == 0:
+            store.add_product(Product(f"Pixel {rng.randint(0, 999)} #new{step}", price=rng.randint(1, 500),
+                                      quantity=5))
+        elif action == 1:
+            store.remove_product(rng.choice(products))
+        elif action == 2:
+            rng.choice(products).price = rng.randint(1, 50_000) / 100
+        else:
+            rng.choice(products).set_promotion(rng.choice(promotions))
+    assert len(index) == len(store)
+    check_queries(store, index, promotions)
+
+
+def test_limit_and_inactive_products():
+    # Test that limits cut results short and inactive products are hidden unless asked for
+    first, second = Product("Mac A", price=10, quantity=1), Product("Mac B", price=10, quantity=1)
+    store = Store([first, second])
+    index = store.add_index(SearchIndex())
+    assert index.by_prefix("MAC", limit=1) == [first]
+    first.deactivate()
+    assert index.by_prefix("mac") == [second]
+    assert index.by_prefix("mac", include_inactive=True) == [first, second]
+
+
+def test_sorted_list_refuses_to_remove_missing_items():
+    # Test that removing an absent item raises instead of deleting a neighbour
+    items = SortedList([(100, 0), (200, 1), (300, 2)])
+    with pytest.raises(ValueError):
+        items.remove((200, 5))
+    with pytest.raises(ValueError):
+        items.remove((400, 0))
+    items.remove((200, 1))
+    assert list(items) == [(100, 0), (300, 2)]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from products import Product
+from server import OrderService
+from store import Store
+
+
+async def session(port, requests):
+    # Sends requests over one connection and returns the decoded responses
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for request in requests:
+        writer.write((json.dumps(request) + "\n").encode())
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    return responses
+
+
+def test_concurrent_sessions_never_oversell():
+    # Test that many sessions ordering the same product sell exactly its stock
+    laptop = Product("Laptop", price=1200, quantity=30)
+    service = OrderService(Store([laptop]))
+
+    async def run():
+        server = await service.start_server(port=0)
+        port = server.sockets[0].getsockname()[1]
+        order = {"command": "order", "items": [{"name": "Laptop", "quantity": 1}]}
+        async with server:
+            return await asyncio.gather(*(session(port, [order]) for _ in range(50)))
+
+    results = [responses[0] for responses in asyncio.run(run())]
+    assert sum(response["ok"] for response in results) == 30
+    assert laptop.quantity == 0
+
+
+def test_requests_mirror_the_menu():
+    # Test the list, total and order commands and the reported errors
+    service = OrderService(Store([Product("Laptop", price=1200, quantity=30),
+                                  Product("Mouse", price=20, quantity=15)]))
+
+    async def run():
+        return [await service.handle(request) for request in (
+            {"command": "list"},
+            {"command": "total"},
+            {"command": "order", "items": [{"name": "Mouse", "quantity": 2}]},
+            {"command": "order", "items": [{"name": "Phone", "quantity": 1}]},
+            {"command": "order", "items": [{"name": "Mouse", "quantity": 0}]},
+            {"command": "order", "items": [{"name": ["Mouse"], "quantity": 1}]},
+            {"command": "dance"})]
+
+    listing, total, order, unknown, invalid, unhashable, command = asyncio.run(run())
+    assert [row["name"] for row in listing["products"]] == ["Laptop", "Mouse"]
+    assert total == {"ok": True, "total_quantity": 45}
+    assert order == {"ok": True, "total_cost": "40.00"}
+    assert unknown == {"ok": False, "error": "Unknown product: 'Phone'."}
+    assert not invalid["ok"] and not command["ok"]
+    assert unhashable == {"ok": False, "error": "Each item needs a product name."}
+
+
+def test_unexpected_errors_fail_only_the_request():
+    # Test that an exception other than ValueError becomes an error response
+    class BrokenStore(Store):
+        def get_total_quantity(self):
+            raise KeyError("boom")
+
+    service = OrderService(BrokenStore([Product("Laptop", price=1200, quantity=30)]))
+    response = asyncio.run(service.handle({"command": "total"}))
+    assert response == {"ok": False, "error": "Internal error: KeyError: 'boom'"}
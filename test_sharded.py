@@ -0,0 +1,85 @@
+import pytest
+from products import Product
+from sharded import ShardedStore, shard_of
+from store import Store
+
+
+@pytest.fixture
+def make_catalog(make_products):
+    # Adds two more stocked products, so orders have more lines to spread over the shards
+    return lambda: make_products() + [Product("Mouse", price=20, quantity=15),
+                                      Product("Keyboard", price=45, quantity=5)]
+
+
+@pytest.fixture
+def sharded(make_catalog):
+    with ShardedStore(make_catalog(), shard_count=3) as store:
+        yield store
+
+
+def test_listings_and_totals_are_gathered_across_shards(sharded, make_catalog):
+    # Test that listings keep insertion order and totals add up over every shard
+    assert len({shard_of(product.name, 3) for product in make_catalog()}) > 1
+    assert [product.name for product in sharded.products] == [product.name for product in make_catalog()]
+    assert sharded.get_total_quantity() == 50 + 15 + 5 + 250
+    sharded.order([("Keyboard", 5)])
+    assert "Keyboard" not in [product.name for product in sharded.get_all_products()]
+
+
+def test_multi_shard_orders_are_atomic(sharded, make_catalog):
+    # Test that a cart spanning shards is charged like one store and fails as a whole
+    store = Store(make_catalog())
+    cart = [("Laptop", 3), ("Mouse", 2), ("Windows License", 1), ("Shipping", 1)]
+    assert sharded.order(cart) == store.order([(store.get_product(name), quantity)
+                                               for name, quantity in cart])
+    with pytest.raises(ValueError, match="maximum allowed quantity"):
+        sharded.order([("Laptop", 1), ("Mouse", 1), ("Shipping", 2)])
+    with pytest.raises(ValueError, match="Unknown product"):
+        sharded.order([("Laptop", 1), ("Phone", 1)])
+    quantities = {product.name: product.quantity for product in sharded.products}
+    assert quantities == {product.name: product.quantity for product in store.products}
+
+
+def test_order_many_matches_store(sharded, make_catalog):
+    # Test that a batch gives the same totals and failures as the single-process store
+    store = Store(make_catalog())
+    carts = [[("Laptop", 2)], [("Mouse", 10), ("Keyboard", 2)], [("Mouse", 10)],
+             [("Shipping", 1), ("Windows License", 3)], [("Phone", 1)]]
+    totals, failures = sharded.order_many(carts)
+    expected = []
+    for cart in carts:
+        try:
+            expected.append(store.order([(store.get_product(name), quantity) for name, quantity in cart]))
+        except (ValueError, AttributeError):
+            expected.append(None)
+    assert totals == expected
+    assert sorted(failures) == [2, 4]
+
+
+def test_malformed_requests_do_not_stop_a_shard(sharded):
+    # Test that a request raising something other than ValueError gets an error reply
+    with pytest.raises(ValueError, match="TypeError"):
+        sharded._request(0, ("order", 5))
+    with pytest.raises(ValueError, match="TypeError"):
+        sharded._request(0, None)
+    assert sharded.get_total_quantity() == 50 + 15 + 5 + 250
+
+
+def test_failed_shard_aborts_spanning_orders(sharded, monkeypatch):
+    # Test that a shard failing the prepare phase as a whole aborts what the other shards prepared
+    cart = [("Laptop", 50), ("Mouse", 15), ("Keyboard", 5), ("Shipping", 1)]
+    assert len({shard_of(name, 3) for name, _ in cart}) > 1
+    gather = sharded._gather
+
+    def break_one_prepare(requests):
+        if any(request[0] == "prepare_many" for request in requests.values()):
+            requests = dict(requests)
+            requests[max(requests)] = ("prepare_many", None)
+        return gather(requests)
+
+    monkeypatch.setattr(sharded, "_gather", break_one_prepare)
+    with pytest.raises(ValueError, match="TypeError"):
+        sharded.order_many([cart])
+    monkeypatch.undo()
+    totals, failures = sharded.order_many([cart])
+    assert not failures and totals[0] is not None
@@ -0,0 +1,265 @@
+import random
+import threading
+
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount
+from feed import ChangeFeed
+from search import SearchIndex
+from store import Store
+
+
+def test_store_membership_and_lookup_by_name():
+    # Test that products can be found by identity and by name
+    laptop = Product("Laptop", price=1200, quantity=50)
+    mouse = Product("Mouse", price=20, quantity=15)
+    store = Store([laptop])
+    assert laptop in store
+    assert mouse not in store
+    assert store.get_product("Laptop") is laptop
+    assert store.get_product("Mouse") is None
+
+
+def test_remove_product_updates_indexes():
+    # Test that removing a product drops it from every index
+    laptop = Product("Laptop", price=1200, quantity=50)
+    mouse = Product("Mouse", price=20, quantity=15)
+    store = Store([laptop, mouse])
+    store.remove_product(laptop)
+    store.remove_product(laptop)  # Removing twice is a no-op
+    assert laptop not in store
+    assert store.get_product("Laptop") is None
+    assert store.products == [mouse]
+
+
+def test_order_returns_total_and_updates_stock():
+    # Test that an order charges every line and takes the stock
+    laptop = Product("Laptop", price=1200, quantity=50)
+    license_key = NonStockedProduct("Windows License", price=125)
+    store = Store([laptop, license_key])
+    assert store.order([(laptop, 2), (license_key, 3)]) == 2 * 1200 + 3 * 125
+    assert laptop.quantity == 48
+
+
+def test_order_more_than_stock_invokes_exception():
+    # Test that ordering more than the stock invokes an exception
+    laptop = Product("Laptop", price=1200, quantity=5)
+    store = Store([laptop])
+    with pytest.raises(ValueError, match="Not enough stock for Laptop."):
+        store.order([(laptop, 6)])
+
+
+def test_aggregates_follow_product_changes():
+    # Test that the active set and total quantity track product changes
+    laptop = Product("Laptop", price=1200, quantity=50)
+    mouse = Product("Mouse", price=20, quantity=15)
+    store = Store([laptop, mouse])
+    assert store.get_total_quantity() == 65
+    laptop.set_quantity(10)
+    assert store.get_total_quantity() == 25
+    laptop.deactivate()
+    assert store.get_all_products() == [mouse]
+    assert store.get_total_quantity() == 15
+    laptop.activate()
+    assert store.get_all_products() == [laptop, mouse]
+    mouse.set_quantity(0)  # Reaching 0 deactivates the product
+    assert store.get_all_products() == [laptop]
+    store.remove_product(laptop)
+    assert store.get_total_quantity() == 0
+    laptop.set_quantity(5)  # Removed products no longer affect the store
+    assert store.get_total_quantity() == 0
+
+
+def test_failed_order_leaves_stock_untouched():
+    # Test that an order failing on a later line takes no stock at all
+    laptop = Product("Laptop", price=1200, quantity=50)
+    shipping = LimitedProduct("Shipping", price=10, quantity=250, maximum=1)
+    store = Store([laptop, shipping])
+    with pytest.raises(ValueError, match="maximum allowed quantity"):
+        store.order([(laptop, 5), (shipping, 2)])
+    assert laptop.quantity == 50
+    assert shipping.quantity == 250
+
+
+def test_reservation_holds_stock_until_committed():
+    # Test that reserved stock cannot be ordered by anyone else
+    laptop = Product("Laptop", price=1200, quantity=5)
+    store = Store([laptop])
+    reservation = store.reserve([(laptop, 4)])
+    assert store.get_available_quantity(laptop) == 1
+    with pytest.raises(ValueError, match="Not enough stock for Laptop."):
+        store.order([(laptop, 2)])
+    assert store.commit(reservation) == 4 * 1200
+    assert laptop.quantity == 1
+    with pytest.raises(ValueError, match="no longer held"):
+        store.commit(reservation)
+
+
+def test_released_and_expired_reservations_free_their_stock():
+    # Test that releasing or letting a reservation expire frees its stock
+    laptop = Product("Laptop", price=1200, quantity=5)
+    store = Store([laptop])
+    store.release(store.reserve([(laptop, 5)]))
+    expired = store.reserve([(laptop, 5)], ttl=0)
+    assert store.get_available_quantity(laptop) == 5
+    with pytest.raises(ValueError, match="expired"):
+        store.commit(expired)
+    assert laptop.quantity == 5
+
+
+def test_failed_commit_keeps_the_reservation():
+    # Test that a commit that cannot buy the stock leaves the reservation to retry or release
+    laptop = Product("Laptop", price=1200, quantity=5)
+    store = Store([laptop])
+    reservation = store.reserve([(laptop, 4)])
+    laptop.deactivate()
+    with pytest.raises(ValueError, match="not active"):
+        store.commit(reservation)
+    assert laptop.quantity == 5
+    assert store.get_available_quantity(laptop) == 1
+    laptop.activate()
+    assert store.commit(reservation) == 4 * 1200
+    assert laptop.quantity == 1
+
+
+def test_concurrent_orders_never_oversell():
+    # Test that threads racing for the same stock never take more than exists
+    laptop = Product("Laptop", price=1200, quantity=100)
+    mouse = Product("Mouse", price=20, quantity=100)
+    store = Store([laptop, mouse])
+    sold = []
+
+    def buy_until_sold_out():
+        while True:
+            try:
+                sold.append(store.order([(mouse, 1), (laptop, 3)]))
+            except ValueError:
+                return
+
+    threads = [threading.Thread(target=buy_until_sold_out) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sold) == 33
+    assert laptop.quantity == 1
+    assert mouse.quantity == 67
+    assert store.get_total_quantity() == 68
+
+
+def test_order_many_matches_sequential_orders(make_products):
+    # Test that a batch of orders has the same outcome as ordering one by one
+    rng = random.Random(7)
+    carts = [[(rng.randrange(5), rng.randint(0, 4)) for _ in range(rng.randint(1, 4))]
+             for _ in range(60)]
+    sequential_catalog, batch_catalog = make_products(), make_products()
+    for catalog in (sequential_catalog, batch_catalog):
+        # Covers every promotion, with stock low enough for orders to run out
+        catalog[1].set_promotion(PercentDiscount("30% off!", percent=30))
+        mouse = Product("Mouse", price=20, quantity=12)
+        mouse.set_promotion(ThirdOneFree("Third One Free!"))
+        catalog.extend([mouse, Product("Keyboard", price=45, quantity=5)])
+    sequential_store, batch_store = Store(sequential_catalog), Store(batch_catalog)
+
+    expected_totals = []
+    for cart in carts:
+        try:
+            expected_totals.append(sequential_store.order(
+                [(sequential_catalog[index], quantity) for index, quantity in cart]))
+        except ValueError:
+            expected_totals.append(None)
+    totals, failures = batch_store.order_many(
+        [[(batch_catalog[index], quantity) for index, quantity in cart] for cart in carts])
+
+    assert totals == expected_totals
+    assert sorted(failures) == [index for index, total in enumerate(totals) if total is None]
+    assert [(product.quantity, product.is_active()) for product in batch_catalog] == \
+           [(product.quantity, product.is_active()) for product in sequential_catalog]
+    assert batch_store.get_total_quantity() == sequential_store.get_total_quantity()
+
+
+def test_paginated_listing_survives_deactivations():
+    # Test that a cursor listing neither skips nor repeats products deactivated or added while paging
+    catalog = [Product(f"Product {index}", price=index + 1, quantity=10) for index in range(25)]
+    store = Store(catalog)
+    page = store.list_products(page_size=10)
+    listed = list(page.products)
+    catalog[3].deactivate()
+    catalog[12].set_quantity(0)
+    late = Product("Late", price=1, quantity=1)
+    store.add_product(late)
+    while page.next_token is not None:
+        page = store.list_products(page_size=10, token=page.next_token)
+        listed.extend(page.products)
+    assert listed == catalog[:12] + catalog[13:] + [late]
+    assert list(store.iter_products(page_size=4)) == store.get_all_products()
+
+
+def test_listing_by_name_and_price():
+    # Test that listings sort by name or price, follow repricing and reject foreign tokens
+    catalog = [Product(name, price=price, quantity=1)
+               for name, price in [("banana", 3), ("Apple", 5), ("cherry", 1), ("apple", 3)]]
+    store = Store(catalog)
+    assert [product.name for product in store.iter_products("name", page_size=1)] == \
+           ["Apple", "apple", "banana", "cherry"]
+    first = store.list_products(page_size=2, sort_key="price")
+    assert [product.name for product in first.products] == ["cherry", "banana"]
+    catalog[2].price = 10
+    rest = store.list_products(page_size=2, sort_key="price", token=first.next_token)
+    assert [product.name for product in rest.products] == ["apple", "Apple"]
+    assert [product.price for product in store.iter_products("price")] == [3, 3, 5, 10]
+    with pytest.raises(ValueError, match="Invalid page token"):
+        store.list_products(sort_key="name", token=first.next_token)
+    with pytest.raises(ValueError, match="Unknown sort order"):
+        store.list_products(sort_key="quantity")
+
+
+def test_bulk_operations_apply_as_one_batch():
+    # Test that bulk changes reach the store, its indexes and other stores, with one feed event per batch
+    catalog = [Product("MacBook Air M2", price=1450, quantity=10),
+               Product("Bose QuietComfort Earbuds", price=250, quantity=20),
+               Product("Google Pixel 7", price=500, quantity=5),
+               NonStockedProduct("Windows License", price=125),
+               LimitedProduct("Shipping", price=10, quantity=8, maximum=1)]
+    catalog[0].set_promotion(SecondHalfPrice("Second Half price!"))
+    catalog[1].set_promotion(ThirdOneFree("Third One Free!"))
+    catalog[3].set_promotion(PercentDiscount("30% off!", percent=30))
+    store, other_store = Store(catalog), Store(catalog[:2])
+    feed = store.add_index(ChangeFeed())
+    search = store.add_index(SearchIndex())
+    cursor = feed.cursor()
+
+    batch = store.bulk_reprice(10, where=lambda product: product.price_cents >= 250_00)
+    assert batch.products == catalog[:3]
+    assert batch.old_values == [1450_00, 250_00, 500_00]
+    assert batch.new_values == [1595_00, 275_00, 550_00]
+    assert [product.name for product in search.by_price(max_price=300)] == \
+           ["Shipping", "Windows License", "Bose QuietComfort Earbuds"]
+    store.bulk_set_promotion(None, products=catalog[:2])
+    store.bulk_set_active(False, where=lambda product: product.get_promotion() is None)
+    assert store.get_all_products() == [catalog[3]]
+    assert store.get_total_quantity() == other_store.get_total_quantity() == 0
+    assert [event.new_value.attribute for event in cursor.poll()] == ["price", "promotion", "active"]
+
+    with pytest.raises(ValueError, match="Price must be non-negative."):
+        store.bulk_reprice(-101)
+    with pytest.raises(ValueError, match="is not in the store"):
+        other_store.bulk_set_active(True, products=catalog[1:3])
+    assert not catalog[1].is_active()
+
+
+def test_failed_order_notifies_only_restored_products():
+    # Test that rolling back an order publishes no changes for lines it did not change, like non-stocked ones
+    laptop = Product("Laptop", price=1200, quantity=5)
+    license_key = NonStockedProduct("Windows License", price=125)
+    mouse = Product("Mouse", price=20, quantity=1)
+    mouse.deactivate()
+    store = Store([license_key, laptop, mouse])
+    feed = store.add_index(ChangeFeed())
+    cursor = feed.cursor()
+    with pytest.raises(ValueError):
+        # The mouse line fails after the other lines were bought
+        store._buy_all([(license_key, 1), (laptop, 2), (mouse, 1)])
+    assert [(event.product, event.old_value, event.new_value) for event in cursor.poll()] == \
+           [(laptop, 5, 3), (laptop, 3, 5)]
+    assert license_key.is_active() and laptop.quantity == 5